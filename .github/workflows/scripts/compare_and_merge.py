@@ -1,22 +1,29 @@
+import argparse
 import filecmp
+import os
 import shutil
+import sys
 
-def compare_and_merge_files(old_file, new_file, merged_file):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from DictMerge import add_merge_arguments, merge_dicts  # noqa: E402
+
+
+def compare_and_merge_files(old_file, new_file, merged_file, base_file=None, code_policy="union",
+                            weight_policy="max", order="word"):
     # 对比文件内容
-    if filecmp.cmp(old_file, new_file):
+    if filecmp.cmp(old_file, new_file, shallow=False):
         # 如果文件内容相同，直接使用旧文件
-        shutil.copyfile(old_file, merged_file)
-    else:
-        # 如果文件内容不同，合并文件
-        with open(old_file, 'r') as old, open(new_file, 'r') as new, open(merged_file, 'w') as merged:
-            old_lines = set(old.readlines())
-            new_lines = set(new.readlines())
-            merged_lines = old_lines.union(new_lines)
-            merged.writelines(merged_lines)
+        if os.path.abspath(old_file) != os.path.abspath(merged_file):
+            shutil.copyfile(old_file, merged_file)
+        return True
+    # 如果文件内容不同，逐词归并两个文件
+    return merge_dicts(old_file, new_file, merged_file, base_file, code_policy, weight_policy, order)
+
 
 if __name__ == "__main__":
-    import sys
-    old_file = sys.argv[1]
-    new_file = sys.argv[2]
-    merged_file = sys.argv[3]
-    compare_and_merge_files(old_file, new_file, merged_file)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="合并两个 Rime 用户词库文件")
+    add_merge_arguments(parser)
+    args = parser.parse_args()
+    ok = compare_and_merge_files(args.old, args.new, args.merged, args.base, args.codes, args.weights, args.sort)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import sqlite3
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+# 单个页面的缓存信息: 服务端校验标识, 内容哈希, 以及该页记录的总页数
+CacheEntry = namedtuple("CacheEntry", ["etag", "last_modified", "content_hash", "total_page"])
+
+
+def content_hash(text: str) -> str:
+    """
+    计算页面内容的哈希, 用于服务端不支持条件请求时判断页面是否变化
+    :param text: 页面内容
+    :return: 十六进制哈希字符串
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    爬取响应的磁盘缓存, 以 URL 和请求参数为键
+
+    新的缓存信息先暂存在内存里, 调用 flush 后才写入磁盘,
+    这样本次运行中途失败时, 下次运行仍会把这些页面当作有变化重新处理。
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._pending: Dict[str, CacheEntry] = {}
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                total_page INTEGER
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url: str, params: dict) -> str:
+        """
+        由 URL 和请求参数生成缓存键, 参数顺序不影响结果
+        :param url: 请求地址
+        :param params: 请求参数
+        :return: 缓存键
+        """
+        return f"{url}?{json.dumps(params, sort_keys=True, ensure_ascii=False)}"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        读取已持久化的缓存信息
+        :param key: 缓存键
+        :return: 缓存信息, 不存在时返回 None
+        """
+        try:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, total_page FROM response_cache WHERE key = ?",
+                (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading response cache: {e}")
+            return None
+        return CacheEntry(*row) if row else None
+
+    def update(self, key: str, entry: CacheEntry) -> None:
+        """
+        暂存新的缓存信息, 等待 flush 写入
+        :param key: 缓存键
+        :param entry: 缓存信息
+        """
+        self._pending[key] = entry
+
+    def discard(self, keys: Iterable[str]) -> None:
+        """
+        丢弃暂存的缓存信息, 用于下游没有处理成功的页面, 下次运行时这些页面仍被当作有变化
+        :param keys: 缓存键
+        """
+        for key in keys:
+            self._pending.pop(key, None)
+
+    def flush(self) -> bool:
+        """
+        将暂存的缓存信息写入磁盘
+        :return: 如果写入成功返回 True，否则返回 False
+        """
+        if not self._pending:
+            return True
+        try:
+            with self._conn:
+                self._conn.executemany("""
+                    INSERT OR REPLACE INTO response_cache (key, etag, last_modified, content_hash, total_page)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(key, *entry) for key, entry in self._pending.items()])
+            self._pending.clear()
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving response cache: {e}")
+            return False
+
+    def close(self) -> None:
+        self._conn.close()
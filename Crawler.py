@@ -1,5 +1,14 @@
+import asyncio
 import json
-import requests
+import time
+from collections import namedtuple
+from typing import AsyncIterator, Dict, Optional, Tuple, Type
+
+import aiohttp
+
+from CrawlCache import CacheEntry, ResponseCache, content_hash
+from Metrics import CRAWL_PAGES, CRAWL_SENTENCES, HTTP_LATENCY
+from RateLimiter import HostRateLimiter
 from logger_config import setup_logger
 
 # 配置日志系统
@@ -50,62 +59,323 @@ class AnotherParser(BaseParser):
         return [item['text'] for item in response_data['items']]
 
 
-def fetch_new_sentences(api_url: str, params: dict, parser: BaseParser) -> list[str or None]:
+# 解析器注册表, config.json 中 SOURCES 的 parser 字段按类名映射到这里
+PARSERS: Dict[str, Type[BaseParser]] = {
+    "RebangParser": RebangParser,
+    "AnotherParser": AnotherParser,
+}
+
+# 一个爬取来源: 名称, 接口地址, 请求参数, 解析器实例, 守护进程模式下的爬取间隔(秒, 为空时使用全局间隔)
+CrawlSource = namedtuple("CrawlSource", ["name", "api_url", "params", "parser", "interval"], defaults=(None,))
+
+# 爬取到的一页: 来源, 句子列表, 以及该页在响应缓存中的键(没有缓存时为 None)
+CrawledPage = namedtuple("CrawledPage", ["source", "sentences", "cache_key"])
+
+
+def load_sources(source_configs: list[dict]) -> list[CrawlSource]:
     """
-    从API获取新句子列表
-    :param params:  请求参数
+    将配置文件中的来源列表转换为 CrawlSource 列表
+    :param source_configs: 来源配置列表, 每项包含 api_url, params, parser, 可选 name, enabled 和 interval
+    :return: 启用的来源列表
+    """
+    sources = []
+    for source_config in source_configs:
+        if not source_config.get('enabled', True):
+            continue
+        parser_name = source_config.get('parser', 'RebangParser')
+        parser_cls = PARSERS.get(parser_name)
+        if parser_cls is None:
+            raise ValueError(f"Unknown parser: {parser_name}")
+        params = source_config.get('params', {})
+        name = source_config.get('name') or f"{source_config['api_url']}?{json.dumps(params, ensure_ascii=False)}"
+        sources.append(CrawlSource(name, source_config['api_url'], params, parser_cls(), source_config.get('interval')))
+    return sources
+
+
+DEFAULT_HEADERS = {
+    "accept": "application/json",
+    "accept-language": "en-US,en;q=0.9,en-GB;q=0.8,zh-CN;q=0.7,zh;q=0.6",
+    "authorization": "undefined",
+    "cache-control": "no-cache",
+    "dnt": "1",
+    "pragma": "no-cache",
+    "priority": "u=1, i",
+    "referer": "https://rebang.today/",
+    "sec-ch-ua": '"Microsoft Edge";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"',
+    "sec-fetch-dest": "empty",
+    "sec-fetch-mode": "cors",
+    "sec-fetch-site": "same-site",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0"
+}
+
+
+def make_page_params(params: dict, page: int) -> dict:
+    """
+    :return: 请求某一页时的参数, 第1页沿用原始参数不额外携带 page
+    """
+    page_params = dict(params)
+    if page > 1:
+        page_params['page'] = page
+    return page_params
+
+
+async def fetch_page(session: aiohttp.ClientSession, api_url: str, params: dict, page: int,
+                     semaphore: asyncio.Semaphore, limiter: Optional[HostRateLimiter] = None,
+                     cache: Optional[ResponseCache] = None) -> Optional[dict]:
+    """
+    请求单页数据
+    :param session: aiohttp 客户端会话
     :param api_url: API的URL
-    :param parser: 解析器策略, 支持自定义的解析
-    :return: 新句子列表
+    :param params: 请求参数
+    :param page: 页码, 第1页沿用原始参数不额外携带 page
+    :param semaphore: 限制并发请求数的信号量
+    :param limiter: 按主机限速的限速器
+    :param cache: 响应缓存, 页面未变化时返回的 list 字段为 None
+    :return: 响应中的 data 字段, 请求失败时返回 None
     """
+    page_params = make_page_params(params, page)
 
-    headers = {
-        "accept": "application/json",
-        "accept-language": "en-US,en;q=0.9,en-GB;q=0.8,zh-CN;q=0.7,zh;q=0.6",
-        "authorization": "undefined",
-        "cache-control": "no-cache",
-        "dnt": "1",
-        "pragma": "no-cache",
-        "priority": "u=1, i",
-        "referer": "https://rebang.today/",
-        "sec-ch-ua": '"Microsoft Edge";v="129", "Not=A?Brand";v="8", "Chromium";v="129"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-        "sec-fetch-dest": "empty",
-        "sec-fetch-mode": "cors",
-        "sec-fetch-site": "same-site",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0"
-    }
-    response = requests.get(api_url, params=params, headers=headers)
+    headers = {}
+    cache_key = cached = None
+    if cache is not None:
+        cache_key = cache.make_key(api_url, page_params)
+        cached = cache.get(cache_key)
+        # 服务端支持时使用条件请求, 页面未变化则直接返回304
+        if cached is not None and cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+    async with semaphore:
+        if limiter is not None:
+            await limiter.acquire(api_url)
+        start = time.perf_counter()
+        try:
+            async with session.get(api_url, params=page_params, headers=headers) as response:
+                if response.status == 304 and cached is not None:
+                    logger.debug(f"第 {page} 页未变化(304)")
+                    CRAWL_PAGES.inc(status="not_modified")
+                    return {'total_page': cached.total_page, 'list': None}
+                # 检查请求是否成功
+                if response.status != 200:
+                    logger.error(f"请求第 {page} 页失败，状态码: {response.status}")
+                    CRAWL_PAGES.inc(status="error")
+                    return None
+                # 解析JSON数据
+                data = await response.json(content_type=None)
+                page_data = data['data']
+                if cache is not None:
+                    # 服务端不支持条件请求时, 比较 list 字段的哈希, 未变化则跳过后续解析
+                    list_hash = content_hash(page_data['list'])
+                    cache.update(cache_key, CacheEntry(response.headers.get('ETag'),
+                                                       response.headers.get('Last-Modified'),
+                                                       list_hash, page_data['total_page']))
+                    if cached is not None and cached.content_hash == list_hash:
+                        logger.debug(f"第 {page} 页内容未变化")
+                        CRAWL_PAGES.inc(status="unchanged")
+                        return {'total_page': page_data['total_page'], 'list': None}
+                CRAWL_PAGES.inc(status="ok")
+                return page_data
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"请求第 {page} 页失败: {e}")
+            CRAWL_PAGES.inc(status="error")
+            return None
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"解析第 {page} 页数据失败: {e}")
+            CRAWL_PAGES.inc(status="error")
+            return None
+        finally:
+            HTTP_LATENCY.observe(time.perf_counter() - start)
 
-    # 检查请求是否成功
-    if response.status_code == 200:
-        # 解析JSON数据
-        data = response.json()
+
+async def async_fetch_new_sentences(api_url: str, params: dict, parser: BaseParser,
+                                    session: Optional[aiohttp.ClientSession] = None,
+                                    max_concurrency: int = 8, rate_limit: Optional[float] = None,
+                                    limiter: Optional[HostRateLimiter] = None,
+                                    cache: Optional[ResponseCache] = None) -> list[str or None]:
+    """
+    异步从API获取新句子列表, 先请求第1页得到总页数, 再并发请求剩余的页
+    传入 cache 时, 与上次运行相比没有变化的页面会被跳过, 不产出句子
+    :param api_url: API的URL
+    :param params: 请求参数
+    :param parser: 解析器策略, 支持自定义的解析
+    :param session: 复用的 aiohttp 会话, 为空时内部创建并在结束后关闭
+    :param max_concurrency: 同时进行的最大请求数
+    :param rate_limit: 每个主机每秒最多发出的请求数, 为空时不限速
+    :param limiter: 外部共享的限速器, 优先于 rate_limit
+    :param cache: 响应缓存
+    :return: 新句子列表, 按页码顺序排列
+    """
+    own_session = session is None
+    if own_session:
+        session = aiohttp.ClientSession(headers=DEFAULT_HEADERS,
+                                        connector=aiohttp.TCPConnector(limit=max_concurrency))
+    if limiter is None and rate_limit:
+        limiter = HostRateLimiter(rate_limit)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    try:
+        first_page = await fetch_page(session, api_url, params, 1, semaphore, limiter, cache)
+        if first_page is None:
+            return []
 
         # 提取总页数
-        total_page = data['data']['total_page']
-        list_data = json.loads(data['data']['list'])
+        total_page = first_page['total_page']
+        list_data = json.loads(first_page['list']) if first_page['list'] is not None else []
 
         if total_page > 1:
-            # 遍历所有页
-            for page in range(2, total_page + 1):
-                params['page'] = page
-                response = requests.get(api_url, params=params, headers=headers)
+            # 并发请求剩余所有页, gather 保证结果与页码顺序一致
+            pages = await asyncio.gather(
+                *(fetch_page(session, api_url, params, page, semaphore, limiter, cache)
+                  for page in range(2, total_page + 1)))
+            for page_data in pages:
+                if page_data is not None and page_data['list'] is not None:
+                    # 提取list字段并解析为Python列表
+                    list_data.extend(json.loads(page_data['list']))
+        sentences = parser.parse(list_data)
+        CRAWL_SENTENCES.inc(len(sentences))
+        return sentences
+    finally:
+        if own_session:
+            await session.close()
 
-                # 检查请求是否成功
-                if response.status_code == 200:
-                    # 解析JSON数据
-                    data = response.json()
 
-                    # 提取list字段并解析为Python列表
-                    list_data.extend(json.loads(data['data']['list']))
+def _parse_page(source: CrawlSource, page_list: str) -> list[str]:
+    sentences = source.parser.parse(json.loads(page_list))
+    CRAWL_SENTENCES.inc(len(sentences))
+    return sentences
+
+
+async def iter_source_pages(session: aiohttp.ClientSession, source: CrawlSource, semaphore: asyncio.Semaphore,
+                            limiter: Optional[HostRateLimiter] = None, cache: Optional[ResponseCache] = None,
+                            max_in_flight: int = 8) -> AsyncIterator[CrawledPage]:
+    """
+    逐页产出一个来源的句子, 第1页返回后立即产出, 其余页按完成顺序产出
+    同时最多有 max_in_flight 页在下载或等待产出, 前一页被取走后才开始下载下一页, 下游较慢时不会继续下载
+    :param session: aiohttp 客户端会话
+    :param source: 爬取来源
+    :param semaphore: 限制并发请求数的信号量
+    :param limiter: 按主机限速的限速器
+    :param cache: 响应缓存, 未变化的页面不产出句子
+    :param max_in_flight: 已开始下载但还没有被取走的最大页数
+    :return: 异步生成器, 每次产出一页
+    """
+    def make_page(page: int, page_list: str) -> CrawledPage:
+        cache_key = cache.make_key(source.api_url, make_page_params(source.params, page)) if cache is not None else None
+        return CrawledPage(source, _parse_page(source, page_list), cache_key)
+
+    first_page = await fetch_page(session, source.api_url, source.params, 1, semaphore, limiter, cache)
+    if first_page is None:
+        return
+    if first_page['list'] is not None:
+        yield make_page(1, first_page['list'])
+
+    async def fetch(page: int) -> Tuple[int, Optional[dict]]:
+        return page, await fetch_page(session, source.api_url, source.params, page, semaphore, limiter, cache)
+
+    remaining_pages = iter(range(2, first_page['total_page'] + 1))
+    tasks = set()
+
+    def start_next() -> None:
+        page = next(remaining_pages, None)
+        if page is not None:
+            tasks.add(asyncio.ensure_future(fetch(page)))
+
+    for _ in range(max(1, max_in_flight)):
+        start_next()
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                tasks.discard(task)
+                page, page_data = task.result()
+                if page_data is not None and page_data['list'] is not None:
+                    yield make_page(page, page_data['list'])
+                start_next()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def make_crawl_session(max_connections: int = 16) -> aiohttp.ClientSession:
+    """
+    创建所有来源共享的 aiohttp 会话, 守护进程在各轮运行之间复用, 保持连接和 DNS 缓存
+    :param max_connections: 全局连接数上限
+    :return: aiohttp 会话, 需要在 async with 中使用或调用 close 关闭
+    """
+    return aiohttp.ClientSession(headers=DEFAULT_HEADERS, connector=aiohttp.TCPConnector(limit=max_connections))
+
+
+async def crawl_pages(sources: list[CrawlSource], max_connections: int = 16, max_concurrency: int = 8,
+                      rate_limit: Optional[float] = None, cache: Optional[ResponseCache] = None,
+                      queue_size: int = 8, session: Optional[aiohttp.ClientSession] = None,
+                      limiter: Optional[HostRateLimiter] = None) -> AsyncIterator[CrawledPage]:
+    """
+    并发爬取所有来源并逐页产出句子, 下游处理第1页时后面的页仍在下载
+    已下载但未被取走的页最多 queue_size 个, 下游较慢时各来源暂停产出,
+    每个来源正在下载的页也不超过 max_concurrency 个, 内存占用与总页数无关
+    :param sources: 来源列表
+    :param max_connections: 全局连接数上限
+    :param max_concurrency: 单个来源同时进行的最大请求数
+    :param rate_limit: 每个主机每秒最多发出的请求数, 为空时不限速
+    :param cache: 响应缓存, 未变化的页面不产出句子
+    :param queue_size: 等待下游处理的最大页数
+    :param session: 复用的 aiohttp 会话, 为空时内部创建并在结束后关闭
+    :param limiter: 外部共享的限速器, 优先于 rate_limit
+    :return: 异步生成器, 按完成顺序产出每一页, cache_key 用于在下游处理失败时丢弃该页的缓存信息
+    """
+    own_session = session is None
+    if own_session:
+        session = make_crawl_session(max_connections)
+    if limiter is None and rate_limit:
+        limiter = HostRateLimiter(rate_limit)
+    try:
+        queue: asyncio.Queue = asyncio.Queue(queue_size)
+
+        async def pump(source: CrawlSource) -> None:
+            semaphore = asyncio.Semaphore(max_concurrency)
+            try:
+                async for page in iter_source_pages(session, source, semaphore, limiter, cache,
+                                                    max_in_flight=max_concurrency):
+                    await queue.put(page)
+            except Exception as e:
+                # 单个来源出错不影响其他来源
+                logger.error(f"爬取来源 {source.name} 失败: {e}")
+            finally:
+                await queue.put(None)
+
+        tasks = [asyncio.ensure_future(pump(source)) for source in sources]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item is None:
+                    remaining -= 1
                 else:
-                    logger.error(f"请求第 {page} 页失败，状态码: {response.status_code}")
-        return parser.parse(list_data)
-    else:
-        logger.error(f"请求失败，状态码: {response.status_code}")
-        return []
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+    finally:
+        if own_session:
+            await session.close()
+
+
+def fetch_new_sentences(api_url: str, params: dict, parser: BaseParser,
+                        max_concurrency: int = 8, rate_limit: Optional[float] = None) -> list[str or None]:
+    """
+    从API获取新句子列表, async_fetch_new_sentences 的同步封装
+    :param params:  请求参数
+    :param api_url: API的URL
+    :param parser: 解析器策略, 支持自定义的解析
+    :param max_concurrency: 同时进行的最大请求数
+    :param rate_limit: 每个主机每秒最多发出的请求数, 为空时不限速
+    :return: 新句子列表
+    """
+    return asyncio.run(async_fetch_new_sentences(api_url, params, parser,
+                                                 max_concurrency=max_concurrency, rate_limit=rate_limit))
 
 
 # 示例用法
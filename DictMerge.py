@@ -0,0 +1,402 @@
+import heapq
+import os
+import tempfile
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from RimeHandler import RimeEntry, RimeFileHandler, RimeSQLiteHandler
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+# 外部排序时每个有序分段的词条数, 内存中最多同时保存这么多词条
+RUN_SIZE = 200000
+
+# 每次写入数据库的词条来源记录数
+PROVENANCE_BATCH_SIZE = 10000
+
+# RimeFileHandler.append_entries 写入的日期注释
+DATE_COMMENT_PREFIX = "# Added on "
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 词条记录: (词条, 编码, 权重, 加入词库的时间戳)
+Record = Tuple[str, str, Optional[str], Optional[int]]
+
+SORT_KEYS = {
+    "word": lambda record: (record[0], record[1]),
+    "code": lambda record: (record[1], record[0]),
+}
+
+WEIGHT_POLICIES = ("max", "sum")
+
+
+def parse_date_comment(line: str) -> Optional[int]:
+    """
+    解析追加词条时写入的日期注释
+    :param line: 一行文本
+    :return: 时间戳, 不是日期注释时返回 None
+    """
+    if not line.startswith(DATE_COMMENT_PREFIX):
+        return None
+    try:
+        return int(datetime.strptime(line[len(DATE_COMMENT_PREFIX):].strip(), DATE_FORMAT).timestamp())
+    except ValueError:
+        return None
+
+
+def read_header(file_path: Path) -> List[str]:
+    """
+    读取词库文件开头的注释, 遇到第一个词条或日期注释为止
+    :param file_path: 词库文件路径
+    :return: 注释行列表, 不含末尾的空行
+    """
+    header = []
+    try:
+        with file_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                if not line.startswith("#") and line.strip() or line.startswith(DATE_COMMENT_PREFIX):
+                    break
+                header.append(line.rstrip("\n"))
+    except OSError:
+        return []
+    while header and not header[-1].strip():
+        header.pop()
+    return header
+
+
+def iter_dated_records(handler: RimeFileHandler) -> Iterator[Record]:
+    """
+    逐行读取词库文件, 每个词条带上它前面最近一个日期注释的时间
+    格式不正确的行会被记录并跳过
+    :param handler: 词库文件
+    :return: 词条记录的迭代器
+    """
+    added = None
+    for line in handler._iter_lines():
+        if line.startswith("#"):
+            added = parse_date_comment(line) or added
+            continue
+        try:
+            item = handler.parse_line(line)
+        except ValueError as e:
+            logger.warning(f"Skipping {e}")
+            continue
+        if item is not None:
+            word, entry = item
+            yield word, entry.code, entry.weight, added
+
+
+def _write_run(records: List[Record], tmp_dir: str) -> str:
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=tmp_dir, suffix=".run", delete=False) as f:
+        for word, code, weight, added in records:
+            f.write(f"{word}\t{code}\t{'' if weight is None else weight}\t{'' if added is None else added}\n")
+        return f.name
+
+
+def _read_run(path: str) -> Iterator[Record]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            word, code, weight, added = line.rstrip("\n").split("\t")
+            yield word, code, weight or None, int(added) if added else None
+
+
+def external_sort(records: Iterable[Record], key: Callable[[Record], tuple], run_size: int = RUN_SIZE,
+                  tmp_dir: Optional[str] = None) -> Iterator[Record]:
+    """
+    外部归并排序: 每 run_size 条记录排序后写入一个临时分段文件, 再逐行归并所有分段
+    全部记录不超过 run_size 条时直接在内存中排序。排序是稳定的, 键相同的记录保持原有顺序
+    :param records: 词条记录
+    :param key: 排序键
+    :param run_size: 每个分段的记录数
+    :param tmp_dir: 分段文件所在目录
+    :return: 排好序的词条记录的迭代器
+    """
+    run_paths = []
+    try:
+        buffer = []
+        for record in records:
+            buffer.append(record)
+            if len(buffer) >= run_size:
+                buffer.sort(key=key)
+                run_paths.append(_write_run(buffer, tmp_dir))
+                buffer = []
+        buffer.sort(key=key)
+        if not run_paths:
+            yield from buffer
+            return
+        if buffer:
+            run_paths.append(_write_run(buffer, tmp_dir))
+            buffer = []
+        # heapq.merge 在键相同时按分段的先后顺序输出, 与原文件中的顺序一致
+        yield from heapq.merge(*(_read_run(path) for path in run_paths), key=key)
+    finally:
+        for path in run_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def merge_weights(weights: Iterable[Optional[str]], policy: str = "max") -> Optional[str]:
+    """
+    合并同一词条的多个权重
+    :param weights: 权重字符串, 可以为 None
+    :param policy: max 取最大值, sum 求和
+    :return: 合并后的权重, 都不是整数时返回第一个非空的权重
+    """
+    numbers = []
+    fallback = None
+    for weight in weights:
+        if weight is None:
+            continue
+        try:
+            numbers.append(int(weight))
+        except ValueError:
+            fallback = fallback or weight
+    if not numbers:
+        return fallback
+    return str(sum(numbers) if policy == "sum" else max(numbers))
+
+
+def dedup_records(records: Iterable[Record], policy: str = "max") -> Iterator[Record]:
+    """
+    合并排好序的记录中 (词条, 编码) 相同的记录, 时间取最早的
+    :param records: 按词条和编码排好序的记录
+    :param policy: 权重合并方式
+    :return: 去重后的记录的迭代器
+    """
+    for (word, code), group in groupby(records, key=lambda record: (record[0], record[1])):
+        group = list(group)
+        dates = [added for _, _, _, added in group if added is not None]
+        yield word, code, merge_weights((weight for _, _, weight, _ in group), policy), min(dates, default=None)
+
+
+def write_records_atomic(file_path: Path, header: List[str], records: Iterable[Record]) -> int:
+    """
+    把词条记录写入同目录下的临时文件, 同步到磁盘后再替换目标文件, 中途失败时目标文件保持不变
+    :param file_path: 目标词库文件路径
+    :param header: 写在文件开头的注释行
+    :param records: 词条记录
+    :return: 写入的词条数
+    :raises OSError: 写入或替换失败
+    """
+    count = 0
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=str(file_path.parent), prefix=f"{file_path.name}.",
+                                     suffix=".tmp", delete=False) as f:
+        try:
+            for line in header:
+                f.write(f"{line}\n")
+            for word, code, weight, _ in records:
+                if weight is not None:
+                    f.write(f"{word}\t{code}\t{weight}\n")
+                else:
+                    f.write(f"{word}\t{code}\n")
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    try:
+        os.replace(f.name, file_path)
+    except OSError:
+        os.remove(f.name)
+        raise
+    return count
+
+
+def compact_dict(handler: RimeFileHandler, sqlite_handler: Optional[RimeSQLiteHandler] = None, order: str = "word",
+                 weight_policy: str = "max", run_size: int = RUN_SIZE) -> bool:
+    """
+    压缩整理词库文件: 合并 (词条, 编码) 相同的行和它们的权重, 去掉日期注释, 按词条或编码排序
+    同一个词的不同编码(多音字的不同读音)各自保留。
+    先写入同目录下的临时文件再替换原文件, 中途失败时原文件保持不变。
+    日期注释中的时间作为 first_seen 记录到数据库中。
+    :param handler: 词库文件
+    :param sqlite_handler: 保存日期的数据库, 为 None 时直接丢弃日期注释
+    :param order: word 按词条排序, code 按编码排序
+    :param weight_policy: 权重合并方式, max 或 sum
+    :param run_size: 外部排序每个分段的词条数
+    :return: 如果整理成功返回 True，否则返回 False
+    """
+    if order not in SORT_KEYS:
+        raise ValueError(f"Unknown sort order: {order}")
+    if weight_policy not in WEIGHT_POLICIES:
+        raise ValueError(f"Unknown weight policy: {weight_policy}")
+
+    file_path = handler.file_path
+    if not file_path.exists():
+        logger.error(f"File not found: {file_path}")
+        return False
+    tmp_dir = str(file_path.parent)
+    read_count = 0
+
+    def counted(records):
+        nonlocal read_count
+        for record in records:
+            read_count += 1
+            yield record
+
+    def with_provenance(records):
+        provenance = []
+        for record in records:
+            word, code, weight, added = record
+            if added is not None:
+                provenance.append((word, RimeEntry(code, weight), added))
+                if len(provenance) >= PROVENANCE_BATCH_SIZE:
+                    flush_provenance(provenance)
+            yield record
+        flush_provenance(provenance)
+
+    def flush_provenance(provenance):
+        if provenance and not sqlite_handler.record_first_seen(provenance):
+            raise OSError("failed to record first_seen in SQLite")
+        provenance.clear()
+
+    try:
+        # 先按 (词条, 编码) 排序去重, 需要按编码输出时再排序一次
+        records = external_sort(counted(iter_dated_records(handler)), SORT_KEYS["word"], run_size, tmp_dir)
+        records = dedup_records(records, weight_policy)
+        if order == "code":
+            records = external_sort(records, SORT_KEYS["code"], run_size, tmp_dir)
+        if sqlite_handler is not None:
+            records = with_provenance(records)
+        write_count = write_records_atomic(file_path, read_header(file_path), records)
+    except OSError as e:
+        logger.error(f"Error compacting {file_path}: {e}")
+        return False
+
+    if handler.index is not None:
+        handler.index.rebuild(handler.iter_words, file_path)
+    logger.info(f"Compacted {file_path}: {read_count} entries -> {write_count} entries")
+    return True
+
+
+# 两边对同一个词的编码都做了不同修改时的处理方式: union 保留双方的编码, old/new 以一方为准
+CODE_POLICIES = ("union", "old", "new")
+
+# 两边对同一词条的权重都做了不同修改时的处理方式
+MERGE_WEIGHT_POLICIES = ("max", "sum", "old", "new")
+
+_OLD, _NEW, _BASE = 0, 1, 2
+
+
+def _tagged_records(file_path: Optional[Path], side: int, run_size: int, tmp_dir: str) -> Iterator[tuple]:
+    if file_path is None:
+        return
+    records = external_sort(iter_dated_records(RimeFileHandler(file_path)), SORT_KEYS["word"], run_size, tmp_dir)
+    for word, code, weight, _ in records:
+        yield word, code, weight, side
+
+
+def _resolve_codes(sides: List[dict], code_policy: str) -> List[str]:
+    old, new, base = (set(side) for side in sides)
+    if old == new or new == base:
+        codes = old
+    elif old == base:
+        codes = new
+    elif code_policy == "old":
+        codes = old
+    elif code_policy == "new":
+        codes = new
+    else:
+        # 逐个编码三方合并: 只有一方相对基准做了增删时以做了修改的一方为准
+        codes = {code for code in old | new | base if (code in old if (code in new) == (code in base) else code in new)}
+    return sorted(codes)
+
+
+def _resolve_weight(code: str, sides: List[dict], weight_policy: str) -> Optional[str]:
+    old, new, base = sides
+    if code not in old:
+        return new[code]
+    if code not in new:
+        return old[code]
+    old_weight, new_weight, base_weight = old[code], new[code], base.get(code)
+    if old_weight == new_weight or new_weight == base_weight:
+        return old_weight
+    if old_weight == base_weight:
+        return new_weight
+    if weight_policy == "old":
+        return old_weight
+    if weight_policy == "new":
+        return new_weight
+    return merge_weights([old_weight, new_weight], weight_policy)
+
+
+def merge_records(records: Iterable[tuple], code_policy: str = "union", weight_policy: str = "max") -> Iterator[Record]:
+    """
+    按词条三方合并已排好序的记录, 每次只在内存中保存一个词的记录
+    一方相对基准没有修改的词以另一方为准, 没有基准文件时只会增加词条, 不会删除
+    :param records: 按词条排好序的 (词条, 编码, 权重, 来源) 记录, 来源为 _OLD, _NEW 或 _BASE
+    :param code_policy: 编码冲突的处理方式
+    :param weight_policy: 权重冲突的处理方式
+    :return: 合并后的记录的迭代器, 按词条和编码排序
+    """
+    for word, group in groupby(records, key=lambda record: record[0]):
+        sides = [{}, {}, {}]
+        for _, code, weight, side in group:
+            codes = sides[side]
+            # 同一个文件中重复的词条先按 max 合并
+            codes[code] = merge_weights([codes[code], weight]) if code in codes else weight
+        for code in _resolve_codes(sides, code_policy):
+            yield word, code, _resolve_weight(code, sides, weight_policy), None
+
+
+def merge_dicts(old_path: Path, new_path: Path, merged_path: Path, base_path: Optional[Path] = None,
+                code_policy: str = "union", weight_policy: str = "max", order: str = "word",
+                run_size: int = RUN_SIZE) -> bool:
+    """
+    三方合并两个词库文件, 每个文件先外部排序, 再逐词归并, 内存占用与词库大小无关
+    输出按词条(或编码)排序, 相同的输入总是得到相同的输出
+    :param old_path: 原词库文件
+    :param new_path: 新词库文件
+    :param merged_path: 合并结果的路径, 可以与 old_path 或 new_path 相同
+    :param base_path: 两个词库共同的上一个版本, 提供时一方删除的词条也会从结果中删除
+    :param code_policy: 两边都修改了同一个词的编码时的处理方式, union, old 或 new
+    :param weight_policy: 两边都修改了同一词条的权重时的处理方式, max, sum, old 或 new
+    :param order: word 按词条排序, code 按编码排序
+    :param run_size: 外部排序每个分段的词条数
+    :return: 如果合并成功返回 True，否则返回 False
+    """
+    if code_policy not in CODE_POLICIES:
+        raise ValueError(f"Unknown code policy: {code_policy}")
+    if weight_policy not in MERGE_WEIGHT_POLICIES:
+        raise ValueError(f"Unknown weight policy: {weight_policy}")
+    if order not in SORT_KEYS:
+        raise ValueError(f"Unknown sort order: {order}")
+    for path in (old_path, new_path, base_path):
+        if path is not None and not path.exists():
+            logger.error(f"File not found: {path}")
+            return False
+
+    tmp_dir = str(merged_path.parent)
+    try:
+        streams = [_tagged_records(path, side, run_size, tmp_dir)
+                   for path, side in ((old_path, _OLD), (new_path, _NEW), (base_path, _BASE))]
+        records = merge_records(heapq.merge(*streams, key=lambda record: record[0]), code_policy, weight_policy)
+        if order == "code":
+            records = external_sort(records, SORT_KEYS["code"], run_size, tmp_dir)
+        count = write_records_atomic(merged_path, read_header(old_path), records)
+    except OSError as e:
+        logger.error(f"Error merging {old_path} and {new_path}: {e}")
+        return False
+
+    logger.info(f"Merged {old_path} and {new_path} into {merged_path}: {count} entries")
+    return True
+
+
+def add_merge_arguments(parser) -> None:
+    """
+    为命令行解析器添加合并词库的参数
+    :param parser: argparse.ArgumentParser
+    """
+    parser.add_argument("old", type=Path, help="原词库文件")
+    parser.add_argument("new", type=Path, help="新词库文件")
+    parser.add_argument("merged", type=Path, help="合并结果文件")
+    parser.add_argument("--base", type=Path, help="两个词库共同的上一个版本, 用于识别删除的词条")
+    parser.add_argument("--codes", choices=CODE_POLICIES, default="union", help="编码冲突的处理方式")
+    parser.add_argument("--weights", choices=MERGE_WEIGHT_POLICIES, default="max", help="权重冲突的处理方式")
+    parser.add_argument("--sort", choices=list(SORT_KEYS), default="word", help="按词条或按编码排序")
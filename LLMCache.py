@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+
+class SegmentationCache:
+    """
+    大模型分词结果的持久化缓存, 以句子、模型名和提示词版本共同作为键
+
+    超过 max_entries 条后按最近使用时间淘汰, last_used 使用单调递增的计数而不是时间戳,
+    保证同一秒内的访问也能区分先后。命中时只在内存中记录 last_used, 由 flush 一次写回,
+    put 淘汰条目前和 close 时也会先写回。
+    """
+
+    def __init__(self, db_path: Path, model: str, prompt_version: int, max_entries: int = 100000):
+        self.db_path = db_path
+        self.model = model
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_segmentation_cache (
+                key BLOB PRIMARY KEY,
+                words TEXT,
+                last_used INTEGER
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_segmentation_cache (last_used)")
+        self._conn.commit()
+        self._count, clock = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM llm_segmentation_cache").fetchone()
+        self._clock = clock
+        # 命中但还没有写回数据库的 {键: last_used}
+        self._touched: Dict[bytes, int] = {}
+
+    def _key(self, sentence: str) -> bytes:
+        return hashlib.sha256(f"{self.model}\0{self.prompt_version}\0{sentence}".encode("utf-8")).digest()
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get(self, sentence: str) -> Optional[List[str]]:
+        """
+        查询缓存的分词结果
+        :param sentence: 输入句子
+        :return: 分词结果列表, 未命中时返回 None
+        """
+        key = self._key(sentence)
+        try:
+            row = self._conn.execute("SELECT words FROM llm_segmentation_cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading LLM segmentation cache: {e}")
+            self.misses += 1
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self._touched[key] = self._tick()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def _write_touched(self) -> None:
+        if self._touched:
+            self._conn.executemany("UPDATE llm_segmentation_cache SET last_used = ? WHERE key = ?",
+                                   ((last_used, key) for key, last_used in self._touched.items()))
+            self._touched.clear()
+
+    def flush(self) -> None:
+        """
+        把命中条目的 last_used 一次写回数据库
+        """
+        try:
+            with self._conn:
+                self._write_touched()
+        except sqlite3.Error as e:
+            logger.error(f"Error updating LLM segmentation cache: {e}")
+
+    def put(self, sentence: str, words: List[str]) -> None:
+        """
+        写入分词结果, 超出容量时淘汰最久未使用的条目
+        :param sentence: 输入句子
+        :param words: 分词结果列表
+        """
+        try:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO llm_segmentation_cache (key, words, last_used) VALUES (?, ?, ?)",
+                    (self._key(sentence), json.dumps(words, ensure_ascii=False), self._tick()))
+                self._count += cursor.rowcount
+                if self._count > self.max_entries:
+                    # 按最近使用时间淘汰, 先写回内存中记录的命中
+                    self._write_touched()
+                    cursor = self._conn.execute("""
+                        DELETE FROM llm_segmentation_cache WHERE key IN (
+                            SELECT key FROM llm_segmentation_cache ORDER BY last_used LIMIT ?
+                        )
+                    """, (self._count - self.max_entries,))
+                    self._count -= cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Error saving LLM segmentation cache: {e}")
+
+    def stats(self) -> dict:
+        """
+        :return: 命中次数、未命中次数和当前条目数
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": self._count}
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
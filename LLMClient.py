@@ -0,0 +1,226 @@
+import asyncio
+import json
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import aiohttp
+
+from Metrics import LLM_CALLS, LLM_ERRORS, LLM_LATENCY, LLM_TOKENS
+from RateLimiter import TokenBucket
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+# 这些状态码表示服务端暂时不可用或限流, 值得重试
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMRequestError(Exception):
+    """
+    大模型请求在重试后仍然失败, 或返回内容无法解析
+    """
+
+
+class LLMUnavailableError(LLMRequestError):
+    """
+    熔断器已打开, 本次运行不再请求大模型
+    """
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头, 支持秒数和 HTTP 日期两种格式
+    :param value: 响应头的值
+    :return: 需要等待的秒数, 无法解析时返回 None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def record_usage(response_data: dict) -> None:
+    """
+    记录响应中 usage 字段的 token 数, 没有 usage 的响应不记录
+    """
+    usage = response_data.get("usage") if isinstance(response_data, dict) else None
+    if not isinstance(usage, dict):
+        return
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if isinstance(tokens, int):
+            LLM_TOKENS.inc(tokens, kind=kind)
+
+
+class CircuitBreaker:
+    """
+    连续失败的请求数达到阈值后打开, 打开后在本次运行中保持打开, 由调用方改用本地分词
+    """
+
+    def __init__(self, failure_threshold: int = 5):
+        self.failure_threshold = failure_threshold
+        self.failures = 0
+        self.is_open = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if not self.is_open and self.failures >= self.failure_threshold:
+            self.is_open = True
+            logger.error(f"大模型接口连续失败 {self.failures} 次，本次运行剩余句子改用 jieba 分词")
+
+    def reset(self) -> None:
+        self.failures = 0
+        self.is_open = False
+
+
+class LLMClient:
+    """
+    带并发上限、令牌桶限速、指数退避重试、超时和熔断的大模型客户端
+    退避等待期间不占用并发名额; 收到 Retry-After 时所有请求都暂停到服务端要求的时间之后
+    """
+
+    def __init__(self, api_url: str, api_key: str, max_concurrency: int = 8, rate_limit: Optional[float] = None,
+                 max_retries: int = 3, timeout: float = 60, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 failure_threshold: int = 5, session: Optional[aiohttp.ClientSession] = None):
+        """
+        :param api_url: chat completions 接口地址
+        :param api_key: 接口密钥
+        :param max_concurrency: 同时进行的最大请求数
+        :param rate_limit: 每秒最多发出的请求数, 为空时不限速
+        :param max_retries: 单个请求的最大重试次数
+        :param timeout: 单个请求的超时时间(秒)
+        :param backoff_base: 退避的基础等待时间(秒), 第 n 次重试最多等待 backoff_base * 2^n
+        :param backoff_max: 单次退避的最长等待时间(秒)
+        :param failure_threshold: 连续失败多少次后熔断
+        :param session: 复用的 aiohttp 会话, 为空时在 async with 中创建
+        """
+        self.api_url = api_url
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_limit) if rate_limit else None
+        # 服务端要求的暂停截止时间(事件循环时间), 之前不发出任何请求
+        self._not_before = 0.0
+        self._session = session
+        self._own_session = session is None
+
+    async def __aenter__(self) -> "LLMClient":
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _backoff(self, attempt: int) -> float:
+        # 带随机抖动的指数退避, 避免所有请求同时重试
+        return min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def pause(self, seconds: float) -> None:
+        """
+        所有请求暂停 seconds 秒, 已经在等待的请求也会等到暂停结束
+        """
+        self._not_before = max(self._not_before, asyncio.get_running_loop().time() + seconds)
+
+    async def _acquire(self) -> None:
+        # 先等暂停结束再占用并发名额; 等待名额期间又收到 Retry-After 时归还名额继续等待
+        loop = asyncio.get_running_loop()
+        while True:
+            while self._not_before > loop.time():
+                await asyncio.sleep(self._not_before - loop.time())
+            await self._semaphore.acquire()
+            if self._not_before <= loop.time():
+                return
+            self._semaphore.release()
+
+    async def chat(self, payload: dict) -> dict:
+        """
+        发送一次 chat completions 请求, 失败时自动重试
+        :param payload: 请求数据
+        :return: 响应数据
+        :raises LLMUnavailableError: 熔断器已打开
+        :raises LLMRequestError: 重试后仍然失败
+        """
+        if self._session is None:
+            raise RuntimeError("LLMClient must be used inside 'async with'")
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        data = json.dumps(payload)
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if self.breaker.is_open:
+                LLM_ERRORS.inc()
+                raise LLMUnavailableError("circuit breaker is open")
+
+            retry_after = None
+            await self._acquire()
+            try:
+                if self._bucket is not None:
+                    await self._bucket.acquire()
+                status = "error"
+                start = time.perf_counter()
+                try:
+                    async with self._session.post(self.api_url, headers=headers, data=data,
+                                                  timeout=self.timeout) as response:
+                        status = str(response.status)
+                        if response.status in RETRY_STATUS:
+                            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                            last_error = f"HTTP {response.status}"
+                        elif response.status >= 400:
+                            # 鉴权失败、参数错误等重试也不会成功
+                            self.breaker.record_failure()
+                            LLM_ERRORS.inc()
+                            raise LLMRequestError(f"HTTP {response.status}: {await response.text()}")
+                        else:
+                            result = await response.json(content_type=None)
+                            self.breaker.record_success()
+                            record_usage(result)
+                            return result
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    last_error = f"{type(e).__name__}: {e}"
+                finally:
+                    # status 为 error 表示没有收到响应(连接失败或超时)
+                    LLM_CALLS.inc(status=status)
+                    LLM_LATENCY.observe(time.perf_counter() - start)
+            finally:
+                # 退避等待前归还并发名额, 其他请求可以继续发送
+                self._semaphore.release()
+
+            if retry_after is not None:
+                # 服务端要求等待时, 所有请求一起暂停
+                self.pause(retry_after)
+            if attempt == self.max_retries:
+                break
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            logger.warning(f"大模型请求失败({last_error})，{delay:.1f} 秒后第 {attempt + 1} 次重试")
+            if retry_after is None:
+                await asyncio.sleep(delay)
+            # 有 Retry-After 时在下一次 _acquire 中等待暂停结束
+
+        # 熔断按请求计数，而不是按重试次数计数
+        self.breaker.record_failure()
+        LLM_ERRORS.inc()
+        raise LLMRequestError(f"request failed after {self.max_retries + 1} attempts: {last_error}")
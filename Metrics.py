@@ -0,0 +1,293 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Prometheus 客户端库默认的直方图分桶(秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 所有指标名称的前缀
+NAMESPACE = "newwordspider"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """
+    指标的公共部分: 名称、说明和标签, 每组标签值对应一个序列
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def _series_name(self, key: Tuple[str, ...]) -> str:
+        # JSON 汇总中每个序列的名称, 与 Prometheus 的写法一致
+        return self.name + _format_labels(self._labels(key))
+
+
+class Counter(_Metric):
+    """
+    只增不减的计数器
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], float]]:
+        # 其他线程可能同时写入, 加锁复制后再遍历
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> Iterator[str]:
+        for key, value in sorted(self._items()):
+            yield f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+
+    def snapshot(self) -> Dict[str, float]:
+        return {self._series_name(key): value for key, value in self._items()}
+
+
+class Histogram(_Metric):
+    """
+    按分桶统计观测值的直方图, 用于请求延迟和写入耗时
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # 每个序列: [各分桶的计数(不累加), 总和, 次数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        """
+        记录 with 语句块的耗时(秒), 块内抛出异常时同样记录
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return series[2] if series else 0
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], tuple]]:
+        # 各序列的分桶计数会被原地修改, 加锁复制一份一致的数据后再遍历
+        with self._lock:
+            return [(key, (list(bucket_counts), total, count))
+                    for key, (bucket_counts, total, count) in self._values.items()]
+
+    def render(self) -> Iterator[str]:
+        for key, (bucket_counts, total, count) in sorted(self._items()):
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(labels)} {count}"
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {self._series_name(key): {"count": count, "sum": total, "buckets": list(bucket_counts)}
+                for key, (bucket_counts, total, count) in self._items()}
+
+
+class MetricsRegistry:
+    """
+    进程内所有指标的注册表, 可以输出 Prometheus 文本格式, 也可以汇总为 JSON
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(f"{NAMESPACE}_{name}", documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(f"{NAMESPACE}_{name}", documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        :return: Prometheus 文本格式(0.0.4)的所有指标
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """
+        :return: 当前所有序列的值, 可以传给 summary 计算一轮运行的增量
+        """
+        return {"time": time.time(),
+                "counters": {name: value for metric in self._metrics.values() if isinstance(metric, Counter)
+                             for name, value in metric.snapshot().items()},
+                "histograms": {name: value for metric in self._metrics.values() if isinstance(metric, Histogram)
+                               for name, value in metric.snapshot().items()}}
+
+    def summary(self, since: Optional[dict] = None) -> dict:
+        """
+        汇总从 since 快照到现在的指标, 直方图给出次数、总和、平均值和按分桶估计的 p50/p99
+        :param since: 起始快照, 为空时汇总进程启动以来的全部指标
+        :return: 可以序列化为 JSON 的汇总
+        """
+        now = self.snapshot()
+        before = since or {"time": None, "counters": {}, "histograms": {}}
+        counters = {}
+        for name, value in now["counters"].items():
+            delta = value - before["counters"].get(name, 0)
+            if delta:
+                counters[name] = delta
+        histograms = {}
+        for name, series in now["histograms"].items():
+            empty = {"count": 0, "sum": 0.0, "buckets": [0] * len(series["buckets"])}
+            previous = before["histograms"].get(name, empty)
+            count = series["count"] - previous["count"]
+            if not count:
+                continue
+            total = series["sum"] - previous["sum"]
+            bucket_counts = [a - b for a, b in zip(series["buckets"], previous["buckets"])]
+            bounds = self._metrics[name.split("{", 1)[0]].buckets
+            histograms[name] = {"count": count, "sum": round(total, 6), "avg": round(total / count, 6),
+                                "p50": _bucket_quantile(bounds, bucket_counts, 0.5),
+                                "p99": _bucket_quantile(bounds, bucket_counts, 0.99)}
+        seconds = round(now["time"] - before["time"], 3) if before["time"] is not None else None
+        return {"seconds": seconds, "counters": counters, "histograms": histograms}
+
+
+def _bucket_quantile(bounds: Sequence[float], bucket_counts: Sequence[int], q: float) -> Optional[float]:
+    """
+    返回包含第 q 分位观测值的分桶上界, 落在最后一个分桶时返回 None(超过最大分桶)
+    """
+    rank = q * sum(bucket_counts)
+    cumulative = 0
+    for bound, bucket_count in zip(bounds, bucket_counts):
+        cumulative += bucket_count
+        if cumulative >= rank:
+            return None if math.isinf(bound) else bound
+    return None
+
+
+# 全局注册表, 各模块在导入时注册自己的指标
+REGISTRY = MetricsRegistry()
+
+# 爬虫
+CRAWL_PAGES = REGISTRY.counter("crawl_pages_total", "请求的页数, status 为 ok/not_modified/unchanged/error",
+                               ("status",))
+CRAWL_SENTENCES = REGISTRY.counter("crawl_sentences_total", "从页面中解析出的句子数")
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "爬虫单个 HTTP 请求的耗时")
+
+# 分词
+TOKENS = REGISTRY.counter("tokens_total", "分词得到的词数(过滤前)")
+FILTERED_WORDS = REGISTRY.counter("filtered_words_total", "通过过滤规则的词数")
+LLM_CALLS = REGISTRY.counter("llm_requests_total", "大模型接口的请求次数(包括重试), status 为 HTTP 状态码或 error",
+                             ("status",))
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "接口返回的 usage 中的 token 数, kind 为 prompt/completion",
+                              ("kind",))
+LLM_ERRORS = REGISTRY.counter("llm_errors_total", "重试后仍然失败或被熔断的大模型请求数")
+LLM_LATENCY = REGISTRY.histogram("llm_request_duration_seconds", "大模型单次 HTTP 请求的耗时",
+                                 buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+
+# 拼音标注和保存
+PINYIN_WORDS = REGISTRY.counter("pinyin_words_total", "标注拼音的词数, source 为 memory/disk/pypinyin",
+                                ("source",))
+NEW_WORDS = REGISTRY.counter("new_words_total", "加入词库的新词数")
+DICT_ENTRIES = REGISTRY.counter("dict_entries_written_total", "写入词库的词条数, target 为 file/sqlite",
+                                ("target",))
+SQLITE_WRITE_LATENCY = REGISTRY.histogram("sqlite_write_duration_seconds", "词库数据库一次批量写入的耗时",
+                                          ("operation",))
+RUN_LATENCY = REGISTRY.histogram("run_duration_seconds", "一轮运行的耗时",
+                                 buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0))
+
+
+async def start_metrics_server(host: str = "127.0.0.1", port: int = 9108,
+                               registry: MetricsRegistry = REGISTRY):
+    """
+    在当前事件循环中启动 /metrics 接口, 供 Prometheus 抓取
+    :param host: 监听地址, 默认只监听本机
+    :param port: 监听端口
+    :param registry: 输出的指标注册表
+    :return: aiohttp 的 AppRunner, 停止时调用 cleanup
+    """
+    # 只有启用了指标接口时才需要 aiohttp 的服务端部分
+    from aiohttp import web
+
+    async def metrics(request):
+        return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    async def summary(request):
+        return web.json_response(registry.summary(), dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/metrics.json", summary)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -1,6 +1,13 @@
+import heapq
+import json
+import logging
 import re
-from typing import Dict, List
-from pypinyin import pinyin, Style
+import sqlite3
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from Metrics import PINYIN_WORDS
 from logger_config import setup_logger
 
 # 配置日志系统
@@ -17,51 +24,311 @@ xiaohe_map: Dict[str, str] = {
 }
 
 
-def quanpin_to_xiaohe(quan_pinyin: str) -> str:
+# pypinyin 输出的全部合法无调拼音音节, ü 写作 v
+PINYIN_SYLLABLES: Tuple[str, ...] = (
+    'a', 'ai', 'an', 'ang', 'ao', 'ba', 'bai', 'ban', 'bang', 'bao', 'bei', 'ben', 'beng', 'bi', 'bian', 'biao',
+    'bie', 'bin', 'bing', 'bo', 'bu', 'ca', 'cai', 'can', 'cang', 'cao', 'ce', 'cen', 'ceng', 'cha', 'chai', 'chan',
+    'chang', 'chao', 'che', 'chen', 'cheng', 'chi', 'chong', 'chou', 'chu', 'chua', 'chuai', 'chuan', 'chuang',
+    'chui', 'chun', 'chuo', 'ci', 'cong', 'cou', 'cu', 'cuan', 'cui', 'cun', 'cuo', 'da', 'dai', 'dan', 'dang',
+    'dao', 'de', 'dei', 'den', 'deng', 'di', 'dia', 'dian', 'diao', 'die', 'ding', 'diu', 'dong', 'dou', 'du',
+    'duan', 'dui', 'dun', 'duo', 'e', 'ei', 'en', 'eng', 'er', 'fa', 'fan', 'fang', 'fei', 'fen', 'feng', 'fiao',
+    'fo', 'fou', 'fu', 'ga', 'gai', 'gan', 'gang', 'gao', 'ge', 'gei', 'gen', 'geng', 'gong', 'gou', 'gu', 'gua',
+    'guai', 'guan', 'guang', 'gui', 'gun', 'guo', 'ha', 'hai', 'han', 'hang', 'hao', 'he', 'hei', 'hen', 'heng',
+    'hong', 'hou', 'hu', 'hua', 'huai', 'huan', 'huang', 'hui', 'hun', 'huo', 'ji', 'jia', 'jian', 'jiang', 'jiao',
+    'jie', 'jin', 'jing', 'jiong', 'jiu', 'ju', 'juan', 'jue', 'jun', 'ka', 'kai', 'kan', 'kang', 'kao', 'ke',
+    'kei', 'ken', 'keng', 'kong', 'kou', 'ku', 'kua', 'kuai', 'kuan', 'kuang', 'kui', 'kun', 'kuo', 'la', 'lai',
+    'lan', 'lang', 'lao', 'le', 'lei', 'len', 'leng', 'li', 'lia', 'lian', 'liang', 'liao', 'lie', 'lin', 'ling',
+    'liu', 'lo', 'long', 'lou', 'lu', 'luan', 'lun', 'luo', 'lv', 'lve', 'ma', 'mai', 'man', 'mang', 'mao', 'me',
+    'mei', 'men', 'meng', 'mi', 'mian', 'miao', 'mie', 'min', 'ming', 'miu', 'mo', 'mou', 'mu', 'na', 'nai', 'nan',
+    'nang', 'nao', 'ne', 'nei', 'nen', 'neng', 'ni', 'nian', 'niang', 'niao', 'nie', 'nin', 'ning', 'niu', 'nong',
+    'nou', 'nu', 'nuan', 'nun', 'nuo', 'nv', 'nve', 'o', 'ou', 'pa', 'pai', 'pan', 'pang', 'pao', 'pei', 'pen',
+    'peng', 'pi', 'pian', 'piao', 'pie', 'pin', 'ping', 'po', 'pou', 'pu', 'qi', 'qia', 'qian', 'qiang', 'qiao',
+    'qie', 'qin', 'qing', 'qiong', 'qiu', 'qu', 'quan', 'que', 'qun', 'ran', 'rang', 'rao', 're', 'ren', 'reng',
+    'ri', 'rong', 'rou', 'ru', 'rua', 'ruan', 'rui', 'run', 'ruo', 'sa', 'sai', 'san', 'sang', 'sao', 'se', 'sen',
+    'seng', 'sha', 'shai', 'shan', 'shang', 'shao', 'she', 'shei', 'shen', 'sheng', 'shi', 'shou', 'shu', 'shua',
+    'shuai', 'shuan', 'shuang', 'shui', 'shun', 'shuo', 'si', 'song', 'sou', 'su', 'suan', 'sui', 'sun', 'suo',
+    'ta', 'tai', 'tan', 'tang', 'tao', 'te', 'tei', 'teng', 'ti', 'tian', 'tiao', 'tie', 'ting', 'tong', 'tou',
+    'tu', 'tuan', 'tui', 'tun', 'tuo', 'wa', 'wai', 'wan', 'wang', 'wei', 'wen', 'weng', 'wo', 'wu', 'xi', 'xia',
+    'xian', 'xiang', 'xiao', 'xie', 'xin', 'xing', 'xiong', 'xiu', 'xu', 'xuan', 'xue', 'xun', 'ya', 'yan', 'yang',
+    'yao', 'ye', 'yi', 'yin', 'ying', 'yo', 'yong', 'you', 'yu', 'yuan', 'yue', 'yun', 'za', 'zai', 'zan', 'zang',
+    'zao', 'ze', 'zei', 'zen', 'zeng', 'zha', 'zhai', 'zhan', 'zhang', 'zhao', 'zhe', 'zhei', 'zhen', 'zheng',
+    'zhi', 'zhong', 'zhou', 'zhu', 'zhua', 'zhuai', 'zhuan', 'zhuang', 'zhui', 'zhun', 'zhuo', 'zi', 'zong', 'zou',
+    'zu', 'zuan', 'zui', 'zun', 'zuo',
+)
+
+
+def _split_to_xiaohe(quan_pinyin: str) -> str:
     """
-    将全拼转换为小鹤双拼
+    按声母和韵母拆分全拼并查表转换为小鹤双拼, 不做缓存
     :param quan_pinyin: 全拼字符串
     :return: 小鹤双拼字符串
+    :raises ValueError: 输入不是合法的全拼
     """
-    try:
-        # 检查输入是否为合法的全拼
-        if not all(c.isalpha() or c.isspace() for c in quan_pinyin):
-            raise ValueError("Invalid input: input should only contain alphabetic characters and spaces")
-        if not 0 < len(quan_pinyin) < 7:
-            raise ValueError("Invalid input: input should be between 1 and 5 characters long")
+    # 检查输入是否为合法的全拼
+    if not all(c.isalpha() or c.isspace() for c in quan_pinyin):
+        raise ValueError("Invalid input: input should only contain alphabetic characters and spaces")
+    if not 0 < len(quan_pinyin) < 7:
+        raise ValueError("Invalid input: input should be between 1 and 5 characters long")
 
-        # 处理长度为1的拼音
+    # 零声母音节: 单字母双写, 双字母照打, 三字母(ang, eng)为首字母加韵母所在键
+    if quan_pinyin[0] in "aoe":
         if len(quan_pinyin) == 1:
             return quan_pinyin * 2
-        # 处理长度为2的拼音
         if len(quan_pinyin) == 2:
             return quan_pinyin
+        if quan_pinyin in xiaohe_map:
+            return quan_pinyin[0] + xiaohe_map[quan_pinyin]
+        raise ValueError("Invalid input: input should be a valid quanpin")
 
-        # 特殊情况ang，特殊处理吧，后续看要不要分离声母和韵母
-        if quan_pinyin == "ang":
-            return "ah"
+    # 处理长度为1的拼音
+    if len(quan_pinyin) == 1:
+        return quan_pinyin * 2
+    # 处理长度为2的拼音
+    if len(quan_pinyin) == 2:
+        return quan_pinyin
 
-        # 处理长度为3，4，5，6长度的拼音，有多种搭配方式，但是声母一般为2，3长度，韵母长度为1，2，3，4(uang这种）
-        try:
-            if quan_pinyin[:2] in xiaohe_map:
-                result = xiaohe_map[quan_pinyin[:2]] + xiaohe_map[quan_pinyin[2:]]
-            else:
-                result = quan_pinyin[0] + xiaohe_map[quan_pinyin[1:]]
+    # 处理长度为3，4，5，6长度的拼音，声母一般为1，2长度，韵母长度为1，2，3，4(uang这种）
+    try:
+        if quan_pinyin[:2] in xiaohe_map:
+            result = xiaohe_map[quan_pinyin[:2]] + xiaohe_map[quan_pinyin[2:]]
+        else:
+            result = quan_pinyin[0] + xiaohe_map[quan_pinyin[1:]]
+    except KeyError:
+        raise ValueError("Invalid input: input should be a valid quanpin")
 
-                # 这里可能直接发生map错误，然后报错。
-        except KeyError:
-            raise ValueError("Invalid input: input should be a valid quanpin")
+    if len(result) != 2:
+        raise ValueError("Invalid input: input should be a valid quanpin")
+    return result
 
-        if len(result) != 2:
-            raise ValueError("Invalid input: input should be a valid quanpin")
-        else:
-            return result
 
+# 预先计算的全部音节到小鹤双拼的转换表, 转换时只需一次字典查询
+XIAOHE_TABLE: Dict[str, str] = {syllable: _split_to_xiaohe(syllable) for syllable in PINYIN_SYLLABLES}
+
+
+def quanpin_to_xiaohe(quan_pinyin: str) -> str:
+    """
+    将全拼转换为小鹤双拼
+    :param quan_pinyin: 全拼字符串
+    :return: 小鹤双拼字符串, 输入不合法时返回以 Error: 开头的错误信息
+    """
+    code = XIAOHE_TABLE.get(quan_pinyin)
+    if code is not None:
+        return code
+    # 不在转换表中的输入(m、n 等罕见音节或非法输入)按原来的规则拆分
+    try:
+        return _split_to_xiaohe(quan_pinyin)
     except Exception as e:
         logger.error(f"Error converting quanpin to xiaohe: {e}")
         return f"Error: {e}"
 
 
+@lru_cache(maxsize=1024)
+def _convert_uncommon(quan_pinyin: str) -> Optional[str]:
+    try:
+        return _split_to_xiaohe(quan_pinyin)
+    except ValueError as e:
+        logger.error(f"Error converting quanpin to xiaohe '{quan_pinyin}': {e}")
+        return None
+
+
+def convert_many(syllables: Iterable[str], scheme: str = 'xiaohe') -> List[Optional[str]]:
+    """
+    批量将全拼音节转换为双拼编码
+    :param syllables: 全拼音节序列
+    :param scheme: 双拼方案名称, 默认为小鹤双拼
+    :return: 与输入一一对应的双拼编码列表, 无法转换的音节为 None
+    """
+    if scheme != 'xiaohe':
+        return get_scheme(scheme).convert_many(syllables)
+    get = XIAOHE_TABLE.get
+    return [get(syllable) or _convert_uncommon(syllable) for syllable in syllables]
+
+
+class ShuangpinScheme:
+    """
+    双拼方案, 由声母键位、韵母键位和零声母规则编译出全部音节的编码表
+
+    zero_initial 为 'natural' 时零声母音节按小鹤、自然码的规则编码: 单字母双写, 双字母照打,
+    三字母为首字母加韵母键; 为单个字母时(如微软、搜狗的 'o')以该键作为声母键, 再加韵母键。
+    """
+
+    def __init__(self, name: str, initials: Dict[str, str], finals: Dict[str, str], zero_initial: str = 'natural'):
+        """
+        :param name: 方案名称
+        :param initials: 双字母声母(zh, ch, sh)的键位
+        :param finals: 韵母的键位, 未列出的单字母韵母使用本身的字母
+        :param zero_initial: 零声母规则, 'natural' 或零声母使用的键
+        """
+        if zero_initial != 'natural' and len(zero_initial) != 1:
+            raise ValueError(f"Invalid zero_initial for scheme {name}: {zero_initial}")
+        self.name = name
+        self.initials = dict(initials)
+        self.finals = dict(finals)
+        self.zero_initial = zero_initial
+        self.table: Dict[str, str] = {}
+        for syllable in PINYIN_SYLLABLES:
+            code = self._encode_syllable(syllable)
+            if code is None:
+                raise ValueError(f"Scheme {name} cannot encode syllable '{syllable}'")
+            self.table[syllable] = code
+        self._uncommon: Dict[str, Optional[str]] = {}
+
+    def _final_key(self, final: str) -> Optional[str]:
+        key = self.finals.get(final)
+        if key is None and len(final) == 1:
+            return final
+        return key
+
+    def _encode_syllable(self, syllable: str) -> Optional[str]:
+        if not syllable.isalpha() or not syllable.islower():
+            return None
+        if syllable[0] in "aoe":
+            if self.zero_initial != 'natural':
+                key = self._final_key(syllable)
+                return self.zero_initial + key if key else None
+            if len(syllable) == 1:
+                return syllable * 2
+            if len(syllable) == 2:
+                return syllable
+            key = self.finals.get(syllable)
+            return syllable[0] + key if key else None
+
+        initial = syllable[:2] if syllable[:2] in ("zh", "ch", "sh") else syllable[0]
+        final = syllable[len(initial):]
+        if not final:
+            # m、n 等只有辅音的音节双写
+            return syllable * 2 if len(initial) == 1 else None
+        key = self._final_key(final)
+        return self.initials.get(initial, initial) + key if key else None
+
+    def convert(self, syllable: str) -> Optional[str]:
+        """
+        :param syllable: 全拼音节
+        :return: 双拼编码, 无法转换时返回 None
+        """
+        code = self.table.get(syllable)
+        if code is None:
+            if syllable not in self._uncommon:
+                self._uncommon[syllable] = self._encode_syllable(syllable)
+                if self._uncommon[syllable] is None:
+                    logger.error(f"Error converting quanpin '{syllable}' to {self.name}")
+            code = self._uncommon[syllable]
+        return code
+
+    def convert_many(self, syllables: Iterable[str]) -> List[Optional[str]]:
+        """
+        :param syllables: 全拼音节序列
+        :return: 与输入一一对应的双拼编码列表, 无法转换的音节为 None
+        """
+        get = self.table.get
+        return [get(syllable) or self.convert(syllable) for syllable in syllables]
+
+    def encode(self, syllables: Iterable[str]) -> Optional[str]:
+        """
+        :param syllables: 一个词的全拼音节序列
+        :return: 整个词的双拼编码, 有音节无法转换或没有音节时返回 None
+        """
+        codes = self.convert_many(syllables)
+        if not codes or None in codes:
+            return None
+        return "".join(codes)
+
+
+# 各方案双字母声母的键位都相同
+_SHENGMU_KEYS = {'zh': 'v', 'ch': 'i', 'sh': 'u'}
+
+# 微软双拼和搜狗双拼只有个别韵母的键位不同
+_MICROSOFT_FINALS = {
+    'iu': 'q', 'ia': 'w', 'ua': 'w', 'uan': 'r', 'er': 'r', 'ue': 't', 'uai': 'y', 'v': 'y', 'uo': 'o',
+    'un': 'p', 'ong': 's', 'iong': 's', 'iang': 'd', 'uang': 'd', 'en': 'f', 'eng': 'g', 'ang': 'h', 'an': 'j',
+    'ao': 'k', 'ai': 'l', 'ing': ';', 'ei': 'z', 'ie': 'x', 'iao': 'c', 'ui': 'v', 've': 'v', 'ou': 'b',
+    'in': 'n', 'ian': 'm',
+}
+
+BUILTIN_SCHEMES: Dict[str, ShuangpinScheme] = {
+    scheme.name: scheme for scheme in (
+        ShuangpinScheme('xiaohe', _SHENGMU_KEYS,
+                        {key: value for key, value in xiaohe_map.items() if key not in _SHENGMU_KEYS}),
+        ShuangpinScheme('ziranma', _SHENGMU_KEYS, {
+            'iu': 'q', 'ia': 'w', 'ua': 'w', 'uan': 'r', 'ue': 't', 've': 't', 'ing': 'y', 'uai': 'y', 'uo': 'o',
+            'un': 'p', 'ong': 's', 'iong': 's', 'iang': 'd', 'uang': 'd', 'en': 'f', 'eng': 'g', 'ang': 'h',
+            'an': 'j', 'ao': 'k', 'ai': 'l', 'ei': 'z', 'ie': 'x', 'iao': 'c', 'ui': 'v', 'ou': 'b', 'in': 'n',
+            'ian': 'm',
+        }),
+        ShuangpinScheme('microsoft', _SHENGMU_KEYS, _MICROSOFT_FINALS, zero_initial='o'),
+        ShuangpinScheme('sogou', _SHENGMU_KEYS, dict(_MICROSOFT_FINALS, ve='t'), zero_initial='o'),
+    )
+}
+
+# 已注册的方案, 包括内置方案和从文件加载的自定义方案
+SCHEMES: Dict[str, ShuangpinScheme] = dict(BUILTIN_SCHEMES)
+
+
+def register_scheme(scheme: ShuangpinScheme) -> ShuangpinScheme:
+    """
+    注册双拼方案, 同名方案会被覆盖
+    :param scheme: 双拼方案
+    :return: 注册的方案
+    """
+    SCHEMES[scheme.name] = scheme
+    return scheme
+
+
+def get_scheme(name: str) -> ShuangpinScheme:
+    """
+    :param name: 方案名称
+    :return: 已注册的双拼方案
+    :raises ValueError: 方案不存在
+    """
+    try:
+        return SCHEMES[name]
+    except KeyError:
+        raise ValueError(f"Unknown shuangpin scheme: {name}")
+
+
+def load_scheme(path: Path) -> ShuangpinScheme:
+    """
+    从 JSON 或 YAML 文件加载自定义双拼方案并注册,
+    可以用 base 指定一个已注册的方案, 只写出与之不同的键位
+    :param path: 方案文件路径, .yaml/.yml 文件需要安装 PyYAML
+    :return: 注册的方案
+    """
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.suffix in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is required to load YAML shuangpin schemes")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    initials, finals, zero_initial = _SHENGMU_KEYS, {}, 'natural'
+    if data.get('base'):
+        base = get_scheme(data['base'])
+        initials, finals, zero_initial = base.initials, base.finals, base.zero_initial
+    scheme = ShuangpinScheme(data['name'], dict(initials, **data.get('initials', {})),
+                             dict(finals, **data.get('finals', {})), data.get('zero_initial', zero_initial))
+    logger.info(f"Loaded shuangpin scheme {scheme.name} from {path}")
+    return register_scheme(scheme)
+
+
+# 合法的无调拼音音节只包含小写字母
+_PINYIN_PATTERN = re.compile(r"^[a-z]+$")
+
+# 单条 SQL 中 IN 查询的最大参数个数, 低于 SQLite 默认的变量数上限
+QUERY_CHUNK_SIZE = 500
+
+
+def _pypinyin():
+    """
+    第一次标注拼音时才导入 pypinyin, 它在导入时加载词组数据, 没有新词时不需要这部分启动时间
+    """
+    import pypinyin
+    return pypinyin
+
+
 def word_get_pinyin(word: str) -> List[str]:
     """
     给汉字词语标注上拼音，不需要声调，处理多音字问题
@@ -70,13 +337,13 @@ def word_get_pinyin(word: str) -> List[str]:
     """
     try:
         # 使用 pypinyin 获取拼音列表
-        pinyin_list = pinyin(word, style=Style.NORMAL, heteronym=False)
-        logger.debug(f"{word} {pinyin_list}")
-
-        filter_rule = re.compile(r"^[a-z]+$")
+        pypinyin = _pypinyin()
+        pinyin_list = pypinyin.pinyin(word, style=pypinyin.Style.NORMAL, heteronym=False)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"{word} {pinyin_list}")
 
         for item in pinyin_list:
-            if not bool(filter_rule.match(item[0])):
+            if not _PINYIN_PATTERN.match(item[0]):
                 raise ValueError("PinYinTools: word_get_pinyin : Invalid input: input should be a valid Chinese word")
 
         # 返回拼音列表
@@ -86,6 +353,206 @@ def word_get_pinyin(word: str) -> List[str]:
         return []
 
 
+def iter_ranked_readings(candidates: Sequence[Sequence[str]], limit: int) -> Iterator[Tuple[str, ...]]:
+    """
+    按代价从小到大生成读音组合, 代价为各字所选候选读音的序号之和
+
+    用最小堆逐个展开组合, 只访问输出的 limit 个组合及其相邻组合,
+    不会展开全部的笛卡尔积, 多音字很多的长词也只占用 O(limit * 字数) 的内存。
+    :param candidates: 每个字的候选读音, 按可能性从高到低排列
+    :param limit: 最多生成的组合数
+    :return: 读音组合的迭代器
+    """
+    if limit <= 0 or not candidates or not all(candidates):
+        return
+    start = (0,) * len(candidates)
+    heap = [(0, start)]
+    visited = {start}
+    produced = 0
+    while heap and produced < limit:
+        cost, indexes = heapq.heappop(heap)
+        yield tuple(options[index] for options, index in zip(candidates, indexes))
+        produced += 1
+        for position, index in enumerate(indexes):
+            if index + 1 < len(candidates[position]):
+                following = indexes[:position] + (index + 1,) + indexes[position + 1:]
+                if following not in visited:
+                    visited.add(following)
+                    heapq.heappush(heap, (cost + 1, following))
+
+
+def word_get_readings(word: str, max_readings: int = 4, max_per_char: int = 3,
+                      primary: Optional[Sequence[str]] = None) -> List[Tuple[str, ...]]:
+    """
+    给多音字词语标注多个可能的读音, 按可能性从高到低排列
+
+    第一个读音与 word_get_pinyin 相同, 由 pypinyin 按词组数据选出; 词组数据中有多种读法的词
+    只在这些读法中组合, 其余的词按单字的多音字读音组合, 单字读音越靠后代价越高。
+    :param word: 汉字词语
+    :param max_readings: 最多返回的读音数
+    :param max_per_char: 每个字最多考虑的读音数
+    :param primary: 已经标注好的首选读音, 为空时重新标注
+    :return: 读音列表, 无法标注时为空
+    """
+    primary = tuple(primary) if primary is not None else tuple(word_get_pinyin(word))
+    if not primary or max_readings <= 1:
+        return [primary] if primary else []
+
+    try:
+        pypinyin = _pypinyin()
+        heteronyms = pypinyin.pinyin(word, style=pypinyin.Style.NORMAL, heteronym=True)
+    except Exception as e:
+        logger.error(f"Error getting heteronyms for word '{word}': {e}")
+        return [primary]
+    if len(heteronyms) != len(primary):
+        return [primary]
+
+    candidates = []
+    for chosen, options in zip(primary, heteronyms):
+        char_candidates = [chosen]
+        for option in options:
+            if len(char_candidates) >= max_per_char:
+                break
+            if option not in char_candidates and _PINYIN_PATTERN.match(option):
+                char_candidates.append(option)
+        candidates.append(char_candidates)
+    return list(iter_ranked_readings(candidates, max_readings))
+
+
+class PinyinAnnotator:
+    """
+    批量给词语标注拼音, 结果保存在按最近使用淘汰的内存缓存中, 守护进程的各轮运行共用
+
+    配置了 db_path 时, 新的标注结果在 flush 时写入 SQLite, 内存缓存未命中的词先查磁盘,
+    这样重建整个词库时大部分词都不需要再调用 pypinyin。
+    """
+
+    def __init__(self, max_entries: int = 100000, db_path: Optional[Path] = None):
+        """
+        :param max_entries: 内存缓存的最大词数
+        :param db_path: 磁盘缓存路径, 为空时只使用内存缓存
+        """
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self._pending: Dict[str, Tuple[str, ...]] = {}
+        self._conn = None
+        if db_path is not None:
+            # 流水线在保存线程中标注拼音, 连接可能在其他线程中创建
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pinyin_cache (
+                    word TEXT PRIMARY KEY,
+                    syllables TEXT
+                ) WITHOUT ROWID
+            """)
+            self._conn.commit()
+
+    def _remember(self, word: str, syllables: Tuple[str, ...]) -> None:
+        self._cache[word] = syllables
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _load_from_disk(self, words: List[str]) -> Dict[str, Tuple[str, ...]]:
+        found = {}
+        if self._conn is None:
+            return found
+        try:
+            for i in range(0, len(words), QUERY_CHUNK_SIZE):
+                chunk = words[i:i + QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for word, syllables in self._conn.execute(
+                        f"SELECT word, syllables FROM pinyin_cache WHERE word IN ({placeholders})", chunk):
+                    found[word] = tuple(syllables.split())
+        except sqlite3.Error as e:
+            logger.error(f"Error reading pinyin cache: {e}")
+        return found
+
+    def annotate(self, words: Iterable[str]) -> Dict[str, Tuple[str, ...]]:
+        """
+        批量标注拼音, 重复的词只标注一次
+        :param words: 词语序列
+        :return: {词语: 拼音音节}, 无法标注的词音节为空
+        """
+        result: Dict[str, Tuple[str, ...]] = {}
+        misses = []
+        cache = self._cache
+        for word in dict.fromkeys(words):
+            syllables = cache.get(word)
+            if syllables is None:
+                misses.append(word)
+            else:
+                cache.move_to_end(word)
+                result[word] = syllables
+        self.hits += len(result)
+        self.misses += len(misses)
+        PINYIN_WORDS.inc(len(result), source="memory")
+
+        if misses:
+            found = self._load_from_disk(misses)
+            PINYIN_WORDS.inc(len(found), source="disk")
+            PINYIN_WORDS.inc(len(misses) - len(found), source="pypinyin")
+            for word in misses:
+                syllables = found.get(word)
+                if syllables is None:
+                    syllables = tuple(word_get_pinyin(word))
+                    if self._conn is not None:
+                        self._pending[word] = syllables
+                self._remember(word, syllables)
+                result[word] = syllables
+        return result
+
+    def flush(self) -> bool:
+        """
+        把新的标注结果写入磁盘缓存
+        :return: 如果写入成功返回 True，否则返回 False
+        """
+        if self._conn is None or not self._pending:
+            return True
+        try:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO pinyin_cache (word, syllables) VALUES (?, ?)",
+                                       ((word, " ".join(syllables)) for word, syllables in self._pending.items()))
+            self._pending.clear()
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving pinyin cache: {e}")
+            return False
+
+    def stats(self) -> dict:
+        """
+        :return: 命中次数、未命中次数和内存缓存中的词数
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
+
+    def close(self) -> None:
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+
+
+# 未指定标注器时使用的默认标注器, 只使用内存缓存
+_default_annotator = PinyinAnnotator()
+
+
+def annotate_words(words: Iterable[str], scheme: Optional[str] = None,
+                   annotator: Optional[PinyinAnnotator] = None) -> Dict[str, object]:
+    """
+    批量标注词语, 可以直接返回指定双拼方案的编码
+    :param words: 词语序列
+    :param scheme: 双拼方案名称, 为空时返回拼音音节
+    :param annotator: 使用的标注器, 为空时使用模块内共享的标注器
+    :return: scheme 为空时为 {词语: 拼音音节}, 否则为 {词语: 编码}, 无法编码的词为 None
+    """
+    annotations = (annotator or _default_annotator).annotate(words)
+    if scheme is None:
+        return annotations
+    encode = get_scheme(scheme).encode
+    return {word: encode(syllables) for word, syllables in annotations.items()}
+
+
 if __name__ == "__main__":
     # 示例用法
 
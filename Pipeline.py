@@ -0,0 +1,137 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterable, Awaitable, Callable, Dict, List, Set, Tuple
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+# 各阶段之间队列的结束标记
+_DONE = object()
+
+
+class PipelineStats:
+    """
+    一次流水线运行的统计数据
+    """
+
+    def __init__(self):
+        self.sentence_batches = 0
+        self.sentences = 0
+        self.segment_errors = 0
+        self.words = 0
+        self.flushes = 0
+        self.max_sentence_queue = 0
+        self.max_word_queue = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+async def run_pipeline(sentence_batches: AsyncIterable[Tuple[str, List[str]]],
+                       segment: Callable[[List[str]], Awaitable[Set[str]]],
+                       persist: Callable[[Dict[str, str], List[str]], None],
+                       segment_workers: int = 4, queue_size: int = 8, word_batch_size: int = 500,
+                       flush_interval: float = 5.0) -> PipelineStats:
+    """
+    爬取、分词、标注保存三个阶段通过有界队列连接并同时运行
+    爬取阶段产出的每批句子立即交给分词, 新词累积到 word_batch_size 个或等待超过 flush_interval 秒时
+    交给 persist 保存一次。队列满时上游暂停, 同时在内存中的句子和词不会超过队列容量。
+    persist 会写数据库和词库文件, 在本次运行专用的一个保存线程中依次执行, 保存期间事件循环继续爬取和分词。
+    :param sentence_batches: 异步产出 (来源名称, 句子列表) 的爬取阶段
+    :param segment: 分词函数, 返回一批句子中的词
+    :param persist: 保存函数, 参数为 {新词: 来源名称} 和这些词所在的句子, 总是在同一个保存线程中执行,
+        用到的 SQLite 连接需要以 check_same_thread=False 打开
+    :param segment_workers: 同时分词的批次数
+    :param queue_size: 每个队列的最大批次数
+    :param word_batch_size: 每次保存的最大词数
+    :param flush_interval: 累积的词等待保存的最长秒数
+    :return: 运行统计
+    """
+    stats = PipelineStats()
+    sentence_queue: asyncio.Queue = asyncio.Queue(queue_size)
+    word_queue: asyncio.Queue = asyncio.Queue(queue_size)
+    # 只有一个线程, 各次 persist 不会并发, 数据库连接同一时间只被一个线程使用
+    persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-persist")
+
+    async def produce() -> None:
+        async for source_name, sentences in sentence_batches:
+            stats.sentence_batches += 1
+            stats.sentences += len(sentences)
+            await sentence_queue.put((source_name, sentences))
+            stats.max_sentence_queue = max(stats.max_sentence_queue, sentence_queue.qsize())
+        for _ in range(segment_workers):
+            await sentence_queue.put(_DONE)
+
+    async def segment_worker() -> None:
+        while True:
+            item = await sentence_queue.get()
+            if item is _DONE:
+                break
+            source_name, sentences = item
+            try:
+                words = await segment(sentences)
+            except Exception as e:
+                # segment 抛出异常时这批句子不会交给 persist, 也就不会被标记为已处理
+                # (大模型分词失败时会退回 jieba 分词, 不会走到这里)
+                stats.segment_errors += 1
+                logger.error(f"{source_name}: 分词失败: {e}")
+                continue
+            await word_queue.put((source_name, sentences, words))
+            stats.max_word_queue = max(stats.max_word_queue, word_queue.qsize())
+        await word_queue.put(_DONE)
+
+    async def consume() -> None:
+        loop = asyncio.get_running_loop()
+        pending_words: Dict[str, str] = {}
+        pending_sentences: List[str] = []
+        seen_words: Set[str] = set()
+        deadline = None
+        finished = 0
+
+        async def flush() -> None:
+            nonlocal deadline
+            deadline = None
+            if not pending_words and not pending_sentences:
+                return
+            await loop.run_in_executor(persist_executor, persist, dict(pending_words), list(pending_sentences))
+            stats.words += len(pending_words)
+            stats.flushes += 1
+            pending_words.clear()
+            pending_sentences.clear()
+
+        while finished < segment_workers:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(word_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+            if item is _DONE:
+                finished += 1
+                continue
+
+            source_name, sentences, words = item
+            pending_sentences.extend(sentences)
+            for word in words:
+                # 同一次运行中已经交给 persist 的词不再重复处理
+                if word not in seen_words:
+                    seen_words.add(word)
+                    pending_words[word] = source_name
+            if deadline is None:
+                deadline = loop.time() + flush_interval
+            if len(pending_words) >= word_batch_size:
+                await flush()
+        await flush()
+
+    tasks = [asyncio.ensure_future(produce()), asyncio.ensure_future(consume())]
+    tasks.extend(asyncio.ensure_future(segment_worker()) for _ in range(segment_workers))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # 正常结束时保存线程已经空闲; 出错时不阻塞事件循环等待正在执行的 persist
+        persist_executor.shutdown(wait=False)
+    return stats
+
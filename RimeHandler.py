@@ -1,8 +1,13 @@
 import sqlite3
+import time
 from collections import namedtuple
 from datetime import datetime
+from itertools import chain
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from Metrics import DICT_ENTRIES, SQLITE_WRITE_LATENCY
+from WordIndex import WordIndex
 from logger_config import setup_logger
 
 # 定义命名元组
@@ -16,38 +21,109 @@ class RimeFileHandler:
     处理Rime用户词库文件的类
     """
 
-    def __init__(self, file_path: Path):
+    def __init__(self, file_path: Path, index: Optional[WordIndex] = None):
+        """
+        :param file_path: 词库文件路径
+        :param index: 词条成员索引, 追加词条时同步更新
+        """
         self.file_path = file_path
+        self.index = index
 
-    def read_dict(self) -> Dict[str, RimeEntry]:
+    def _ensure_index(self) -> bool:
         """
-        读取Rime用户词库文件
-        :return: 词库字典，格式为 {词条: RimeEntry}
+        :return: 索引是否从词库文件重建
         """
-        user_dict: Dict[str, RimeEntry] = {}
+        if self.index.is_fresh(self.file_path):
+            return False
+        self.index.rebuild(self.iter_words, self.file_path)
+        return True
+
+    def find_existing(self, words: Iterable[str], verify: Optional[Callable[[List[str]], Set[str]]] = None,
+                      on_rebuild: Optional[Callable[[], object]] = None) -> Set[str]:
+        """
+        找出已经在词库中的词。有索引时只检查待查询的词, 不读取词库文件;
+        索引判断为可能存在的词再由 verify 精确确认, 没有 verify 时按存在处理
+        :param words: 待查询的词
+        :param verify: 精确查询函数, 例如 RimeSQLiteHandler.contains_words
+        :param on_rebuild: 词库文件在索引之外被修改、索引重建后调用, 用于把文件中的词条同步到 verify 查询的数据库
+        :return: 已存在的词的集合
+        """
+        if self.index is None:
+            word_set = self.load_word_set()
+            return {word for word in words if word in word_set}
+        if self._ensure_index() and on_rebuild is not None:
+            on_rebuild()
+        candidates = [word for word in dict.fromkeys(words) if self.index.might_contain(word)]
+        if verify is None or not candidates:
+            return set(candidates)
+        return verify(candidates)
+
+    @staticmethod
+    def parse_line(line: str) -> Optional[Tuple[str, RimeEntry]]:
+        """
+        解析词库文件中的一行
+        :param line: 一行文本
+        :return: (词条, RimeEntry)，注释和空行返回 None
+        :raises ValueError: 格式不正确的行
+        """
+        # 跳过注释和空行
+        if line.startswith("#") or line.strip() == "":
+            return None
+        # 按Tab符分割词条、编码和权重
+        parts = line.strip().split("\t")
+        if len(parts) == 2:
+            word, code = parts
+            weight = None
+        elif len(parts) == 3:
+            word, code, weight = parts
+        else:
+            raise ValueError(f"Invalid line: {line}")
+        return word, RimeEntry(code, weight)
+
+    def _iter_lines(self) -> Iterator[str]:
         try:
             with self.file_path.open("r", encoding="utf-8") as f:
-                for line in f:
-                    # 跳过注释和空行
-                    if line.startswith("#") or line.strip() == "":
-                        continue
-                    # 按Tab符分割词条、编码和权重
-                    parts = line.strip().split("\t")
-                    if len(parts) == 2:
-                        word, code = parts
-                        weight = None
-                    elif len(parts) == 3:
-                        word, code, weight = parts
-                    else:
-                        raise ValueError(f"Invalid line: {line}")
-                    user_dict[word] = RimeEntry(code, weight)
+                yield from f
         except FileNotFoundError:
             logger.error(f"File not found: {self.file_path}")
-            return {}
         except IOError as e:
             logger.error(f"Error reading file: {e}")
-            return {}
-        return user_dict
+
+    def iter_entries(self) -> Iterator[Tuple[str, RimeEntry]]:
+        """
+        逐行读取Rime用户词库文件，不会把整个词库放进内存
+        :return: (词条, RimeEntry) 的迭代器，同一个词有多个编码时会出现多次
+        """
+        for line in self._iter_lines():
+            item = self.parse_line(line)
+            if item is not None:
+                yield item
+
+    def iter_words(self) -> Iterator[str]:
+        """
+        逐行读取词库文件中的词条，只取第一列，不解析编码和权重
+        :return: 词条的迭代器，同一个词有多个编码时会出现多次
+        """
+        for line in self._iter_lines():
+            if line.startswith("#"):
+                continue
+            word = line.strip().split("\t", 1)[0]
+            if word:
+                yield word
+
+    def load_word_set(self) -> Set[str]:
+        """
+        只读取词条用于判断一个词是否已在词库中，比 read_dict 占用的内存少得多
+        :return: 词条集合
+        """
+        return set(self.iter_words())
+
+    def read_dict(self) -> Dict[str, RimeEntry]:
+        """
+        读取Rime用户词库文件
+        :return: 词库字典，格式为 {词条: RimeEntry}
+        """
+        return dict(self.iter_entries())
 
     def write_dict(self, user_dict: Dict[str, RimeEntry]) -> bool:
         """
@@ -58,7 +134,7 @@ class RimeFileHandler:
         try:
             with self.file_path.open("w", encoding="utf-8") as f:
                 for word, entry in user_dict.items():
-                    if entry.weight:
+                    if entry.weight is not None:
                         f.write(f"{word}\t{entry.code}\t{entry.weight}\n")
                     else:
                         f.write(f"{word}\t{entry.code}\n")
@@ -74,28 +150,161 @@ class RimeFileHandler:
         :param add_date_comment: 是否添加日期注释
         :return: 如果追加成功返回 True，否则返回 False
         """
+        return self.append_entries(new_entries.items(), add_date_comment)
+
+    def append_entries(self, new_entries: Iterable[Tuple[str, RimeEntry]], add_date_comment: bool = False) -> bool:
+        """
+        追加新行到Rime用户词库文件，同一个词可以有多个编码（多音字的不同读音）
+        :param new_entries: 新词条序列，格式为 (词条, RimeEntry)
+        :param add_date_comment: 是否添加日期注释
+        :return: 如果追加成功返回 True，否则返回 False，没有词条时不写入任何内容并返回 True
+        """
+        new_entries = iter(new_entries)
+        first = next(new_entries, None)
+        if first is None:
+            return True
+        # 追加前索引与文件一致时才增量更新, 否则下次查询时重建
+        index_fresh = self.index is not None and self.index.is_fresh(self.file_path)
+        words = []
         try:
             with self.file_path.open("a", encoding="utf-8") as f:
                 if add_date_comment:
                     f.write(f"\n# Added on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                for word, entry in new_entries.items():
-                    if entry.weight:
+                for word, entry in chain((first,), new_entries):
+                    words.append(word)
+                    if entry.weight is not None:
                         f.write(f"{word}\t{entry.code}\t{entry.weight}\n")
                     else:
                         f.write(f"{word}\t{entry.code}\n")
-            return True
         except IOError as e:
             logger.error(f"Error appending to file: {e}")
             return False
+        DICT_ENTRIES.inc(len(words), target="file")
+
+        if index_fresh:
+            self.index.add(words, self.file_path)
+            if self.index.needs_resize():
+                self.index.rebuild(self.iter_words, self.file_path)
+        return True
+
+
+# 数据库表结构的版本, 记录在 PRAGMA user_version 中
+SCHEMA_VERSION = 2
+
+# 二级索引: (索引名, 列名)
+SECONDARY_INDEXES = (
+    ("idx_rime_user_dict_code", "code"),
+    ("idx_rime_user_dict_first_seen", "first_seen"),
+    ("idx_rime_user_dict_last_seen", "last_seen"),
+)
+
+# 单条 SQL 中 IN 查询的最大参数个数, 低于 SQLite 默认的变量数上限
+QUERY_CHUNK_SIZE = 500
 
 
 class RimeSQLiteHandler:
     """
     处理Rime用户词库SQLite数据库的类
+
+    数据库连接在第一次使用时打开并一直复用, 使用 WAL 日志模式,
+    批量写入在一个事务中用 executemany 完成。
+
+    表结构(版本2)以 (词条, 编码) 为主键, 同一个词的多个读音各占一行,
+    另外记录整数权重、首次和最近出现时间、出现次数、来源和分词方式。
+    打开版本1(只有 word, code, weight 三个文本列)的数据库时会自动迁移。
     """
 
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, cache_size_kib: int = 65536):
+        """
+        :param db_path: 数据库路径
+        :param cache_size_kib: SQLite 页缓存大小(KiB)
+        """
         self.db_path = db_path
+        self.cache_size_kib = cache_size_kib
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # 流水线在保存线程中写入, 连接可能在其他线程中创建
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode = WAL")
+                # WAL 模式下 NORMAL 不会损坏数据库, 只在断电时可能丢失最后提交的事务
+                conn.execute("PRAGMA synchronous = NORMAL")
+                conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kib)}")
+                conn.execute("PRAGMA temp_store = MEMORY")
+                self._migrate(conn)
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        """
+        创建或升级表结构
+        """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+        if version > SCHEMA_VERSION:
+            raise sqlite3.DatabaseError(f"unsupported schema version {version}, expected {SCHEMA_VERSION}")
+
+        now = int(time.time())
+        with conn:
+            conn.execute("""
+                CREATE TABLE rime_user_dict_v2 (
+                    word TEXT NOT NULL,
+                    code TEXT NOT NULL,
+                    weight INTEGER,
+                    first_seen INTEGER NOT NULL,
+                    last_seen INTEGER NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 1,
+                    source TEXT,
+                    segmenter TEXT,
+                    PRIMARY KEY (word, code)
+                ) WITHOUT ROWID
+            """)
+            old_table = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rime_user_dict'").fetchone()
+            if old_table:
+                # 版本1的权重是文本, 无法转换为整数的权重记为 NULL, 原来没有时间信息, 记为迁移时间
+                conn.execute("""
+                    INSERT OR IGNORE INTO rime_user_dict_v2 (word, code, weight, first_seen, last_seen)
+                    SELECT word, COALESCE(code, ''),
+                           CASE WHEN CAST(weight AS INTEGER) || '' = TRIM(weight) THEN CAST(weight AS INTEGER) END,
+                           ?, ?
+                    FROM rime_user_dict
+                """, (now, now))
+                conn.execute("DROP TABLE rime_user_dict")
+                logger.info(f"Migrated rime_user_dict to schema version {SCHEMA_VERSION}")
+            conn.execute("ALTER TABLE rime_user_dict_v2 RENAME TO rime_user_dict")
+            RimeSQLiteHandler._create_indexes(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @staticmethod
+    def _create_indexes(conn: sqlite3.Connection) -> None:
+        for name, column in SECONDARY_INDEXES:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON rime_user_dict ({column})")
+
+    @staticmethod
+    def _drop_indexes(conn: sqlite3.Connection) -> None:
+        for name, _ in SECONDARY_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+    @staticmethod
+    def _parse_weight(weight) -> Optional[int]:
+        # 词库文件中的权重是字符串, 无法转换为整数的权重记为 NULL
+        try:
+            return int(weight) if weight is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _to_entry(code: str, weight: Optional[int]) -> RimeEntry:
+        # 与词库文件中读出的词条保持一致, 权重使用字符串
+        return RimeEntry(code, str(weight) if weight is not None else None)
 
     def save_sqlite(self, user_dict: Dict[str, RimeEntry]) -> bool:
         """
@@ -103,22 +312,106 @@ class RimeSQLiteHandler:
         :param user_dict: 词库字典，格式为 {词条: RimeEntry}
         :return: 如果保存成功返回 True，否则返回 False
         """
+        return self.save_entries(user_dict.items())
+
+    def save_entries(self, entries: Iterable[Tuple[str, RimeEntry]], sources: Optional[Mapping[str, str]] = None,
+                     segmenter: Optional[str] = None) -> bool:
+        """
+        在一个事务中批量保存词条, 词条可以是生成器, 不需要全部放在内存中
+        已存在的 (词条, 编码) 更新权重和最近出现时间, 出现次数加一
+        表为空时(初次导入用户词库)先删除二级索引, 写入后再一次性建立, 比逐行维护三个索引快得多
+        :param entries: 词条序列，格式为 (词条, RimeEntry)
+        :param sources: 词条的来源, 格式为 {词条: 来源名称}
+        :param segmenter: 分词方式
+        :return: 如果保存成功返回 True，否则返回 False
+        """
+        now = int(time.time())
+        sources = sources or {}
+        rows = ((word, entry.code, self._parse_weight(entry.weight), now, now, sources.get(word), segmenter)
+                for word, entry in entries)
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS rime_user_dict (
-                        word TEXT PRIMARY KEY,
-                        code TEXT,
-                        weight TEXT
-                    )
-                """)
-                for word, entry in user_dict.items():
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO rime_user_dict (word, code, weight)
-                        VALUES (?, ?, ?)
-                    """, (word, entry.code, entry.weight))
-                conn.commit()
+            conn = self._connect()
+            with SQLITE_WRITE_LATENCY.time(operation="save_entries"), conn:
+                bulk_load = conn.execute("SELECT 1 FROM rime_user_dict LIMIT 1").fetchone() is None
+                if bulk_load:
+                    # 删除和重建索引与写入在同一个事务中, 失败回滚时索引保持不变
+                    conn.execute("BEGIN")
+                    self._drop_indexes(conn)
+                cursor = conn.executemany("""
+                    INSERT INTO rime_user_dict (word, code, weight, first_seen, last_seen, source, segmenter)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (word, code) DO UPDATE SET
+                        weight = excluded.weight,
+                        last_seen = excluded.last_seen,
+                        hit_count = hit_count + 1,
+                        source = COALESCE(excluded.source, source),
+                        segmenter = COALESCE(excluded.segmenter, segmenter)
+                """, rows)
+                if bulk_load:
+                    self._create_indexes(conn)
+            DICT_ENTRIES.inc(cursor.rowcount, target="sqlite")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving to SQLite: {e}")
+            return False
+
+    def record_hits(self, words: Iterable[str]) -> bool:
+        """
+        再次出现的已有词条: 出现次数加一, 更新最近出现时间, 同一个词的所有编码一起更新
+        :param words: 已在词库中的词
+        :return: 如果保存成功返回 True，否则返回 False
+        """
+        now = int(time.time())
+        rows = ((now, word) for word in dict.fromkeys(words))
+        try:
+            conn = self._connect()
+            with SQLITE_WRITE_LATENCY.time(operation="record_hits"), conn:
+                conn.executemany(
+                    "UPDATE rime_user_dict SET hit_count = hit_count + 1, last_seen = ? WHERE word = ?", rows)
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving to SQLite: {e}")
+            return False
+
+    def record_first_seen(self, entries: Iterable[Tuple[str, RimeEntry, int]]) -> bool:
+        """
+        记录词条加入词库的时间, 已有的 (词条, 编码) 保留较早的 first_seen, 不增加出现次数
+        :param entries: 词条序列，格式为 (词条, RimeEntry, Unix 时间戳)
+        :return: 如果保存成功返回 True，否则返回 False
+        """
+        rows = ((word, entry.code, self._parse_weight(entry.weight), int(added), int(added))
+                for word, entry, added in entries)
+        try:
+            conn = self._connect()
+            with SQLITE_WRITE_LATENCY.time(operation="record_first_seen"), conn:
+                conn.executemany("""
+                    INSERT INTO rime_user_dict (word, code, weight, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (word, code) DO UPDATE SET
+                        first_seen = MIN(first_seen, excluded.first_seen)
+                """, rows)
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving to SQLite: {e}")
+            return False
+
+    def insert_missing(self, entries: Iterable[Tuple[str, RimeEntry]]) -> bool:
+        """
+        只插入数据库中还没有的 (词条, 编码), 已有的词条保持不变, 用于把词库文件中的词条同步到数据库
+        :param entries: 词条序列，格式为 (词条, RimeEntry)
+        :return: 如果保存成功返回 True，否则返回 False
+        """
+        now = int(time.time())
+        rows = ((word, entry.code, self._parse_weight(entry.weight), now, now) for word, entry in entries)
+        try:
+            conn = self._connect()
+            with SQLITE_WRITE_LATENCY.time(operation="insert_missing"), conn:
+                cursor = conn.executemany("""
+                    INSERT INTO rime_user_dict (word, code, weight, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (word, code) DO NOTHING
+                """, rows)
+            DICT_ENTRIES.inc(cursor.rowcount, target="sqlite")
             return True
         except sqlite3.Error as e:
             logger.error(f"Error saving to SQLite: {e}")
@@ -126,24 +419,104 @@ class RimeSQLiteHandler:
 
     def load_sqlite(self) -> Dict[str, RimeEntry]:
         """
-        从SQLite3数据库加载词库字典
+        从SQLite3数据库加载词库字典, 同一个词有多个编码时取权重最高的
         :return: 词库字典，格式为 {词条: RimeEntry}
         """
         user_dict: Dict[str, RimeEntry] = {}
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT word, code, weight FROM rime_user_dict")
-                for row in cursor.fetchall():
-                    word, code, weight = row
-                    # 将数据库中的NULL值转换为None
-                    weight = weight if weight is not None else None
-                    user_dict[word] = RimeEntry(code, weight)
+            for word, code, weight in self._connect().execute(
+                    "SELECT word, code, weight FROM rime_user_dict ORDER BY word, weight"):
+                user_dict[word] = self._to_entry(code, weight)
         except sqlite3.Error as e:
             logger.error(f"Error loading from SQLite: {e}")
             return {}
         return user_dict
 
+    def iter_entries(self, batch_size: int = 10000) -> Iterator[Tuple[str, RimeEntry]]:
+        """
+        分批读取数据库中的全部词条, 不会一次性取出所有行
+        :param batch_size: 每批读取的行数
+        :return: (词条, RimeEntry) 的迭代器
+        """
+        try:
+            cursor = self._connect().execute("SELECT word, code, weight FROM rime_user_dict")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for word, code, weight in rows:
+                    yield word, self._to_entry(code, weight)
+        except sqlite3.Error as e:
+            logger.error(f"Error loading from SQLite: {e}")
+
+    def contains_words(self, words: Iterable[str]) -> Set[str]:
+        """
+        直接在数据库中查询哪些词已经存在, 使用主键索引
+        :param words: 待查询的词
+        :return: 已存在的词的集合
+        """
+        words = list(dict.fromkeys(words))
+        found = set()
+        try:
+            conn = self._connect()
+            for i in range(0, len(words), QUERY_CHUNK_SIZE):
+                chunk = words[i:i + QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(word for (word,) in conn.execute(
+                    f"SELECT DISTINCT word FROM rime_user_dict WHERE word IN ({placeholders})", chunk))
+        except sqlite3.Error as e:
+            logger.error(f"Error querying SQLite: {e}")
+        return found
+
+    def words_since(self, since: float) -> List[Tuple[str, RimeEntry]]:
+        """
+        查询某个时间之后新增的词条, 使用 first_seen 索引
+        :param since: Unix 时间戳
+        :return: 词条列表，格式为 (词条, RimeEntry)，按首次出现时间排序
+        """
+        try:
+            rows = self._connect().execute(
+                "SELECT word, code, weight FROM rime_user_dict WHERE first_seen >= ? ORDER BY first_seen",
+                (int(since),))
+            return [(word, self._to_entry(code, weight)) for word, code, weight in rows]
+        except sqlite3.Error as e:
+            logger.error(f"Error querying SQLite: {e}")
+            return []
+
+    def words_with_code(self, code: str) -> List[Tuple[str, RimeEntry]]:
+        """
+        查询使用同一个编码的全部词条, 使用 code 索引
+        :param code: 编码
+        :return: 词条列表，格式为 (词条, RimeEntry)
+        """
+        try:
+            rows = self._connect().execute("SELECT word, code, weight FROM rime_user_dict WHERE code = ?", (code,))
+            return [(word, self._to_entry(code, weight)) for word, code, weight in rows]
+        except sqlite3.Error as e:
+            logger.error(f"Error querying SQLite: {e}")
+            return []
+
+    def count(self) -> int:
+        """
+        :return: 数据库中的词条数, 出错时返回 0
+        """
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM rime_user_dict").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Error counting SQLite entries: {e}")
+            return 0
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> "RimeSQLiteHandler":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
 
 # 示例用法
 if __name__ == "__main__":
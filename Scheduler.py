@@ -0,0 +1,93 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from Crawler import CrawlSource
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+
+class Scheduler:
+    """
+    守护进程模式的调度器, 在同一个事件循环中按每个来源的间隔反复运行
+
+    到期的来源合并为一轮运行, 一轮结束后才会开始下一轮, 不会重叠。
+    每个来源的下次运行时间为本轮开始时间加上带随机抖动的间隔, 避免多个来源总是同时请求。
+    """
+
+    def __init__(self, run_cycle: Callable[[List[CrawlSource]], Awaitable[None]], sources: List[CrawlSource],
+                 interval: float, jitter: float = 0.1, clock: Callable[[], float] = time.monotonic,
+                 rng: Optional[random.Random] = None):
+        """
+        :param run_cycle: 运行一轮的协程函数, 参数为本轮到期的来源
+        :param sources: 来源列表, interval 为空的来源使用全局间隔
+        :param interval: 全局运行间隔(秒)
+        :param jitter: 间隔的随机抖动比例, 0.1 表示在 ±10% 范围内浮动
+        :param clock: 单调时钟
+        :param rng: 随机数生成器
+        """
+        self.run_cycle = run_cycle
+        self.sources = sources
+        self.interval = interval
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.cycles = 0
+        # 启动后所有来源立即运行一次
+        self.next_due: Dict[str, float] = {source.name: clock() for source in sources}
+        self._stop = asyncio.Event()
+
+    def source_interval(self, source: CrawlSource) -> float:
+        base = source.interval if source.interval is not None else self.interval
+        return base * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def due_sources(self, now: float) -> List[CrawlSource]:
+        return [source for source in self.sources if self.next_due[source.name] <= now]
+
+    def seconds_until_due(self, now: float) -> float:
+        return max(0.0, min(self.next_due.values(), default=now + self.interval) - now)
+
+    def stop(self) -> None:
+        """
+        请求停止调度, 正在进行的一轮会先完成
+        """
+        self._stop.set()
+
+    async def run_once(self) -> List[CrawlSource]:
+        """
+        运行一轮当前到期的来源, 并安排它们的下次运行时间
+        :return: 本轮运行的来源
+        """
+        start = self.clock()
+        due = self.due_sources(start)
+        if not due:
+            return due
+        try:
+            await self.run_cycle(due)
+        except Exception as e:
+            # 一轮失败不影响之后的调度, 下次到期时重新运行
+            logger.error(f"第 {self.cycles + 1} 轮运行失败: {e}")
+        for source in due:
+            self.next_due[source.name] = start + self.source_interval(source)
+        self.cycles += 1
+        logger.info(f"第 {self.cycles} 轮运行用时 {self.clock() - start:.1f} 秒")
+        return due
+
+    async def run(self, max_cycles: Optional[int] = None) -> None:
+        """
+        持续调度直到调用 stop 或运行了 max_cycles 轮
+        :param max_cycles: 最多运行的轮数, 为空时不限
+        """
+        while not self._stop.is_set() and (max_cycles is None or self.cycles < max_cycles):
+            await self.run_once()
+            if max_cycles is not None and self.cycles >= max_cycles:
+                break
+            delay = self.seconds_until_due(self.clock())
+            if delay > 0:
+                logger.info(f"Sleeping for {delay:.0f} seconds...")
+                try:
+                    await asyncio.wait_for(self._stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
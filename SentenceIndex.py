@@ -0,0 +1,113 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Iterable, List
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+# 单条 SQL 中 IN 查询的最大参数个数, 低于 SQLite 默认的变量数上限
+QUERY_CHUNK_SIZE = 500
+
+
+def normalize_sentence(sentence: str) -> str:
+    """
+    归一化句子, 全半角、大小写和空白不同的句子视为同一句
+    :param sentence: 原始句子
+    :return: 归一化后的句子
+    """
+    return "".join(unicodedata.normalize("NFKC", sentence).split()).lower()
+
+
+def sentence_key(sentence: str) -> bytes:
+    """
+    计算句子的8字节哈希, 作为索引中的键
+    :param sentence: 原始句子
+    :return: 哈希值
+    """
+    return hashlib.blake2b(normalize_sentence(sentence).encode("utf-8"), digest_size=8).digest()
+
+
+class SeenSentenceIndex:
+    """
+    跨运行的已处理句子索引, 只保存句子哈希和处理时间, 超过 ttl_days 的记录会被清理
+    流水线在事件循环中过滤句子、在保存线程中记录句子, 同一个连接的访问由锁串行化
+    """
+
+    def __init__(self, db_path: Path, ttl_days: float = 30):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_days * 86400
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS seen_sentences (
+                hash BLOB PRIMARY KEY,
+                last_seen INTEGER
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def filter_new(self, sentences: Iterable[str]) -> List[str]:
+        """
+        过滤掉已经处理过的句子, 同时去掉本批次内的重复句子
+        :param sentences: 句子列表
+        :return: 未处理过的句子列表, 保持原有顺序
+        """
+        keyed = {}
+        for sentence in sentences:
+            keyed.setdefault(sentence_key(sentence), sentence)
+
+        keys = list(keyed)
+        expire_before = int(time.time() - self.ttl_seconds)
+        try:
+            for i in range(0, len(keys), QUERY_CHUNK_SIZE):
+                chunk = keys[i:i + QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                with self._lock:
+                    rows = self._conn.execute(
+                        f"SELECT hash FROM seen_sentences WHERE hash IN ({placeholders}) AND last_seen >= ?",
+                        (*chunk, expire_before)).fetchall()
+                for (key,) in rows:
+                    keyed.pop(key, None)
+        except sqlite3.Error as e:
+            # 索引不可用时退化为全部处理, 不丢句子
+            logger.error(f"Error querying seen sentence index: {e}")
+        return list(keyed.values())
+
+    def mark_seen(self, sentences: Iterable[str]) -> bool:
+        """
+        记录已处理的句子
+        :param sentences: 句子列表
+        :return: 如果写入成功返回 True，否则返回 False
+        """
+        now = int(time.time())
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO seen_sentences (hash, last_seen) VALUES (?, ?)",
+                                       ((sentence_key(sentence), now) for sentence in sentences))
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving seen sentence index: {e}")
+            return False
+
+    def purge_expired(self) -> int:
+        """
+        清理超过有效期的记录
+        :return: 清理的记录数
+        """
+        try:
+            with self._lock, self._conn:
+                cursor = self._conn.execute("DELETE FROM seen_sentences WHERE last_seen < ?",
+                                            (int(time.time() - self.ttl_seconds),))
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Error purging seen sentence index: {e}")
+            return 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
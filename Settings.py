@@ -0,0 +1,57 @@
+import json
+import os
+from functools import lru_cache
+from typing import Any, Optional
+
+# 默认的配置文件路径
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+
+
+class Settings:
+    """
+    config.json 的只读视图, 第一次读取配置项时才解析文件, 之后所有模块共用解析结果
+    """
+
+    def __init__(self, path: str = CONFIG_PATH):
+        """
+        :param path: 配置文件路径
+        """
+        self.path = path
+        self._data: Optional[dict] = None
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._data = json.load(f)
+        return self._data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    @staticmethod
+    def in_github_actions() -> bool:
+        return bool(os.getenv('GITHUB_ACTIONS'))
+
+    @property
+    def llm_api_url(self) -> Optional[str]:
+        # GitHub Actions 中接口地址和密钥由 secrets 注入环境变量
+        return os.getenv('LLM_API_URL') if self.in_github_actions() else self.get('LLM_API_URL')
+
+    @property
+    def llm_api_key(self) -> Optional[str]:
+        return os.getenv('LLM_API_KEY') if self.in_github_actions() else self.get('LLM_API_KEY')
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    :return: 全局共用的配置对象
+    """
+    return Settings()
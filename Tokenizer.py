@@ -1,48 +1,63 @@
-import os
-import jieba
-import re
-import json
-import aiohttp
 import asyncio
-from typing import List, Set
-
-from logger_config import setup_logger, inspect_trace
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Set
+
+from LLMCache import SegmentationCache
+from LLMClient import LLMClient, LLMRequestError
+from Metrics import FILTERED_WORDS, TOKENS
+from Settings import get_settings
+from WordFilter import ReloadableFilterRules, get_word_filter
+from logger_config import setup_logger
 
 # 配置日志系统
 logger = setup_logger()
 
-# 读取配置文件
-config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-with open(config_path, 'r') as f:
-    config = json.load(f)
+config = get_settings()
+
+# jieba 前缀词典缓存所在的目录, 为空时使用系统临时目录, Docker 镜像在构建时预先生成
+JIEBA_CACHE_DIR = os.getenv('JIEBA_CACHE_DIR') or config.get('JIEBA_CACHE_DIR')
 
-if os.getenv('GITHUB_ACTIONS'):
-    logger.info("Running in GitHub Actions environment")
-    LLM_API_URL = os.getenv('LLM_API_URL')
-    LLM_API_KEY = os.getenv('LLM_API_KEY')
 
-    if not LLM_API_KEY:
-        logger.error("github actions LLM_API_KEY is empty, please set it in config.json")
-        exit(-1)
+def _jieba():
+    """
+    第一次分词时才导入 jieba, 大模型模式下启动时不需要加载 jieba
+    """
+    import jieba
+    if JIEBA_CACHE_DIR and jieba.dt.tmp_dir != JIEBA_CACHE_DIR:
+        jieba.dt.tmp_dir = JIEBA_CACHE_DIR
+    return jieba
+
 
-    if not isinstance(LLM_API_URL, str):
-        raise ValueError("LLM_API_URL must be a string")
+# 大模型名称，以及分词提示词的版本，修改提示词时需要递增版本，使旧的缓存结果失效
+LLM_MODEL = config.get('LLM_MODEL', 'deepseek-chat')
+PROMPT_VERSION = 2
 
-    if not isinstance(LLM_API_KEY, str):
-        raise ValueError("LLM_API_KEY must be a string")
+# 批量分词时每个请求最多包含的句子数，以及估算的提示词 token 上限
+LLM_BATCH_SIZE = config.get('LLM_BATCH_SIZE', 20)
+LLM_BATCH_MAX_PROMPT_TOKENS = config.get('LLM_BATCH_MAX_PROMPT_TOKENS', 3000)
 
-    logger.info(f"LLM_API_URL: {LLM_API_URL}")
-    logger.info("read api url and key from github actions successfully!")
-else:
-    LLM_API_URL = config.get('LLM_API_URL')
-    LLM_API_KEY = config.get('LLM_API_KEY')
+# 批量分词的提示词，样例只在每个请求中出现一次
+BATCH_SYSTEM_PROMPT = (
+    "你是一个中文分词工具。用户会给出一个 JSON 数组，每一项包含 id 和 text。"
+    "请对每个 text 进行分词，只输出一个 JSON 对象，格式为 "
+    "{\"results\": [{\"id\": 0, \"words\": [\"词1\", \"词2\"]}]}，每个 id 都必须出现一次。"
+    "样例输入 [{\"id\": 0, \"text\": \"2.5亿美元打造游戏史首个变性黑人！揭秘《星鸣特攻》究竟是如何“正确”地走向暴死的\"}] "
+    "样例输出 {\"results\": [{\"id\": 0, \"words\": [\"2.5亿美元\", \"打造\", \"游戏史\", \"首个\", \"变性\", "
+    "\"黑人\", \"揭秘\", \"星鸣特攻\", \"究竟\", \"如何\", \"正确地\", \"走向\", \"暴死\"]}]}"
+)
 
-exclude_words = [
-    '的', '了', '和', '或', '与', '在', '更', '这', '是', '不']
 
-if not LLM_API_KEY:
-    logger.error("LLM_API_KEY is empty, please set it in config.json")
-    exit(-1)
+@lru_cache(maxsize=None)
+def get_filter_rules() -> ReloadableFilterRules:
+    """
+    分词结果的过滤规则，第一次过滤时才读取规则文件，规则文件修改后无需重启即可生效
+    """
+    return ReloadableFilterRules(config.get('FILTER_RULES_PATH'), config.get('FILTER_RULES_CHECK_INTERVAL', 5))
 
 
 """
@@ -66,29 +81,107 @@ unicode_list = [
 
 async def jieba_tokenizer(sentence: str) -> List[str]:
     """
-    使用jieba进行分词
+    使用jieba进行分词，在线程中运行，不阻塞事件循环
     :param sentence: 输入句子
     :return: 分词结果列表
     """
-    return jieba.lcut(sentence)
+    return await asyncio.to_thread(_jieba().lcut, sentence)
+
 
+def _init_jieba_worker() -> None:
+    # 每个工作进程只加载一次词典
+    jieba = _jieba()
+    jieba.setLogLevel(logging.WARNING)
+    jieba.initialize()
 
-async def deepseek_tokenizer(sentence: str, session: aiohttp.ClientSession) -> List[str]:
+
+def _jieba_segment_chunk(sentence_list: List[str]) -> Set[str]:
+    """
+    对一组句子分词，返回去重后的词集合，减少进程间传输的数据量
+    :param sentence_list: 句子列表
+    :return: 分词结果集合
+    """
+    words = set()
+    for sentence in sentence_list:
+        words.update(_jieba().lcut(sentence))
+    return words
+
+
+class JiebaSegmenter:
+    """
+    多进程 jieba 分词引擎，将句子分块后交给进程池处理
+    """
+
+    def __init__(self, workers: int = 0, chunk_size: int = 2000):
+        """
+        :param workers: 工作进程数，为0时使用全部 CPU 核心
+        :param chunk_size: 每个任务包含的句子数，句子总数不超过该值时直接在线程中分词
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_jieba_worker)
+        return self._executor
+
+    def _chunks(self, sentences: Iterable[str]) -> Iterator[List[str]]:
+        chunk = []
+        for sentence in sentences:
+            chunk.append(sentence)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def iter_segment(self, sentences: Iterable[str]) -> Iterator[Set[str]]:
+        """
+        逐块产出分词结果，同时在途的任务数不超过工作进程数的两倍，适合处理大量历史数据
+        :param sentences: 句子，可以是生成器
+        :return: 每个分块的词集合，顺序与输入一致
+        """
+        executor = self._get_executor()
+        pending = deque()
+        for chunk in self._chunks(sentences):
+            pending.append(executor.submit(_jieba_segment_chunk, chunk))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    async def segment(self, sentence_list: List[str]) -> Set[str]:
+        """
+        在异步代码中分词，不阻塞事件循环
+        :param sentence_list: 句子列表
+        :return: 分词结果集合
+        """
+        if len(sentence_list) <= self.chunk_size or self.workers == 1:
+            return await asyncio.to_thread(_jieba_segment_chunk, sentence_list)
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        results = await asyncio.gather(*(loop.run_in_executor(executor, _jieba_segment_chunk, chunk)
+                                         for chunk in self._chunks(sentence_list)))
+        return set().union(*results)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+async def deepseek_tokenizer(sentence: str, client: LLMClient) -> List[str]:
     """
     使用 DeepSeek API 进行分词
     :param sentence: 输入句子
-    :param session: aiohttp 客户端会话
+    :param client: 大模型客户端
     :return: 分词结果列表
+    :raises LLMRequestError: 请求失败或响应无法解析
     """
-    # 请求头
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {LLM_API_KEY}"
-    }
-
     # 请求数据
     data = {
-        "model": "deepseek-chat",
+        "model": LLM_MODEL,
         "messages": [
             {"role": "system", "content": "You are a helpful assistant."},
             {"role": "user",
@@ -97,97 +190,231 @@ async def deepseek_tokenizer(sentence: str, session: aiohttp.ClientSession) -> L
         "stream": False
     }
 
+    # 发送请求，重试、限速和熔断由 client 处理
+    response_data = await client.chat(data)
+
     try:
-        # 发送请求
-        async with session.post(LLM_API_URL, headers=headers, data=json.dumps(data)) as response:
-            response.raise_for_status()  # 检查请求是否成功
+        # 提取分词结果
+        tokenized_phrases = response_data['choices'][0]['message']['content'].strip("[]").split(", ")
+        return [phrase.strip("'") for phrase in tokenized_phrases]
+    except (KeyError, IndexError, TypeError, AttributeError) as e:
+        logger.error(f"解析响应数据失败: {e}")
+        raise LLMRequestError(f"invalid response: {e}") from e
 
-            # 解析响应数据
-            response_data = await response.json()
 
-            # 提取分词结果
-            tokenized_phrases = response_data['choices'][0]['message']['content'].strip("[]").split(", ")
-            return [phrase.strip("'") for phrase in tokenized_phrases]
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数，中文大约一个字一个 token
+    :param text: 文本
+    :return: 估算的 token 数
+    """
+    return len(text)
 
-    except aiohttp.ClientError as e:
-        logger.error(f"请求失败: {e}")
-        return []
-    except KeyError as e:
-        logger.error(f"解析响应数据失败: {e}")
-        return []
-    except Exception as e:
-        logger.error(f"发生未知错误: {e}")
-        inspect_trace()
-        return []
 
+def make_batches(sentence_list: List[str], batch_size: int = LLM_BATCH_SIZE,
+                 max_prompt_tokens: int = LLM_BATCH_MAX_PROMPT_TOKENS) -> List[List[str]]:
+    """
+    将句子按数量和估算的 token 数分成若干批，长句子较多时每批的句子会相应减少
+    :param sentence_list: 句子列表
+    :param batch_size: 每批最多的句子数
+    :param max_prompt_tokens: 每批提示词估算 token 数的上限
+    :return: 分批后的句子列表
+    """
+    budget = max_prompt_tokens - estimate_tokens(BATCH_SYSTEM_PROMPT)
+    batches = []
+    batch, batch_tokens = [], 0
+    for sentence in sentence_list:
+        # 每项额外计入 id 和 JSON 结构的开销
+        tokens = estimate_tokens(sentence) + 16
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > budget):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(sentence)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def deepseek_batch_tokenizer(sentence_list: List[str], client: LLMClient) -> Optional[List[List[str]]]:
+    """
+    使用 DeepSeek API 在一个请求中对多个句子分词，要求模型返回 JSON 结构
+    :param sentence_list: 输入句子列表
+    :param client: 大模型客户端
+    :return: 与输入顺序一致的分词结果列表，请求或解析失败时返回 None
+    """
+    items = [{"id": index, "text": sentence} for index, sentence in enumerate(sentence_list)]
+    data = {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(items, ensure_ascii=False)}
+        ],
+        "response_format": {"type": "json_object"},
+        "stream": False
+    }
 
-def filter_chinese_words(words: List[str], min_length: int = 2, max_length: int = 8) -> Set[str]:
+    try:
+        response_data = await client.chat(data)
+        content = response_data['choices'][0]['message']['content']
+        results = {item['id']: item['words'] for item in json.loads(content)['results']}
+    except LLMRequestError as e:
+        logger.error(f"批量分词请求失败: {e}")
+        return None
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        logger.error(f"解析批量分词结果失败: {e}")
+        return None
+
+    # 每个句子都必须有结果，缺失或格式不对时整批回退到逐句请求
+    words_list = [results.get(index) for index in range(len(sentence_list))]
+    if not all(isinstance(words, list) and all(isinstance(word, str) for word in words) for words in words_list):
+        logger.error("批量分词结果与输入不匹配")
+        return None
+    return words_list
+
+
+def filter_chinese_words(words: List[str], min_length: Optional[int] = None,
+                         max_length: Optional[int] = None) -> Set[str]:
     """
-    过滤出符合长度要求的中文词
+    按当前的过滤规则过滤出符合要求的中文词
     :param words: 分词结果列表
-    :param min_length: 词的最小长度
-    :param max_length: 词的最大长度
+    :param min_length: 词的最小长度, 为空时使用规则文件中的设置
+    :param max_length: 词的最大长度, 为空时使用规则文件中的设置
     :return: 符合要求的中文词集合
     """
-    filtered_words = set()
-    # add some branch to remove space around and in the words
-    for word in words:
-        if "·" in word:
-            word = word.replace("·", "")
-        if " " in word:
-            word=word.replace(" ", "")
-        if re.match(r"^[\u4e00-\u9fa5\s]+$", word
-                    ) and min_length <= len(word) <= max_length:
-
-            add_word = True
-
-            for i in exclude_words:
-                if i in word:
-                    add_word = False
-                    break
-            if word.startswith("一"):
-                add_word = False
-
-            # 判断word里面是否有数字，有则跳过
-            if re.search(r"\d", word):
-                add_word = False
-
-            # 检查是否包含英文字母
-            if re.search(r"[a-zA-Z]", word):
-                add_word = False
-
-            # 专门匹配中文标点符号的正则表达式
-            unicode_pattern = re.compile(
-                r"[\uFF0C\u3002\uFF1F\uFF01\uFF1A\uFF1B\u201C\u201D\u3001\u2018\u2019\uFF08\uFF09\u3010\u3011\u300A\u300B\u2026\u3001\u2014\u300A\u300B]"
-            )
-            if bool(unicode_pattern.search(word)):
-                add_word = False
-
-            if add_word:
-                filtered_words.add(word)
-    return filtered_words
-
-
-async def tokenize_and_filter(sentence: str, tokenizer_func, *args, min_length: int = 2, max_length: int = 8) -> Set[
-    str]:
+    rules = get_filter_rules().get()
+    if min_length is not None:
+        rules = rules._replace(min_length=min_length)
+    if max_length is not None:
+        rules = rules._replace(max_length=max_length)
+    filtered = get_word_filter(rules).filter(words)
+    TOKENS.inc(len(words))
+    FILTERED_WORDS.inc(len(filtered))
+    return filtered
+
+
+async def tokenize_and_filter(sentence: str, tokenizer_func, *args, min_length: Optional[int] = None,
+                              max_length: Optional[int] = None,
+                              cache: Optional[SegmentationCache] = None, fallback_func=None) -> Set[str]:
     """
     通用分词和过滤接口
     :param sentence: 输入句子
     :param tokenizer_func: 分词函数
     :param args: 分词函数的额外参数
-    :param min_length: 词的最小长度
-    :param max_length: 词的最大长度
+    :param min_length: 词的最小长度, 为空时使用过滤规则中的设置
+    :param max_length: 词的最大长度, 为空时使用过滤规则中的设置
+    :param cache: 分词结果缓存, 命中时不再调用分词函数
+    :param fallback_func: 大模型请求失败时改用的分词函数, 其结果不写入缓存
     :return: 符合要求的中文词集合
     """
-    words = await tokenizer_func(sentence, *args)
+    words = cache.get(sentence) if cache is not None else None
+    if words is None:
+        try:
+            words = await tokenizer_func(sentence, *args)
+        except LLMRequestError as e:
+            if fallback_func is None:
+                logger.error(f"分词失败: {e}")
+                return set()
+            return filter_chinese_words(await fallback_func(sentence), min_length, max_length)
+        # 分词结果为空时不缓存，下次运行重新请求
+        if cache is not None and words:
+            cache.put(sentence, words)
     return filter_chinese_words(words, min_length, max_length)
 
 
-async def LLM_Split_words(sentence_list: List[str]) -> Set[str]:
-    async with aiohttp.ClientSession() as session:
-        tasks = [tokenize_and_filter(sentence, deepseek_tokenizer, session) for sentence in sentence_list]
+async def batch_tokenize_and_filter(sentence_list: List[str], client: LLMClient,
+                                    min_length: Optional[int] = None, max_length: Optional[int] = None,
+                                    cache: Optional[SegmentationCache] = None) -> Set[str]:
+    """
+    批量分词和过滤，批量请求失败时逐句请求，逐句请求也失败时改用 jieba
+    :param sentence_list: 一批句子
+    :param client: 大模型客户端
+    :param min_length: 词的最小长度, 为空时使用过滤规则中的设置
+    :param max_length: 词的最大长度, 为空时使用过滤规则中的设置
+    :param cache: 分词结果缓存，只有未命中的句子才会发送请求
+    :return: 符合要求的中文词集合
+    """
+    words = []
+    misses = []
+    for sentence in sentence_list:
+        cached = cache.get(sentence) if cache is not None else None
+        if cached is None:
+            misses.append(sentence)
+        else:
+            words.extend(cached)
+
+    if misses:
+        words_list = await deepseek_batch_tokenizer(misses, client)
+        if words_list is None:
+            results = await asyncio.gather(*(tokenize_and_filter(sentence, deepseek_tokenizer, client,
+                                                                 min_length=min_length, max_length=max_length,
+                                                                 cache=cache, fallback_func=jieba_tokenizer)
+                                             for sentence in misses))
+            return filter_chinese_words(words, min_length, max_length).union(*results)
+        for sentence, sentence_words in zip(misses, words_list):
+            if cache is not None and sentence_words:
+                cache.put(sentence, sentence_words)
+            words.extend(sentence_words)
+    return filter_chinese_words(words, min_length, max_length)
+
+
+def make_llm_client() -> LLMClient:
+    """
+    按配置文件创建大模型客户端，GitHub Actions 中从环境变量读取接口地址和密钥
+    :return: 大模型客户端，需要在 async with 中使用
+    :raises ValueError: 没有配置接口密钥
+    """
+    if not config.llm_api_key:
+        raise ValueError("LLM_API_KEY is empty, please set it in config.json")
+    return LLMClient(config.llm_api_url, config.llm_api_key,
+                     max_concurrency=config.get('LLM_MAX_CONCURRENCY', 8),
+                     rate_limit=config.get('LLM_RATE_LIMIT'),
+                     max_retries=config.get('LLM_MAX_RETRIES', 3),
+                     timeout=config.get('LLM_TIMEOUT', 60),
+                     failure_threshold=config.get('LLM_CIRCUIT_BREAKER_THRESHOLD', 5))
+
+
+async def LLM_Split_words(sentence_list: List[str], cache: Optional[SegmentationCache] = None,
+                          batch_size: int = LLM_BATCH_SIZE, client: Optional[LLMClient] = None) -> Set[str]:
+    """
+    使用大模型对句子列表分词
+    :param sentence_list: 句子列表
+    :param cache: 分词结果缓存
+    :param batch_size: 每个请求包含的句子数，为1时逐句请求
+    :param client: 复用的大模型客户端，为空时按配置文件创建
+    :return: 符合要求的中文词集合
+    """
+    if client is None:
+        async with make_llm_client() as client:
+            return await LLM_Split_words(sentence_list, cache, batch_size, client)
+
+    if batch_size > 1:
+        tasks = [batch_tokenize_and_filter(batch, client, cache=cache)
+                 for batch in make_batches(sentence_list, batch_size)]
+    else:
+        tasks = [tokenize_and_filter(sentence, deepseek_tokenizer, client, cache=cache,
+                                     fallback_func=jieba_tokenizer)
+                 for sentence in sentence_list]
+    try:
         results = await asyncio.gather(*tasks)
-    return set.union(*results)
+    finally:
+        # 本批命中的缓存条目一次写回最近使用时间
+        if cache is not None:
+            cache.flush()
+    return set().union(*results)
+
+
+async def jieba_split_words(sentence_list: List[str], segmenter: JiebaSegmenter,
+                            min_length: Optional[int] = None, max_length: Optional[int] = None) -> Set[str]:
+    """
+    使用 jieba 对句子列表分词并过滤
+    :param sentence_list: 句子列表
+    :param segmenter: jieba 分词引擎
+    :param min_length: 词的最小长度, 为空时使用过滤规则中的设置
+    :param max_length: 词的最大长度, 为空时使用过滤规则中的设置
+    :return: 符合要求的中文词集合
+    """
+    return filter_chinese_words(list(await segmenter.segment(sentence_list)), min_length, max_length)
 
 
 async def main():
@@ -205,8 +432,8 @@ async def main():
         splited_words = await tokenize_and_filter(senten, jieba_tokenizer)
         logger.info(f"jieba分词结果: {splited_words}")
 
-    async with aiohttp.ClientSession() as session:
-        tasks = [tokenize_and_filter(sentence, deepseek_tokenizer, session) for sentence in sentence_list]
+    async with make_llm_client() as client:
+        tasks = [tokenize_and_filter(sentence, deepseek_tokenizer, client) for sentence in sentence_list]
         results = await asyncio.gather(*tasks)
 
     for i, result in enumerate(results):
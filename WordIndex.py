@@ -0,0 +1,184 @@
+import hashlib
+import math
+import os
+import struct
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Tuple
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+# 计算词库文件指纹时读取的末尾字节数
+STAMP_TAIL_BYTES = 65536
+
+# 索引文件头: 魔数, 版本, 位数, 哈希函数个数, 已加入的词数, 容量, 词库文件大小, 词库文件末尾内容的哈希
+_HEADER = struct.Struct("<4sIQIQQqQ")
+_MAGIC = b"NWBF"
+_VERSION = 1
+
+
+def _hash_pair(word: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(word.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class BloomFilter:
+    """
+    布隆过滤器, 判断为不存在的词一定不在集合中, 判断为存在的词有 error_rate 的概率误判
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        """
+        :param capacity: 预计加入的词数, 超过后误判率会上升
+        :param error_rate: 预期的误判率
+        """
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, word: str):
+        # 双重哈希: 用两个 64 位哈希值组合出 num_hashes 个位置
+        h1, h2 = _hash_pair(word)
+        num_bits = self.num_bits
+        return ((h1 + i * h2) % num_bits for i in range(self.num_hashes))
+
+    def add(self, word: str) -> None:
+        bits = self.bits
+        for position in self._positions(word):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, words: Iterable[str]) -> None:
+        for word in words:
+            self.add(word)
+
+    def __contains__(self, word: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(word))
+
+
+class WordIndex:
+    """
+    保存在词库文件旁边的词条成员索引, 用布隆过滤器快速排除一定不在词库中的词
+
+    索引记录了词库文件的大小和末尾内容的哈希, 词库文件在索引之外被修改(手动编辑、压缩整理)后,
+    下次查询前需要调用 rebuild 重新建立。不使用修改时间, 因为 git checkout 和 cp 都会改变它。
+    判断为可能存在的词由调用方在 SQLite 中精确确认。
+    """
+
+    def __init__(self, index_path: Path, capacity: int = 100000, error_rate: float = 0.01):
+        """
+        :param index_path: 索引文件路径
+        :param capacity: 索引的初始容量, 词数超过容量时重建为两倍大小
+        :param error_rate: 布隆过滤器的误判率
+        """
+        self.index_path = index_path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.stamp: Optional[Tuple[int, int]] = None
+        self.bloom = BloomFilter(capacity, error_rate)
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, "rb") as f:
+                header = f.read(_HEADER.size)
+                magic, version, num_bits, num_hashes, count, capacity, size, tail_hash = _HEADER.unpack(header)
+                if magic != _MAGIC or version != _VERSION:
+                    raise ValueError("unknown index format")
+                bits = bytearray(f.read())
+            if len(bits) != (num_bits + 7) // 8:
+                raise ValueError("truncated index file")
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Ignoring invalid word index {self.index_path}: {e}")
+            return
+
+        bloom = BloomFilter(capacity, self.error_rate)
+        bloom.num_bits, bloom.num_hashes, bloom.count, bloom.bits = num_bits, num_hashes, count, bits
+        self.bloom = bloom
+        self.stamp = (size, tail_hash)
+
+    @staticmethod
+    def file_stamp(path: Path) -> Optional[Tuple[int, int]]:
+        """
+        计算词库文件的指纹, 只读取文件末尾, 与词库大小无关
+        :param path: 词库文件路径
+        :return: 文件大小和末尾内容的哈希, 文件不存在时返回 None
+        """
+        try:
+            with open(path, "rb") as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(0, size - STAMP_TAIL_BYTES))
+                tail = f.read()
+        except OSError:
+            return None
+        return size, int.from_bytes(hashlib.blake2b(tail, digest_size=8).digest(), "little")
+
+    def is_fresh(self, dict_path: Path) -> bool:
+        """
+        :param dict_path: 词库文件路径
+        :return: 索引是否与词库文件的当前内容一致
+        """
+        return self.stamp is not None and self.stamp == self.file_stamp(dict_path)
+
+    def rebuild(self, iter_words: Callable[[], Iterable[str]], dict_path: Path) -> None:
+        """
+        由词库中的全部词条重新建立索引并保存
+        :param iter_words: 返回词库全部词条迭代器的函数, 词数超出容量时会再调用一次
+        :param dict_path: 词库文件路径
+        """
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        bloom.update(iter_words())
+        if bloom.count > bloom.capacity:
+            # 词数超出容量时按实际词数的两倍重新建立, 保持误判率
+            self.capacity = 2 * bloom.count
+            bloom = BloomFilter(self.capacity, self.error_rate)
+            bloom.update(iter_words())
+        self.bloom = bloom
+        self.save(dict_path)
+        logger.info(f"Rebuilt word index {self.index_path} with {bloom.count} words")
+
+    def might_contain(self, word: str) -> bool:
+        return word in self.bloom
+
+    def add(self, words: Iterable[str], dict_path: Path) -> None:
+        """
+        把新追加到词库文件的词加入索引并保存
+        :param words: 新词
+        :param dict_path: 已经追加完成的词库文件路径
+        """
+        self.bloom.update(words)
+        self.save(dict_path)
+
+    def needs_resize(self) -> bool:
+        """
+        :return: 词数是否已经超过容量, 超过后误判率明显上升, 应当重建
+        """
+        return self.bloom.count > self.bloom.capacity
+
+    def save(self, dict_path: Path) -> bool:
+        """
+        先写入临时文件再替换, 写入中途失败不会留下损坏的索引
+        :param dict_path: 词库文件路径, 记录其指纹
+        :return: 如果保存成功返回 True，否则返回 False
+        """
+        stamp = self.file_stamp(dict_path) or (0, 0)
+        bloom = self.bloom
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, bloom.num_bits, bloom.num_hashes, bloom.count,
+                                     bloom.capacity, *stamp))
+                f.write(bloom.bits)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.error(f"Error saving word index: {e}")
+            return False
+        self.stamp = stamp
+        return True
@@ -0,0 +1,108 @@
+"""
+全拼转小鹤双拼的微基准测试, 对比逐个音节拆分查表的原实现和预计算的转换表
+
+用法: python benchmarks/bench_pinyin.py [词数量]
+"""
+import logging
+import os
+import random
+import sys
+import time
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PinyinTools import PINYIN_SYLLABLES, convert_many  # noqa: E402
+
+# 转换表有意改变的结果: 原实现不支持零声母的 eng, 转换表中为 eg
+INTENDED_CHANGES = {'eng': 'eg'}
+
+logger = logging.getLogger(__name__)
+
+
+# 原 PinyinTools 的小鹤双拼映射表和 quanpin_to_xiaohe, 原样复制作为对比基准
+legacy_xiaohe_map: Dict[str, str] = {
+    'a': 'a', 'o': 'o', 'u': 'u', 'i': 'i', 'e': 'e',
+    'iu': 'q', 'uan': 'r', 'ue': 't', 've': 't', 'un': 'y',
+    'sh': 'u', 'ch': 'i', 'uo': 'o', 'ie': 'p', 'iong': 's', 'ong': 's',
+    'ai': 'd', 'en': 'f', 'eng': 'g', 'ang': 'h', 'an': 'j', 'ing': 'k',
+    'uai': 'k', 'iang': 'l', 'uang': 'l', "ou": 'z', 'ia': 'x', 'ua': 'x',
+    'ao': 'c', 'ui': 'v', 'zh': 'v', 'in': 'b', 'iao': 'n', "ian": 'm', 'ei': 'w'
+}
+
+
+def legacy_quanpin_to_xiaohe(quan_pinyin: str) -> str:
+    """
+    将全拼转换为小鹤双拼
+    :param quan_pinyin: 全拼字符串
+    :return: 小鹤双拼字符串
+    """
+    try:
+        # 检查输入是否为合法的全拼
+        if not all(c.isalpha() or c.isspace() for c in quan_pinyin):
+            raise ValueError("Invalid input: input should only contain alphabetic characters and spaces")
+        if not 0 < len(quan_pinyin) < 7:
+            raise ValueError("Invalid input: input should be between 1 and 5 characters long")
+
+        # 处理长度为1的拼音
+        if len(quan_pinyin) == 1:
+            return quan_pinyin * 2
+        # 处理长度为2的拼音
+        if len(quan_pinyin) == 2:
+            return quan_pinyin
+
+        # 特殊情况ang，特殊处理吧，后续看要不要分离声母和韵母
+        if quan_pinyin == "ang":
+            return "ah"
+
+        # 处理长度为3，4，5，6长度的拼音，有多种搭配方式，但是声母一般为2，3长度，韵母长度为1，2，3，4(uang这种）
+        try:
+            if quan_pinyin[:2] in legacy_xiaohe_map:
+                result = legacy_xiaohe_map[quan_pinyin[:2]] + legacy_xiaohe_map[quan_pinyin[2:]]
+            else:
+                result = quan_pinyin[0] + legacy_xiaohe_map[quan_pinyin[1:]]
+
+                # 这里可能直接发生map错误，然后报错。
+        except KeyError:
+            raise ValueError("Invalid input: input should be a valid quanpin")
+
+        if len(result) != 2:
+            raise ValueError("Invalid input: input should be a valid quanpin")
+        else:
+            return result
+
+    except Exception as e:
+        logger.error(f"Error converting quanpin to xiaohe: {e}")
+        return f"Error: {e}"
+
+
+def make_words(count, seed=0):
+    """
+    生成 count 个由 2~4 个音节组成的词
+    """
+    rng = random.Random(seed)
+    return [[rng.choice(PINYIN_SYLLABLES) for _ in range(rng.randint(2, 4))] for _ in range(count)]
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    words = make_words(count)
+
+    start = time.perf_counter()
+    legacy = [[legacy_quanpin_to_xiaohe(syllable) for syllable in word] for word in words]
+    legacy_seconds = time.perf_counter() - start
+    expected = ["".join(INTENDED_CHANGES.get(syllable, code) for syllable, code in zip(word, codes))
+                for word, codes in zip(words, legacy)]
+
+    start = time.perf_counter()
+    result = ["".join(convert_many(word)) for word in words]
+    new_seconds = time.perf_counter() - start
+
+    assert result == expected, "转换表与原实现的结果不一致"
+    print(f"words: {count}")
+    print(f"legacy: {legacy_seconds:.3f}s, table: {new_seconds:.3f}s, speedup: {legacy_seconds / new_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+端到端基准测试, 使用本地替身服务(standins.py)代替热榜接口和大模型接口, 测量每个阶段的吞吐量和延迟
+
+- crawl: async_fetch_new_sentences(fetch_new_sentences 的异步实现) 逐轮爬取所有页, 延迟按单个请求统计
+- jieba: jieba_split_words 按页分批分词, 延迟按批统计
+- llm: LLM_Split_words 对所有句子分词, 延迟按单个 chat 请求(包括重试)统计
+- process_new_words: main.process_new_words 按 PIPELINE_WORD_BATCH_SIZE 分批标注拼音并保存
+- rime_file_append / rime_file_lookup: RimeFileHandler 追加词条和查询索引, 延迟按批统计
+- rime_sqlite_save / rime_sqlite_lookup: RimeSQLiteHandler 批量保存和查询, 延迟按批统计
+- end_to_end: main.main 运行完整的流水线, 延迟按轮统计
+
+结果以 JSON 输出, 可以保存下来比较不同版本的性能。
+整个仓库复制到临时目录中运行, 配置文件指向临时目录中的词库和数据库, 不修改仓库中的文件。
+
+用法: python benchmarks/bench_pipeline.py [--pages 50] [--mode deepseek] [--llm-error-rate 0.05] [--output result.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+from standins import COMMON_CHARS, make_chat_app, make_rebang_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    最近秩法计算百分位数
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class StageStats:
+    """
+    一个阶段的统计: 处理的条目数, 总用时, 每次调用的延迟
+    """
+
+    def __init__(self):
+        self.items = 0
+        self.seconds = 0.0
+        self.errors = 0
+        self.latencies: List[float] = []
+
+    @contextmanager
+    def timed(self, items: int = 0):
+        """
+        统计一次调用的延迟, 依次调用的阶段同时累加总用时
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.latencies.append(elapsed)
+            self.seconds += elapsed
+            self.items += items
+
+    def summary(self) -> dict:
+        result = {"items": self.items, "calls": len(self.latencies), "errors": self.errors,
+                  "seconds": round(self.seconds, 3),
+                  "items_per_second": round(self.items / self.seconds, 1) if self.seconds else None}
+        if self.latencies:
+            result["p50_ms"] = round(percentile(self.latencies, 50) * 1000, 2)
+            result["p99_ms"] = round(percentile(self.latencies, 99) * 1000, 2)
+        return result
+
+
+def make_words(count: int, seed: int = 0) -> List[str]:
+    """
+    生成 count 个不重复的 2~4 字词
+    """
+    rng = random.Random(seed)
+    words = {}
+    while len(words) < count:
+        words["".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(2, 4)))] = None
+    return list(words)
+
+
+def batched(items: list, size: int) -> List[list]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def prepare_work_dir(tmp_dir: str, args) -> str:
+    """
+    把仓库复制到临时目录, 写入基准测试使用的配置文件
+    :return: 临时目录中的仓库路径
+    """
+    work_dir = os.path.join(tmp_dir, "repo")
+    shutil.copytree(ROOT, work_dir, ignore=shutil.ignore_patterns(
+        ".git", "__pycache__", "*.db", "*.db-*", "*.idx", "*.log", "flypy_user*.txt"))
+    with open(os.path.join(ROOT, "config.json"), encoding="utf-8") as f:
+        bench_config = json.load(f)
+    bench_config.update({
+        "USER_DICT_PATH": os.path.join(tmp_dir, "flypy_user.txt"),
+        "USER_DICT_DB_PATH": os.path.join(tmp_dir, "flypy_user.db"),
+        "USER_DICT_INDEX_PATH": os.path.join(tmp_dir, "flypy_user.idx"),
+        "PINYIN_CACHE_PATH": os.path.join(tmp_dir, "pinyin_cache.db"),
+        "SPLIT_WORDS_MODE": args.mode,
+        "LOGGING_LEVEL": "WARNING",
+        # 每轮都重新爬取和分词, 不使用爬取缓存、已处理句子索引和分词缓存
+        "HTTP_CACHE_PATH": None,
+        "SEEN_SENTENCE_DB_PATH": None,
+        "LLM_CACHE_PATH": None,
+        "CRAWLER_RATE_LIMIT": None,
+        "CRAWLER_MAX_CONCURRENCY": args.crawl_concurrency,
+        "LLM_BATCH_SIZE": args.llm_batch_size,
+        "LLM_MAX_CONCURRENCY": args.llm_concurrency,
+        "JIEBA_WORKERS": args.jieba_workers,
+    })
+    with open(os.path.join(work_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(bench_config, f, ensure_ascii=False, indent=2)
+    return work_dir
+
+
+async def run_benchmark(args, tmp_dir: str) -> dict:
+    # 配置文件在导入时读取, 必须在切换到临时目录之后才导入仓库中的模块
+    import main
+    from Crawler import DEFAULT_HEADERS, CrawlSource, RebangParser, async_fetch_new_sentences
+    from LLMClient import LLMClient, LLMRequestError
+    from RimeHandler import RimeEntry, RimeFileHandler, RimeSQLiteHandler
+    from Tokenizer import JiebaSegmenter, LLM_Split_words, jieba_split_words
+    from WordIndex import WordIndex
+
+    stages = {name: StageStats() for name in (
+        "crawl", "jieba", "llm", "process_new_words", "rime_file_append", "rime_file_lookup", "rime_sqlite_save",
+        "rime_sqlite_lookup", "end_to_end")}
+    extra = {}
+
+    class TimedLLMClient(LLMClient):
+        """
+        统计每个 chat 请求的延迟
+        """
+
+        def __init__(self, *client_args, stage: StageStats, **kwargs):
+            super().__init__(*client_args, **kwargs)
+            self.stage = stage
+
+        async def chat(self, payload: dict) -> dict:
+            with self.stage.timed():
+                try:
+                    return await super().chat(payload)
+                except LLMRequestError:
+                    self.stage.errors += 1
+                    raise
+
+    def make_client(url: str, stage: StageStats) -> TimedLLMClient:
+        return TimedLLMClient(url, "benchmark", stage=stage, max_concurrency=args.llm_concurrency,
+                              max_retries=args.llm_max_retries, backoff_base=args.llm_backoff, timeout=30)
+
+    rebang_app, rebang_state = make_rebang_app(args.pages, args.page_size, args.crawl_latency)
+    chat_app, chat_state = make_chat_app(args.llm_latency, args.llm_rate_limit, args.llm_error_rate)
+    async with TestServer(rebang_app) as rebang_server, TestServer(chat_app) as chat_server:
+        items_url = str(rebang_server.make_url("/v1/items"))
+        chat_url = str(chat_server.make_url("/chat/completions"))
+
+        # 爬取: 通过 aiohttp 的请求跟踪统计每个请求的延迟
+        crawl = stages["crawl"]
+
+        async def on_request_start(session, context, params):
+            context.start = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            crawl.latencies.append(time.perf_counter() - context.start)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        sentences = []
+        async with aiohttp.ClientSession(headers=DEFAULT_HEADERS, trace_configs=[trace_config],
+                                         connector=aiohttp.TCPConnector(limit=args.crawl_concurrency)) as session:
+            for round_index in range(args.rounds):
+                start = time.perf_counter()
+                round_sentences = await async_fetch_new_sentences(items_url, {"tab": f"round{round_index}"},
+                                                                  RebangParser(), session=session,
+                                                                  max_concurrency=args.crawl_concurrency)
+                crawl.seconds += time.perf_counter() - start
+                crawl.items += len(round_sentences)
+                sentences.extend(round_sentences)
+
+        # jieba 分词: 第一批包含加载词典的时间, 单独记录
+        segmenter = JiebaSegmenter(workers=args.jieba_workers, chunk_size=main.config.get('JIEBA_CHUNK_SIZE', 2000))
+        start = time.perf_counter()
+        await jieba_split_words(sentences[:1], segmenter)
+        extra["jieba_init_seconds"] = round(time.perf_counter() - start, 3)
+        words = set()
+        for batch in batched(sentences, args.page_size):
+            with stages["jieba"].timed(len(batch)):
+                words |= await jieba_split_words(batch, segmenter)
+        segmenter.close()
+
+        # 大模型分词: 所有批次并发请求, 总用时按整个阶段计算
+        llm = stages["llm"]
+        async with make_client(chat_url, llm) as client:
+            start = time.perf_counter()
+            words |= await LLM_Split_words(sentences, batch_size=args.llm_batch_size, client=client)
+            llm.seconds = time.perf_counter() - start
+            llm.items = len(sentences)
+
+        # 标注拼音并保存分词得到的新词
+        word_list = sorted(words)
+        for batch in batched(word_list, main.PIPELINE_WORD_BATCH_SIZE):
+            with stages["process_new_words"].timed(len(batch)):
+                main.process_new_words(set(batch), dict.fromkeys(batch, "benchmark"))
+        extra["new_words"] = len(word_list)
+
+        # 词库文件和数据库: 使用生成的词, 一半查询已存在的词, 一半查询不存在的词
+        dict_words = make_words(args.dict_words * 2, seed=1)
+        stored, missing = dict_words[:args.dict_words], dict_words[args.dict_words:]
+        entries = [(word, RimeEntry(f"{index:08x}", 1)) for index, word in enumerate(stored)]
+        queries = [half + other for half, other in zip(batched(stored, args.batch_size // 2),
+                                                       batched(missing, args.batch_size // 2))]
+
+        file_handler = RimeFileHandler(
+            Path(tmp_dir, "bench_user.txt"),
+            index=WordIndex(Path(tmp_dir, "bench_user.idx"), capacity=args.dict_words))
+        for batch in batched(entries, args.batch_size):
+            with stages["rime_file_append"].timed(len(batch)):
+                file_handler.append_entries(batch, add_date_comment=True)
+        for batch in queries:
+            with stages["rime_file_lookup"].timed(len(batch)):
+                file_handler.find_existing(batch)
+
+        with RimeSQLiteHandler(Path(tmp_dir, "bench_user.db")) as sqlite_handler:
+            for batch in batched(entries, args.batch_size):
+                with stages["rime_sqlite_save"].timed(len(batch)):
+                    sqlite_handler.save_entries(batch, sources=dict.fromkeys((word for word, _ in batch), "benchmark"),
+                                                segmenter="benchmark")
+            for batch in queries:
+                with stages["rime_sqlite_lookup"].timed(len(batch)):
+                    sqlite_handler.contains_words(batch)
+
+        # 完整流水线: 每轮使用新的标题, 和守护进程一样复用会话和大模型客户端
+        end_to_end = stages["end_to_end"]
+        async with make_client(chat_url, StageStats()) as client:
+            for round_index in range(args.rounds):
+                source = CrawlSource(f"e2e{round_index}", items_url, {"tab": f"e2e{round_index}"}, RebangParser())
+                with end_to_end.timed(args.pages * args.page_size):
+                    await main.main([source], llm_client=client if args.mode == 'deepseek' else None)
+        main.get_jieba_segmenter().close()
+        main.get_sqlite_handler().close()
+
+    return {
+        "config": vars(args),
+        "stages": {name: stage.summary() for name, stage in stages.items()},
+        "extra": extra,
+        "standins": {"rebang": rebang_state, "chat": chat_state},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="使用本地替身服务运行端到端基准测试")
+    parser.add_argument("--mode", choices=("jieba", "deepseek"), default="deepseek",
+                        help="end_to_end 阶段的分词方式")
+    parser.add_argument("--rounds", type=int, default=3, help="爬取和完整流水线的轮数, 每轮使用不同的标题")
+    parser.add_argument("--pages", type=int, default=50, help="每轮的页数")
+    parser.add_argument("--page-size", type=int, default=20, help="每页的标题数")
+    parser.add_argument("--crawl-latency", type=float, default=0.02, help="热榜接口的响应延迟(秒)")
+    parser.add_argument("--crawl-concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="大模型接口的响应延迟(秒)")
+    parser.add_argument("--llm-rate-limit", type=float, default=None, help="大模型接口每秒接受的请求数")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="大模型接口返回 500 的比例")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--llm-batch-size", type=int, default=20)
+    parser.add_argument("--llm-max-retries", type=int, default=3)
+    parser.add_argument("--llm-backoff", type=float, default=0.1, help="大模型请求重试的基础等待时间(秒)")
+    parser.add_argument("--jieba-workers", type=int, default=1)
+    parser.add_argument("--dict-words", type=int, default=100_000, help="词库文件和数据库阶段的词条数")
+    parser.add_argument("--batch-size", type=int, default=500, help="词库文件和数据库阶段每批的词条数")
+    parser.add_argument("--output", help="同时把结果写入这个文件")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = prepare_work_dir(tmp_dir, args)
+        sys.path.insert(0, work_dir)
+        os.chdir(work_dir)
+        try:
+            results = asyncio.run(run_benchmark(args, tmp_dir))
+        finally:
+            os.chdir(cwd)
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+用户词库初次导入 SQLite 的基准测试, 对比逐条 execute 的原实现和批量写入的 RimeSQLiteHandler
+
+用法: python benchmarks/bench_sqlite.py [词条数量]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from RimeHandler import RimeEntry, RimeSQLiteHandler  # noqa: E402
+
+
+def legacy_save_sqlite(db_path, user_dict):
+    """
+    原 RimeSQLiteHandler.save_sqlite 的实现, 每次调用都新建连接和表, 逐条插入
+    """
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rime_user_dict (
+                word TEXT PRIMARY KEY,
+                code TEXT,
+                weight TEXT
+            )
+        """)
+        for word, entry in user_dict.items():
+            cursor.execute("""
+                INSERT OR REPLACE INTO rime_user_dict (word, code, weight)
+                VALUES (?, ?, ?)
+            """, (word, entry.code, entry.weight))
+        conn.commit()
+
+
+def make_user_dict(count):
+    return {f"词条{i}": RimeEntry(f"{i:08x}", "1") for i in range(count)}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    user_dict = make_user_dict(count)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        legacy_save_sqlite(Path(tmp_dir) / "legacy.db", user_dict)
+        legacy_seconds = time.perf_counter() - start
+
+        with RimeSQLiteHandler(Path(tmp_dir) / "bulk.db") as handler:
+            start = time.perf_counter()
+            handler.save_sqlite(user_dict)
+            new_seconds = time.perf_counter() - start
+            assert handler.count() == count
+
+    print(f"entries: {count}")
+    print(f"legacy: {legacy_seconds:.3f}s, bulk: {new_seconds:.3f}s, speedup: {legacy_seconds / new_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
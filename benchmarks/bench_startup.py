@@ -0,0 +1,84 @@
+"""
+冷启动基准测试, 每项在新的子进程中运行, 测量导入 main 以及 jieba 加载词典的时间
+
+- actions: GitHub Actions 中的一次运行, 设置了 GITHUB_ACTIONS 和接口密钥环境变量
+- container: 容器中的守护进程, 使用 config.json 中的配置
+- jieba cold/warm: 没有词典缓存时构建前缀词典, 以及使用预先生成的缓存(Docker 镜像构建时生成)
+
+用法: python benchmarks/bench_startup.py [重复次数]
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_MAIN = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+INIT_JIEBA = """
+import logging, os, time
+start = time.perf_counter()
+import jieba
+jieba.setLogLevel(logging.WARNING)
+jieba.dt.tmp_dir = os.environ['JIEBA_CACHE_DIR']
+jieba.initialize()
+print(time.perf_counter() - start)
+"""
+
+
+def run_python(code, env, cwd):
+    """
+    在新的 Python 进程中运行代码
+    :return: 代码自己测得的秒数, 以及包括解释器启动在内的总秒数
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True,
+                            check=True)
+    total = time.perf_counter() - start
+    return float(result.stdout.strip().splitlines()[-1]), total
+
+
+def measure(code, env, cwd, repeat):
+    inner, total = zip(*(run_python(code, env, cwd) for _ in range(repeat)))
+    return {"import_seconds": round(statistics.median(inner), 3), "process_seconds": round(statistics.median(total), 3)}
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    base_env = {key: value for key, value in os.environ.items()
+                if key not in ("GITHUB_ACTIONS", "LLM_API_KEY", "LLM_API_URL", "JIEBA_CACHE_DIR")}
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 在临时目录的副本中运行, 不修改仓库中的词库和数据库
+        work_dir = os.path.join(tmp_dir, "repo")
+        shutil.copytree(ROOT, work_dir, ignore=shutil.ignore_patterns(
+            ".git", "__pycache__", "*.db", "*.db-*", "*.idx", "*.log", "flypy_user*.txt"))
+
+        actions_env = dict(base_env, GITHUB_ACTIONS="true", LLM_API_KEY="benchmark", LLM_API_URL="http://127.0.0.1:1")
+        results["actions"] = measure(IMPORT_MAIN, actions_env, work_dir, repeat)
+        results["container"] = measure(IMPORT_MAIN, base_env, work_dir, repeat)
+
+        cache_dir = os.path.join(tmp_dir, "jieba")
+        os.makedirs(cache_dir)
+        jieba_env = dict(base_env, JIEBA_CACHE_DIR=cache_dir)
+        # 第一次运行没有缓存, 需要解析词典文件并写入缓存
+        cold, _ = run_python(INIT_JIEBA, jieba_env, work_dir)
+        results["jieba_cold"] = {"import_seconds": round(cold, 3)}
+        results["jieba_warm"] = measure(INIT_JIEBA, jieba_env, work_dir, repeat)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
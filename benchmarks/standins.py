@@ -0,0 +1,188 @@
+"""
+本地替身服务, 基准测试时代替 rebang.today 热榜接口和 DeepSeek 大模型接口, 不访问外网
+
+- Rebang items 接口: 可配置页数、每页条数和响应延迟, 标题由固定的常用字随机组成, 相同参数总是返回相同内容
+- OpenAI 兼容的 chat completions 接口: 可配置响应延迟、每秒请求上限(超出返回 429)和错误率(返回 500),
+  支持批量分词的 JSON 格式和逐句分词的列表格式
+
+用法: python benchmarks/standins.py [--port 8765] [--pages 10] [--llm-error-rate 0.05] ...
+热榜接口监听 port, 大模型接口监听 port + 1
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from aiohttp import web
+
+# 标题使用的常用字, 保证 pypinyin 能标注拼音
+COMMON_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而"
+    "方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好"
+    "应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向"
+    "道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特"
+    "件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队"
+    "南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清美再采转更单风切"
+    "打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步"
+)
+
+# 标题中插入的标点, 与热榜标题的样式接近
+PUNCTUATION = "，！？：、"
+
+# 分词结果中的词由连续汉字按两个字一组切分
+HAN_PATTERN = re.compile(r'[\u4e00-\u9fff]+')
+
+
+def make_title(rng: random.Random) -> str:
+    """
+    生成一个由 3~6 个词组成的标题, 每个词 2~4 个字
+    """
+    words = ["".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(3, 6))]
+    title = words[0]
+    for word in words[1:]:
+        title += rng.choice(PUNCTUATION) + word if rng.random() < 0.3 else word
+    return title
+
+
+def split_words(text: str) -> List[str]:
+    """
+    替身大模型的分词方式: 连续的汉字每两个字切成一个词, 结果确定且与输入一一对应
+    """
+    words = []
+    for run in HAN_PATTERN.findall(text):
+        words.extend(run[i:i + 2] for i in range(0, len(run), 2))
+    return words
+
+
+def make_rebang_app(pages: int = 10, page_size: int = 20, latency: float = 0.0,
+                    seed: int = 0) -> Tuple[web.Application, dict]:
+    """
+    构造模拟 Rebang items 接口的 aiohttp 应用, 路径为 /v1/items
+    同一组请求参数(不含 page)和页码总是返回相同的标题, 改变 tab 参数即可得到另一批标题
+    :param pages: 总页数
+    :param page_size: 每页的条目数
+    :param latency: 每个请求的响应延迟(秒)
+    :param seed: 随机种子
+    :return: aiohttp 应用, 以及记录请求数的状态字典
+    """
+    state = {"requests": 0, "items": 0}
+
+    async def items(request: web.Request) -> web.Response:
+        state["requests"] += 1
+        page = int(request.query.get("page", 1))
+        if latency:
+            await asyncio.sleep(latency)
+        params = sorted((key, value) for key, value in request.query.items() if key != "page")
+        rng = random.Random(f"{seed}:{params}:{page}")
+        item_list = [{"title": make_title(rng), "desc": ""} for _ in range(page_size)] if page <= pages else []
+        state["items"] += len(item_list)
+        return web.json_response({"data": {"total_page": pages, "list": json.dumps(item_list, ensure_ascii=False)}})
+
+    app = web.Application()
+    app.router.add_get("/v1/items", items)
+    return app, state
+
+
+def make_chat_app(latency: float = 0.0, rate_limit: Optional[float] = None, error_rate: float = 0.0,
+                  seed: int = 0) -> Tuple[web.Application, dict]:
+    """
+    构造 OpenAI 兼容的 chat completions 接口, 路径为 /chat/completions
+    :param latency: 每个请求的响应延迟(秒)
+    :param rate_limit: 每秒最多接受的请求数, 超出时返回 429 和 Retry-After, 为空时不限制
+    :param error_rate: 随机返回 500 的请求比例
+    :param seed: 随机种子
+    :return: aiohttp 应用, 以及记录请求数、限流数和错误数的状态字典
+    """
+    state = {"requests": 0, "rate_limited": 0, "errors": 0, "sentences": 0, "prompt_tokens": 0,
+             "completion_tokens": 0}
+    rng = random.Random(seed)
+    # 最近一秒内接受的请求时间
+    accepted: deque = deque()
+
+    def reply(content: str, prompt: str) -> web.Response:
+        # 与 Tokenizer.estimate_tokens 一致, 大约一个字一个 token
+        usage = {"prompt_tokens": len(prompt), "completion_tokens": len(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        state["prompt_tokens"] += usage["prompt_tokens"]
+        state["completion_tokens"] += usage["completion_tokens"]
+        return web.json_response({
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    async def chat(request: web.Request) -> web.Response:
+        state["requests"] += 1
+        if rate_limit:
+            now = time.monotonic()
+            while accepted and now - accepted[0] >= 1.0:
+                accepted.popleft()
+            if len(accepted) >= rate_limit:
+                state["rate_limited"] += 1
+                return web.Response(status=429, headers={"Retry-After": f"{1.0 - (now - accepted[0]):.3f}"})
+            accepted.append(now)
+        if latency:
+            await asyncio.sleep(latency)
+        if error_rate and rng.random() < error_rate:
+            state["errors"] += 1
+            return web.Response(status=500, text="stand-in error")
+
+        payload = await request.json()
+        prompt = payload["messages"][-1]["content"]
+        if payload.get("response_format", {}).get("type") == "json_object":
+            # 批量分词: 用户消息是 [{"id": ..., "text": ...}] 的 JSON 数组
+            items = json.loads(prompt)
+            state["sentences"] += len(items)
+            results = [{"id": item["id"], "words": split_words(item["text"])} for item in items]
+            return reply(json.dumps({"results": results}, ensure_ascii=False), prompt)
+        # 逐句分词: 待拆分的句子在提示词的最后, 返回 ['词1', '词2'] 格式
+        state["sentences"] += 1
+        sentence = prompt.rsplit("  ", 1)[-1]
+        return reply("[" + ", ".join(f"'{word}'" for word in split_words(sentence)) + "]", prompt)
+
+    app = web.Application()
+    app.router.add_post("/chat/completions", chat)
+    return app, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动本地的 Rebang 和大模型替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--crawl-latency", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit", type=float, default=None)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    rebang_app, _ = make_rebang_app(args.pages, args.page_size, args.crawl_latency)
+    chat_app, _ = make_chat_app(args.llm_latency, args.llm_rate_limit, args.llm_error_rate)
+
+    async def serve():
+        runners = []
+        for app, port, path in ((rebang_app, args.port, "/v1/items"), (chat_app, args.port + 1, "/chat/completions")):
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, args.host, port).start()
+            runners.append(runner)
+            print(f"http://{args.host}:{port}{path}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for runner in runners:
+                await runner.cleanup()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,13 @@
 import inspect
 import logging
-import os
-import json
 
-config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-with open(config_path, 'r') as f:
-    config = json.load(f)
+from Settings import get_settings
 
 
 def setup_logger():
-    log_level = config.get('LOG_LEVEL', 'INFO')
+    config = get_settings()
+    # README 和 config.json 中使用的是 LOGGING_LEVEL, LOG_LEVEL 是早期的名称
+    log_level = config.get('LOG_LEVEL') or config.get('LOGGING_LEVEL', 'INFO')
     logging.basicConfig(
         # 从配置文件当中读取LOG_LEVEL
         level=log_level,
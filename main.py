@@ -1,116 +1,475 @@
+import argparse
+import atexit
+import json
 import logging
 import os
-import json
-import jieba
+import signal
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path
 from RimeHandler import RimeFileHandler, RimeSQLiteHandler, RimeEntry
-from PinyinTools import quanpin_to_xiaohe, word_get_pinyin
-from Crawler import fetch_new_sentences, RebangParser
-from Tokenizer import LLM_Split_words
+from WordIndex import WordIndex
+from DictMerge import add_merge_arguments, compact_dict, merge_dicts
+from Pipeline import run_pipeline
+from Scheduler import Scheduler
+from RateLimiter import HostRateLimiter
+from PinyinTools import PinyinAnnotator, get_scheme, load_scheme, word_get_readings
+from Crawler import crawl_pages, load_sources, make_crawl_session
+from CrawlCache import ResponseCache
+from SentenceIndex import SeenSentenceIndex
+from Settings import get_settings
+from Tokenizer import (LLM_Split_words, LLM_MODEL, PROMPT_VERSION, make_llm_client, JiebaSegmenter, jieba_split_words,
+                       get_filter_rules)
+from LLMCache import SegmentationCache
+from Metrics import NEW_WORDS, REGISTRY, RUN_LATENCY, start_metrics_server
 import asyncio
 from logger_config import setup_logger, inspect_trace
-import time
 
 # 配置日志系统
 logger = setup_logger()
 
 # 读取配置文件
-config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-with open(config_path, 'r') as f:
-    config = json.load(f)
+config = get_settings()
 
 SPLIT_WORDS_MODE = config.get('SPLIT_WORDS_MODE')
 RUN_INTERVAL = config.get('run_interval', 86400)  # 默认每天运行一次
+RUN_JITTER = config.get('RUN_JITTER', 0.1)  # 运行间隔的随机抖动比例
+CRAWLER_MAX_CONCURRENCY = config.get('CRAWLER_MAX_CONCURRENCY', 8)
+CRAWLER_RATE_LIMIT = config.get('CRAWLER_RATE_LIMIT')  # 每个主机每秒最大请求数，为空则不限速
+CRAWLER_MAX_CONNECTIONS = config.get('CRAWLER_MAX_CONNECTIONS', 16)  # 所有来源共享的全局连接数上限
+NEW_WORD_WEIGHT = config.get('NEW_WORD_WEIGHT', 1)  # 新词条的权重，多音字的其他读音依次减半
+HETERONYM_MAX_READINGS = config.get('HETERONYM_MAX_READINGS', 1)  # 每个词最多生成的读音数，为1时不处理多音字
+PIPELINE_QUEUE_SIZE = config.get('PIPELINE_QUEUE_SIZE', 8)  # 流水线各阶段之间队列的最大批次数
+PIPELINE_SEGMENT_WORKERS = config.get('PIPELINE_SEGMENT_WORKERS', 4)  # 同时分词的批次数
+PIPELINE_WORD_BATCH_SIZE = config.get('PIPELINE_WORD_BATCH_SIZE', 500)  # 每批标注保存的最大新词数
+PIPELINE_FLUSH_INTERVAL = config.get('PIPELINE_FLUSH_INTERVAL', 5)  # 新词等待保存的最长秒数
+# 守护进程模式下 Prometheus 抓取指标的本地端口，为空则不启动 /metrics 接口
+METRICS_HOST = config.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = config.get('METRICS_PORT')
+# 每轮运行结束时把指标汇总写入这个 JSON 文件，为空则只写入日志
+METRICS_SUMMARY_PATH = config.get('METRICS_SUMMARY_PATH')
+# 判断新词是否已在词库中的方式：index 使用词库旁边的布隆过滤器索引并在数据库中确认，
+# set 读取词库文件中的词条建立集合，sqlite 直接查询数据库
+USER_DICT_MEMBERSHIP = config.get('USER_DICT_MEMBERSHIP', 'index')
 
 # 读取之前的词集合
 user_dict_path = Path(config.get('USER_DICT_PATH'))
 user_dict_db_path = Path(config.get('USER_DICT_DB_PATH'))
 
-# 创建 RimeFileHandler 和 RimeSQLiteHandler 实例
-file_handler = RimeFileHandler(user_dict_path)
-sqlite_handler = RimeSQLiteHandler(user_dict_db_path)
+# 爬取来源，未配置时使用默认的 Rebang 热榜
+DEFAULT_SOURCES = [
+    {
+        "name": "rebang_top_today",
+        "api_url": "https://api.rebang.today/v1/items",
+        "params": {"tab": "top", "sub_tab": "today", "version": 1},
+        "parser": "RebangParser"
+    }
+]
+sources = load_sources(config.get('SOURCES') or DEFAULT_SOURCES)
+
+# 以下对象第一次使用时才创建，导入 main 或只运行 compact、merge 时不会创建数据库文件和索引
+
+
+@lru_cache(maxsize=None)
+def get_file_handler():
+    """
+    主词库文件，index 模式下同时使用词库旁边的布隆过滤器索引
+    """
+    user_dict_index = WordIndex(Path(config.get('USER_DICT_INDEX_PATH', f"{user_dict_path}.idx")),
+                                capacity=config.get('USER_DICT_INDEX_CAPACITY', 100000)) \
+        if USER_DICT_MEMBERSHIP == 'index' else None
+    return RimeFileHandler(user_dict_path, index=user_dict_index)
+
+
+@lru_cache(maxsize=None)
+def get_sqlite_handler():
+    """
+    主词库的数据库备份
+    """
+    sqlite_handler = RimeSQLiteHandler(user_dict_db_path)
+    # 退出前关闭连接，把 WAL 日志合并回数据库文件，GitHub Actions 只会保存数据库文件本身
+    atexit.register(sqlite_handler.close)
+    return sqlite_handler
+
+
+@lru_cache(maxsize=None)
+def get_known_words():
+    """
+    set 模式下第一次查询时才从词库文件读取已有的词条，只保留词本身，不解析编码和权重
+    """
+    return get_file_handler().load_word_set() if os.path.exists(user_dict_path) else set()
+
+
+@lru_cache(maxsize=None)
+def get_response_cache():
+    """
+    爬取响应缓存，未变化的页面在下次运行时会被跳过，配置为空则不启用
+    """
+    http_cache_path = config.get('HTTP_CACHE_PATH')
+    return ResponseCache(Path(http_cache_path)) if http_cache_path else None
+
+
+@lru_cache(maxsize=None)
+def get_seen_index():
+    """
+    已处理句子索引，热榜上重复出现的标题不再重复分词，配置为空则不启用
+    """
+    seen_sentence_db_path = config.get('SEEN_SENTENCE_DB_PATH')
+    return SeenSentenceIndex(Path(seen_sentence_db_path), config.get('SEEN_SENTENCE_TTL_DAYS', 30)) \
+        if seen_sentence_db_path else None
+
 
-# 从词库文件读取
-if os.path.exists(user_dict_path):
-    old_user_dict = file_handler.read_dict()
-else:
-    old_user_dict = {}
+@lru_cache(maxsize=None)
+def get_llm_cache():
+    """
+    大模型分词结果缓存，同一句子在重跑或多个榜单重复时不再请求接口，配置为空则不启用
+    """
+    llm_cache_path = config.get('LLM_CACHE_PATH')
+    return SegmentationCache(Path(llm_cache_path), LLM_MODEL, PROMPT_VERSION,
+                             max_entries=config.get('LLM_CACHE_MAX_ENTRIES', 100000)) \
+        if llm_cache_path and SPLIT_WORDS_MODE == 'deepseek' else None
 
-# API URL
-source_api_url = "https://api.rebang.today/v1/items"
-params = {
-    "tab": "top",
-    "sub_tab": "today",
-    "version": 1
-}
 
-new_sentences_list = fetch_new_sentences(source_api_url, params=params, parser=RebangParser())
+@lru_cache(maxsize=None)
+def get_schemes():
+    """
+    双拼方案：主词库使用 SHUANGPIN_SCHEME，EXTRA_SCHEME_DICTS 中的每个方案另外输出一份词库文件
+    :return: 主词库的方案，以及 (方案, 词库文件) 的列表
+    """
+    for scheme_path in config.get('CUSTOM_SCHEME_PATHS', []):
+        load_scheme(Path(scheme_path))
+    shuangpin_scheme = get_scheme(config.get('SHUANGPIN_SCHEME', 'xiaohe'))
+    extra_schemes = [(get_scheme(name), RimeFileHandler(Path(path)))
+                     for name, path in config.get('EXTRA_SCHEME_DICTS', {}).items()]
+    return shuangpin_scheme, extra_schemes
 
-# 打印获取到的标题
-for index, sentence in enumerate(new_sentences_list):
-    logger.info(f"{index + 1} {sentence}")
 
+@lru_cache(maxsize=None)
+def get_pinyin_annotator():
+    """
+    拼音标注缓存，守护进程的各轮运行共用，配置了路径时同时保存到磁盘
+    """
+    pinyin_cache_path = config.get('PINYIN_CACHE_PATH')
+    return PinyinAnnotator(max_entries=config.get('PINYIN_CACHE_MAX_ENTRIES', 100000),
+                           db_path=Path(pinyin_cache_path) if pinyin_cache_path else None)
 
-def process_new_words(new_words_set):
-    # 生成新用户词典
+
+@lru_cache(maxsize=None)
+def get_jieba_segmenter():
+    """
+    jieba 多进程分词引擎，工作进程在守护进程的各轮运行之间复用
+    """
+    return JiebaSegmenter(workers=config.get('JIEBA_WORKERS', 0), chunk_size=config.get('JIEBA_CHUNK_SIZE', 2000))
+
+
+def make_entries(word, readings, scheme):
+    """
+    按读音的先后顺序生成词条，同一编码只保留一次，后面的读音权重依次减半，最小为 1
+    """
+    entries = []
+    codes = set()
+    for reading in readings:
+        code = scheme.encode(reading)
+        if code is None or code in codes:
+            continue
+        codes.add(code)
+        entries.append((word, RimeEntry(code, max(1, int(NEW_WORD_WEIGHT) >> len(entries)))))
+    return entries
+
+
+def find_known_words(words):
+    """
+    找出已经在词库中的词
+    """
+    if USER_DICT_MEMBERSHIP == 'index':
+        return get_file_handler().find_existing(words, verify=get_sqlite_handler().contains_words,
+                                                on_rebuild=sync_user_dict_db)
+    if USER_DICT_MEMBERSHIP == 'sqlite':
+        return get_sqlite_handler().contains_words(words)
+    known_words = get_known_words()
+    return {word for word in words if word in known_words}
+
+
+def import_user_dict():
+    """
+    初次运行时逐行备份老用户词典的数据到数据库中，后面只需要追加新词
+    """
+    sqlite_handler = get_sqlite_handler()
+    if sqlite_handler.count() == 0 and os.path.exists(user_dict_path):
+        sqlite_handler.save_entries(get_file_handler().iter_entries())
+
+
+def sync_user_dict_db():
+    """
+    index 模式下由数据库确认索引的查询结果，词库文件在程序之外被修改后（例如手动编辑、从其他机器复制），
+    索引会重新建立，这时把文件中数据库还没有的词条补充到数据库，使两者保持一致
+    """
+    if not get_sqlite_handler().insert_missing(get_file_handler().iter_entries()):
+        logger.error("同步词库文件到数据库时发生错误。")
+
+
+def process_new_words(new_words_set, word_sources=None):
+    """
+    标注新词的拼音，保存到数据库并追加到词库文件
+    :param new_words_set: 分词得到的词，已在词库中的词会被跳过
+    :param word_sources: 词的来源，格式为 {词: 来源名称}
+    :return: 新词都已保存到数据库和主词库文件（或者没有新词）时返回 True，否则返回 False
+    """
+    shuangpin_scheme, extra_schemes = get_schemes()
+    pinyin_annotator = get_pinyin_annotator()
+
+    # 生成新用户词典，每个词只标注一次拼音，再按各个双拼方案查表编码
     new_user_dict = {}
-    for word in new_words_set:
+    # 多音字的其他读音，作为同一个词的额外词条追加到词库文件
+    alternate_entries = []
+    extra_entries = [[] for _ in extra_schemes]
+    old_words = find_known_words(new_words_set)
+    # 已有的词再次出现时只更新出现次数和最近出现时间，失败不影响新词的保存
+    if old_words:
+        get_sqlite_handler().record_hits(old_words)
+    annotations = pinyin_annotator.annotate(word for word in new_words_set if word not in old_words)
+    for word, full_pinyin in annotations.items():
         try:
-            full_pinyin = word_get_pinyin(word)
-            xiaohe_pinyin = [quanpin_to_xiaohe(item) for item in full_pinyin]
-            logger.debug(f"{xiaohe_pinyin}")
+            if shuangpin_scheme.encode(full_pinyin) is None:
+                logger.error(f"Error converting pinyin for word '{word}': {full_pinyin}")
+                continue
+            # 第一个读音就是 full_pinyin，生成的第一个词条即为首选编码
+            readings = word_get_readings(word, HETERONYM_MAX_READINGS, primary=full_pinyin)
+            entries = make_entries(word, readings, shuangpin_scheme)
+            logger.debug(f"{entries}")
         except Exception as e:
             logger.error(f"Error processing word '{word}': {e}")
             inspect_trace()
             continue
 
         # 如果该词语的拼音解析转换没有出错，那么就会被添加到新用户词典当中
-        rimeentry = RimeEntry(''.join(xiaohe_pinyin), 1)
-        if word not in old_user_dict:
-            new_user_dict[word] = rimeentry
+        new_user_dict[word] = entries[0][1]
+        alternate_entries.extend(entries[1:])
+        for (scheme, _), scheme_entries in zip(extra_schemes, extra_entries):
+            scheme_entries.extend(make_entries(word, readings, scheme))
+
+    pinyin_annotator.flush()
 
     logger.info(f"{new_words_set}")
+    if not new_user_dict:
+        # 没有新词时不写入数据库和词库文件，避免留下空的日期注释
+        return True
+
     for item in new_user_dict:
         logger.info(f"{item}: {new_user_dict[item]}")
 
-    # 保存到SQLite数据库
-    if not os.path.exists(user_dict_db_path):
-        # 初次运行，备份老用户词典的数据到数据库中，后面只需要追加新词
-        sqlite_handler.save_sqlite(old_user_dict)
-
-    sqlite_handler.save_sqlite(new_user_dict)
+    # 保存到SQLite数据库，保存失败时不追加到词库文件，避免词库文件中有数据库里没有的词
+    if not get_sqlite_handler().save_entries(list(new_user_dict.items()) + alternate_entries, sources=word_sources,
+                                             segmenter=SPLIT_WORDS_MODE):
+        logger.error("保存新词条到数据库时发生错误，本批新词没有追加到词库文件。")
+        return False
 
     # 追加新词条到词库文件
-    append_result = file_handler.append_dict(new_user_dict, add_date_comment=True)
+    append_result = get_file_handler().append_entries(list(new_user_dict.items()) + alternate_entries,
+                                                      add_date_comment=True)
+    for (scheme, extra_handler), scheme_entries in zip(extra_schemes, extra_entries):
+        if not extra_handler.append_entries(scheme_entries, add_date_comment=True):
+            logger.error(f"追加新词条到 {scheme.name} 词库文件时发生错误。")
 
     if append_result:
+        NEW_WORDS.inc(len(new_user_dict))
+        # 守护进程模式下，后续批次和轮次不再重复添加这些词
+        if USER_DICT_MEMBERSHIP == 'set':
+            get_known_words().update(new_user_dict)
         logger.info(f"{len(new_user_dict)} 个新词条已成功追加到词库文件当中。")
-        logger.info("本次运行结束")
     else:
         logger.error("追加新词条到词库文件时发生错误。")
-        logger.error("本次运行结束")
+    return append_result
 
 
-async def main():
-    if SPLIT_WORDS_MODE == 'deepseek':
-        new_words_set = await LLM_Split_words(new_sentences_list)
-    else:
-        new_words_set = set()
-        for sentence in new_sentences_list:
-            words = jieba.lcut(sentence)
-            new_words_set.update(words)
+async def main(cycle_sources=None, crawl_session=None, crawl_limiter=None, llm_client=None):
+    """
+    运行一轮：爬取、分词、标注拼音并保存新词
+    守护进程传入各轮复用的会话和客户端，为空时本轮内部创建
+    :param cycle_sources: 本轮爬取的来源，为空时爬取全部来源
+    :param crawl_session: 复用的爬虫 aiohttp 会话
+    :param crawl_limiter: 复用的按主机限速器
+    :param llm_client: 复用的大模型客户端
+    """
+    if llm_client is None and SPLIT_WORDS_MODE == 'deepseek':
+        # 一次运行共用一个大模型客户端，并发、限速和熔断状态在所有来源之间共享
+        async with make_llm_client() as llm_client:
+            return await main(cycle_sources, crawl_session, crawl_limiter, llm_client)
+
+    # 本轮开始时的指标快照，结束时汇总本轮的增量
+    metrics_snapshot = REGISTRY.snapshot()
+    response_cache = get_response_cache()
+    seen_index = get_seen_index()
+    llm_cache = get_llm_cache()
+    seen_sentences = set()
+    # 每条句子所在页面的缓存键，以及分词或保存失败的句子，本轮结束时只记录句子全部处理成功的页面
+    sentence_pages = {}
+    failed_sentences = set()
+    if llm_client is not None:
+        # 熔断只在一轮之内有效，守护进程的下一轮重新尝试大模型接口
+        llm_client.breaker.reset()
+
+    if seen_index is not None:
+        seen_index.purge_expired()
+
+    # 每轮开始时检查过滤规则文件，守护进程无需重启即可使用新规则
+    get_filter_rules().reload()
+    import_user_dict()
+
+    async def sentence_batches():
+        # 各来源并发爬取，每下载完一页就交给分词阶段
+        async for source, sentences, cache_key in crawl_pages(cycle_sources or sources,
+                                                              max_connections=CRAWLER_MAX_CONNECTIONS,
+                                                              max_concurrency=CRAWLER_MAX_CONCURRENCY,
+                                                              rate_limit=CRAWLER_RATE_LIMIT, cache=response_cache,
+                                                              queue_size=PIPELINE_QUEUE_SIZE, session=crawl_session,
+                                                              limiter=crawl_limiter):
+            # 不同榜单之间会有重复的标题，只保留第一次出现的
+            sentences = [sentence for sentence in dict.fromkeys(sentences) if sentence not in seen_sentences]
+            seen_sentences.update(sentences)
+            # 之前运行中已经处理过的句子不再分词
+            if seen_index is not None:
+                sentences = seen_index.filter_new(sentences)
 
-    logger.info(f"new_words_set: {new_words_set}")
-    logger.info(f"new_words_set length: {len(new_words_set)}")
+            # 打印获取到的标题
+            logger.info(f"{source.name}: 获取到 {len(sentences)} 条新句子")
+            for index, sentence in enumerate(sentences):
+                logger.info(f"{index + 1} {sentence}")
 
-    process_new_words(new_words_set)
+            if sentences:
+                if cache_key is not None:
+                    sentence_pages.update(dict.fromkeys(sentences, cache_key))
+                yield source.name, sentences
+
+    async def segment(sentences):
+        try:
+            if SPLIT_WORDS_MODE == 'deepseek':
+                return await LLM_Split_words(sentences, cache=llm_cache, client=llm_client)
+            return await jieba_split_words(sentences, get_jieba_segmenter())
+        except Exception:
+            failed_sentences.update(sentences)
+            raise
+
+    def persist(word_sources, sentences):
+        # 在流水线的保存线程中执行, 数据库、拼音缓存和词库文件在这一轮中只由这个线程写入
+        # 新词成功保存到数据库和词库文件后才记录句子状态，保存失败的句子下次运行时重新分词
+        # 注意大模型请求失败时 LLM_Split_words 会改用 jieba 分词而不是抛出异常，这些句子同样会被记录
+        if not process_new_words(set(word_sources), word_sources):
+            failed_sentences.update(sentences)
+        elif seen_index is not None:
+            seen_index.mark_seen(sentences)
+
+    stats = await run_pipeline(sentence_batches(), segment, persist,
+                               segment_workers=PIPELINE_SEGMENT_WORKERS, queue_size=PIPELINE_QUEUE_SIZE,
+                               word_batch_size=PIPELINE_WORD_BATCH_SIZE, flush_interval=PIPELINE_FLUSH_INTERVAL)
+
+    logger.info(f"Pipeline stats: {stats.as_dict()}")
+    if llm_cache is not None:
+        logger.info(f"LLM cache stats: {llm_cache.stats()}")
+
+    # 本轮处理完成后才记录页面状态，中途失败时下次运行会重新爬取；
+    # 有句子分词或保存失败的页面不记录，下次运行时仍被当作有变化重新处理
+    if response_cache is not None:
+        response_cache.discard({sentence_pages[sentence] for sentence in failed_sentences
+                                if sentence in sentence_pages})
+        response_cache.flush()
+    write_metrics_summary(metrics_snapshot, stats)
+    logger.info("本次运行结束")
+
+
+def write_metrics_summary(snapshot, stats):
+    """
+    汇总本轮运行的指标，写入日志，配置了 METRICS_SUMMARY_PATH 时同时写入文件
+    :param snapshot: 本轮开始时的指标快照
+    :param stats: 本轮流水线的统计
+    """
+    summary = REGISTRY.summary(since=snapshot)
+    if summary['seconds'] is not None:
+        RUN_LATENCY.observe(summary['seconds'])
+    summary['pipeline'] = stats.as_dict()
+    text = json.dumps(summary, ensure_ascii=False)
+    logger.info(f"Metrics summary: {text}")
+    if METRICS_SUMMARY_PATH:
+        try:
+            with open(METRICS_SUMMARY_PATH, 'w', encoding='utf-8') as f:
+                f.write(text + "\n")
+        except OSError as e:
+            logger.error(f"写入指标汇总文件失败: {e}")
+
+
+async def daemon(max_cycles=None):
+    """
+    守护进程模式：在同一个事件循环中按来源的间隔反复运行，
+    爬虫会话、大模型客户端、数据库连接、jieba 词典和拼音缓存在各轮之间复用
+    :param max_cycles: 最多运行的轮数，为空时一直运行直到收到 SIGTERM 或 SIGINT
+    """
+    llm_context = make_llm_client() if SPLIT_WORDS_MODE == 'deepseek' else nullcontext()
+    try:
+        async with make_crawl_session(CRAWLER_MAX_CONNECTIONS) as crawl_session, llm_context as llm_client:
+            crawl_limiter = HostRateLimiter(CRAWLER_RATE_LIMIT) if CRAWLER_RATE_LIMIT else None
+
+            async def run_cycle(due_sources):
+                await main(due_sources, crawl_session, crawl_limiter, llm_client)
+
+            # Prometheus 抓取接口，默认只监听本机
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+            if metrics_runner is not None:
+                logger.info(f"Metrics endpoint: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+            scheduler = Scheduler(run_cycle, sources, RUN_INTERVAL, jitter=RUN_JITTER)
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                try:
+                    loop.add_signal_handler(sig, scheduler.stop)
+                except (NotImplementedError, RuntimeError):
+                    # Windows 不支持 add_signal_handler
+                    pass
+            try:
+                await scheduler.run(max_cycles)
+            finally:
+                if metrics_runner is not None:
+                    await metrics_runner.cleanup()
+    finally:
+        # 出错退出时同样要结束 jieba 工作进程
+        get_jieba_segmenter().close()
+
+
+def compact_dictionaries(order='word', weight_policy='max'):
+    """
+    压缩整理主词库和各个双拼方案的词库文件，主词库的日期注释保存到数据库中
+    """
+    ok = compact_dict(get_file_handler(), get_sqlite_handler(), order=order, weight_policy=weight_policy)
+    for scheme, extra_handler in get_schemes()[1]:
+        if extra_handler.file_path.exists():
+            ok = compact_dict(extra_handler, order=order, weight_policy=weight_policy) and ok
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NewWordSpider")
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help="爬取新词并追加到词库（默认）")
+    run_parser.add_argument('--once', action='store_true', help="只运行一轮，不进入守护进程模式")
+    compact_parser = subparsers.add_parser('compact', help="压缩整理词库文件")
+    compact_parser.add_argument('--sort', choices=['word', 'code'], default='word', help="按词条或按编码排序")
+    compact_parser.add_argument('--weights', choices=['max', 'sum'], default='max', help="重复词条的权重合并方式")
+    add_merge_arguments(subparsers.add_parser('merge', help="三方合并两个词库文件"))
+    return parser.parse_args(argv)
 
 
 # 示例用法
 if __name__ == "__main__":
-    while True:
+    args = parse_args()
+    if args.command == 'compact':
+        exit(0 if compact_dictionaries(args.sort, args.weights) else 1)
+    if args.command == 'merge':
+        exit(0 if merge_dicts(args.old, args.new, args.merged, args.base, args.codes, args.weights, args.sort) else 1)
+
+    if SPLIT_WORDS_MODE == 'deepseek' and not config.llm_api_key:
+        logger.error("LLM_API_KEY is empty, please set it in config.json")
+        exit(-1)
+
+    if os.getenv('GITHUB_ACTIONS') or getattr(args, 'once', False):
         asyncio.run(main())
-        if os.getenv('GITHUB_ACTIONS'):
-            exit(0)
-        logger.info(f"Sleeping for {RUN_INTERVAL} seconds...")
-        time.sleep(RUN_INTERVAL)
\ No newline at end of file
+        exit(0)
+    asyncio.run(daemon())
\ No newline at end of file
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from Crawler import async_fetch_new_sentences, crawl_pages, load_sources, RebangParser
+from CrawlCache import ResponseCache
+
+
+def make_items_app(total_page: int, delay: float = 0.0, fail_pages=()):
+    """
+    构造一个模拟 Rebang items 接口的 aiohttp 应用
+    """
+    state = {"in_flight": 0, "max_in_flight": 0, "requests": 0}
+
+    async def items(request):
+        page = int(request.query.get("page", 1))
+        state["requests"] += 1
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        try:
+            # 页码越小延迟越大，保证响应乱序返回
+            await asyncio.sleep(delay * (total_page - page + 1))
+        finally:
+            state["in_flight"] -= 1
+        if page in fail_pages:
+            return web.Response(status=500)
+        item_list = [{"title": f"标题{page}", "desc": ""}]
+        return web.json_response({"data": {"total_page": total_page, "list": json.dumps(item_list)}})
+
+    app = web.Application()
+    app.router.add_get("/v1/items", items)
+    return app, state
+
+
+class TestAsyncFetchNewSentences(unittest.IsolatedAsyncioTestCase):
+
+    async def test_pages_in_order(self):
+        app, _ = make_items_app(total_page=5, delay=0.01)
+        async with TestServer(app) as server:
+            result = await async_fetch_new_sentences(str(server.make_url("/v1/items")), {"tab": "top"},
+                                                     RebangParser())
+        self.assertEqual(result, [f"标题{page}" for page in range(1, 6)])
+
+    async def test_concurrency_limit(self):
+        app, state = make_items_app(total_page=10, delay=0.01)
+        async with TestServer(app) as server:
+            await async_fetch_new_sentences(str(server.make_url("/v1/items")), {}, RebangParser(),
+                                            max_concurrency=3)
+        self.assertLessEqual(state["max_in_flight"], 3)
+        self.assertGreater(state["max_in_flight"], 1)
+
+    async def test_failed_page_is_skipped(self):
+        app, _ = make_items_app(total_page=3, fail_pages=(2,))
+        async with TestServer(app) as server:
+            result = await async_fetch_new_sentences(str(server.make_url("/v1/items")), {}, RebangParser())
+        self.assertEqual(result, ["标题1", "标题3"])
+
+
+class TestCrawlSources(unittest.IsolatedAsyncioTestCase):
+
+    def test_load_sources(self):
+        sources = load_sources([
+            {"name": "top", "api_url": "http://example.com/items", "params": {"tab": "top"}, "parser": "RebangParser"},
+            {"name": "off", "api_url": "http://example.com/items", "parser": "RebangParser", "enabled": False},
+        ])
+        self.assertEqual([source.name for source in sources], ["top"])
+        self.assertIsInstance(sources[0].parser, RebangParser)
+
+        with self.assertRaises(ValueError):
+            load_sources([{"api_url": "http://example.com/items", "parser": "NoSuchParser"}])
+
+    async def test_crawl_pages_streams_each_page(self):
+        app, _ = make_items_app(total_page=4, delay=0.01, fail_pages=(3,))
+        async with TestServer(app) as server:
+            url = str(server.make_url("/v1/items"))
+            sources = load_sources([{"name": f"tab{i}", "api_url": url, "params": {"tab": i}} for i in range(2)])
+            pages = [(page.source.name, page.sentences) async for page in crawl_pages(sources, queue_size=1)]
+        self.assertEqual(len(pages), 6)
+        for name in ("tab0", "tab1"):
+            # 第1页最先产出, 其余页按完成顺序, 失败的页被跳过
+            source_pages = [sentences for source_name, sentences in pages if source_name == name]
+            self.assertEqual(source_pages[0], ["标题1"])
+            self.assertCountEqual(source_pages[1:], [["标题2"], ["标题4"]])
+
+    async def test_crawl_pages_bounded_by_consumer(self):
+        app, state = make_items_app(total_page=50)
+        async with TestServer(app) as server:
+            sources = load_sources([{"name": "top", "api_url": str(server.make_url("/v1/items"))}])
+            pages = crawl_pages(sources, max_concurrency=2, queue_size=1)
+            try:
+                await pages.__anext__()
+                # 下游不取页时不再继续下载: 最多第1页、取走的页、队列中的页、等待入队的页和正在下载的页
+                await asyncio.sleep(0.3)
+                self.assertLessEqual(state["requests"], 6)
+                remaining = [page async for page in pages]
+            finally:
+                await pages.aclose()
+        self.assertEqual(len(remaining), 49)
+        self.assertEqual(state["requests"], 50)
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(Path(self.tmp_dir.name) / "cache.db")
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def make_app(use_etag: bool):
+        state = {"titles": ["标题1"], "not_modified": 0}
+
+        async def items(request):
+            body = json.dumps({"data": {"total_page": 1, "list": json.dumps([{"title": t} for t in state["titles"]])}})
+            etag = f'"{len(state["titles"])}"'
+            if use_etag and request.headers.get("If-None-Match") == etag:
+                state["not_modified"] += 1
+                return web.Response(status=304)
+            headers = {"ETag": etag} if use_etag else {}
+            return web.Response(text=body, content_type="application/json", headers=headers)
+
+        app = web.Application()
+        app.router.add_get("/v1/items", items)
+        return app, state
+
+    async def fetch(self, server):
+        return await async_fetch_new_sentences(str(server.make_url("/v1/items")), {"tab": "top"}, RebangParser(),
+                                               cache=self.cache)
+
+    async def test_etag(self):
+        app, state = self.make_app(use_etag=True)
+        async with TestServer(app) as server:
+            self.assertEqual(await self.fetch(server), ["标题1"])
+            self.cache.flush()
+            self.assertEqual(await self.fetch(server), [])
+            self.assertEqual(state["not_modified"], 1)
+
+            state["titles"].append("标题2")
+            self.assertEqual(await self.fetch(server), ["标题1", "标题2"])
+
+    async def test_content_hash(self):
+        app, state = self.make_app(use_etag=False)
+        async with TestServer(app) as server:
+            self.assertEqual(await self.fetch(server), ["标题1"])
+            self.cache.flush()
+            self.assertEqual(await self.fetch(server), [])
+
+            state["titles"].append("标题2")
+            self.assertEqual(await self.fetch(server), ["标题1", "标题2"])
+
+    async def test_unflushed_entries_are_not_persisted(self):
+        app, _ = self.make_app(use_etag=True)
+        async with TestServer(app) as server:
+            await self.fetch(server)
+            self.assertEqual(await self.fetch(server), ["标题1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from DictMerge import compact_dict, external_sort, merge_dicts, merge_weights, SORT_KEYS
+from RimeHandler import RimeEntry, RimeFileHandler, RimeSQLiteHandler
+from WordIndex import WordIndex
+
+
+class TestExternalSort(unittest.TestCase):
+
+    def test_matches_in_memory_sort(self):
+        records = [(f"词{i % 97}", f"c{i % 13}", str(i), None) for i in range(1000)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result = list(external_sort(records, SORT_KEYS["word"], run_size=64, tmp_dir=tmp_dir))
+            self.assertEqual(os.listdir(tmp_dir), [])
+        self.assertEqual(result, sorted(records, key=SORT_KEYS["word"]))
+
+    def test_merge_weights(self):
+        self.assertEqual(merge_weights(["1", None, "5"]), "5")
+        self.assertEqual(merge_weights(["1", "5"], "sum"), "6")
+        self.assertIsNone(merge_weights([None, None]))
+        self.assertEqual(merge_weights(["abc", None]), "abc")
+
+
+class TestCompactDict(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dict_path = Path(self.tmp_dir.name) / "flypy_user.txt"
+        self.dict_path.write_text(
+            "# Rime user dictionary\n"
+            "\n"
+            "中国\tvsgo\t1\n"
+            "\n# Added on 2024-09-23 12:00:00\n"
+            "世界\tuijp\t1\n"
+            "中国\tvsgo\t3\n"
+            "\n# Added on 2024-09-24 12:00:00\n"
+            "长大\tihda\t1\n"
+            "长大\tvhda\n"
+            "世界\tuijp\t2\n"
+            "坏行\n",
+            encoding="utf-8")
+        self.handler = RimeFileHandler(self.dict_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_compact_dedups_and_sorts_by_word(self):
+        self.assertTrue(compact_dict(self.handler, run_size=2))
+        self.assertEqual(self.dict_path.read_text(encoding="utf-8"),
+                         "# Rime user dictionary\n"
+                         "世界\tuijp\t2\n"
+                         "中国\tvsgo\t3\n"
+                         "长大\tihda\t1\n"
+                         "长大\tvhda\n")
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["flypy_user.txt"])
+
+    def test_compact_sorts_by_code_and_sums_weights(self):
+        self.assertTrue(compact_dict(self.handler, order="code", weight_policy="sum", run_size=3))
+        entries = list(self.handler.iter_entries())
+        self.assertEqual([entry.code for _, entry in entries], ["ihda", "uijp", "vhda", "vsgo"])
+        self.assertIn(("世界", RimeEntry("uijp", "3")), entries)
+        self.assertIn(("中国", RimeEntry("vsgo", "4")), entries)
+
+    def test_dates_are_recorded_in_sqlite(self):
+        with RimeSQLiteHandler(Path(self.tmp_dir.name) / "flypy_user.db") as sqlite_handler:
+            sqlite_handler.save_entries([("世界", RimeEntry("uijp", "1"))])
+            self.assertTrue(compact_dict(self.handler, sqlite_handler))
+
+            first_seen = dict(sqlite_handler._connect().execute(
+                "SELECT word || code, first_seen FROM rime_user_dict"))
+        self.assertEqual(first_seen["世界uijp"], int(datetime(2024, 9, 23, 12).timestamp()))
+        self.assertEqual(first_seen["长大vhda"], int(datetime(2024, 9, 24, 12).timestamp()))
+        # 同一词条出现在多个位置时取最早有日期的一次
+        self.assertEqual(first_seen["中国vsgo"], int(datetime(2024, 9, 23, 12).timestamp()))
+
+    def test_index_is_rebuilt(self):
+        index = WordIndex(Path(self.tmp_dir.name) / "flypy_user.idx")
+        handler = RimeFileHandler(self.dict_path, index=index)
+        self.assertTrue(compact_dict(handler))
+        self.assertTrue(index.is_fresh(self.dict_path))
+        self.assertEqual(handler.find_existing(["长大", "坏行"]), {"长大"})
+
+    def test_missing_file(self):
+        self.assertFalse(compact_dict(RimeFileHandler(Path(self.tmp_dir.name) / "missing.txt")))
+
+
+class TestMergeDicts(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, name, text):
+        path = self.dir / name
+        path.write_text(text, encoding="utf-8")
+        return path
+
+    def test_two_way_union_is_sorted_and_deduplicated(self):
+        old = self.write("old.txt", "中国\tvsgo\t1\n世界\tuijp\t1\n")
+        new = self.write("new.txt", "中国\tvsgo\t3\n\n# Added on 2024-09-23 12:00:00\n长大\tihda\t1\n")
+        merged = self.dir / "merged.txt"
+        self.assertTrue(merge_dicts(old, new, merged, run_size=1))
+        self.assertEqual(merged.read_text(encoding="utf-8"), "世界\tuijp\t1\n中国\tvsgo\t3\n长大\tihda\t1\n")
+        self.assertEqual(sorted(os.listdir(self.dir)), ["merged.txt", "new.txt", "old.txt"])
+
+    def test_merge_is_deterministic(self):
+        old = self.write("old.txt", "".join(f"词{i}\tc{i % 7}\t{i}\n" for i in range(200)))
+        new = self.write("new.txt", "".join(f"词{i}\tc{i % 5}\t{i + 1}\n" for i in range(199, -1, -1)))
+        first, second = self.dir / "first.txt", self.dir / "second.txt"
+        self.assertTrue(merge_dicts(old, new, first, run_size=16))
+        self.assertTrue(merge_dicts(old, new, second))
+        self.assertEqual(first.read_bytes(), second.read_bytes())
+
+    def test_three_way_merge(self):
+        base = self.write("base.txt", "中国\tvsgo\t1\n世界\tuijp\t1\n长大\tihda\t1\n")
+        # old 删除了世界, 修改了中国的权重
+        old = self.write("old.txt", "中国\tvsgo\t5\n长大\tihda\t1\n")
+        # new 给长大增加了读音, 新增了词条
+        new = self.write("new.txt", "中国\tvsgo\t1\n世界\tuijp\t1\n长大\tihda\t1\n长大\tvhda\t1\n新词\txbci\n")
+        merged = self.dir / "merged.txt"
+        self.assertTrue(merge_dicts(old, new, merged, base_path=base))
+        self.assertEqual(list(RimeFileHandler(merged).iter_entries()), [
+            ("中国", RimeEntry("vsgo", "5")),
+            ("新词", RimeEntry("xbci", None)),
+            ("长大", RimeEntry("ihda", "1")),
+            ("长大", RimeEntry("vhda", "1")),
+        ])
+
+    def test_conflict_policies(self):
+        base = self.write("base.txt", "中国\tvsgo\t1\n")
+        old = self.write("old.txt", "中国\tvsgo\t2\n中国\tzsgo\t1\n")
+        new = self.write("new.txt", "中国\tvsgo\t3\n中国\tvsgd\t1\n")
+        merged = self.dir / "merged.txt"
+
+        self.assertTrue(merge_dicts(old, new, merged, base_path=base, weight_policy="sum"))
+        self.assertEqual(list(RimeFileHandler(merged).iter_entries()), [
+            ("中国", RimeEntry("vsgd", "1")),
+            ("中国", RimeEntry("vsgo", "5")),
+            ("中国", RimeEntry("zsgo", "1")),
+        ])
+
+        self.assertTrue(merge_dicts(old, new, merged, base_path=base, code_policy="old", weight_policy="new"))
+        self.assertEqual(list(RimeFileHandler(merged).iter_entries()), [
+            ("中国", RimeEntry("vsgo", "3")),
+            ("中国", RimeEntry("zsgo", "1")),
+        ])
+
+    def test_merge_in_place_and_missing_file(self):
+        old = self.write("old.txt", "# header\n中国\tvsgo\n")
+        new = self.write("new.txt", "世界\tuijp\n")
+        self.assertTrue(merge_dicts(old, new, old, order="code"))
+        self.assertEqual(old.read_text(encoding="utf-8"), "# header\n世界\tuijp\n中国\tvsgo\n")
+        self.assertFalse(merge_dicts(old, self.dir / "missing.txt", old))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from LLMCache import SegmentationCache
+
+
+class TestSegmentationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / "llm_cache.db"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_get_put(self):
+        cache = SegmentationCache(self.db_path, "deepseek-chat", 1)
+        self.assertIsNone(cache.get("测试句子"))
+        cache.put("测试句子", ["测试", "句子"])
+        self.assertEqual(cache.get("测试句子"), ["测试", "句子"])
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "entries": 1})
+        cache.close()
+
+    def test_key_includes_model_and_prompt_version(self):
+        cache = SegmentationCache(self.db_path, "deepseek-chat", 1)
+        cache.put("测试句子", ["测试", "句子"])
+        cache.close()
+
+        for model, version in [("other-model", 1), ("deepseek-chat", 2)]:
+            other = SegmentationCache(self.db_path, model, version)
+            self.assertIsNone(other.get("测试句子"))
+            other.close()
+
+        reopened = SegmentationCache(self.db_path, "deepseek-chat", 1)
+        self.assertEqual(reopened.get("测试句子"), ["测试", "句子"])
+        reopened.close()
+
+    def test_lru_eviction(self):
+        cache = SegmentationCache(self.db_path, "deepseek-chat", 1, max_entries=2)
+        cache.put("句子一", ["句子一"])
+        cache.put("句子二", ["句子二"])
+        # 访问句子一，使句子二成为最久未使用的条目
+        cache.get("句子一")
+        cache.put("句子三", ["句子三"])
+
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertIsNone(cache.get("句子二"))
+        self.assertEqual(cache.get("句子一"), ["句子一"])
+        self.assertEqual(cache.get("句子三"), ["句子三"])
+        cache.close()
+
+    def test_hits_written_back_in_batch(self):
+        cache = SegmentationCache(self.db_path, "deepseek-chat", 1, max_entries=2)
+        cache.put("句子一", ["句子一"])
+        cache.put("句子二", ["句子二"])
+        cache.flush()
+
+        # 命中时不写数据库, flush 时一次写回
+        changes = cache._conn.total_changes
+        for _ in range(3):
+            self.assertEqual(cache.get("句子一"), ["句子一"])
+        self.assertEqual(cache._conn.total_changes, changes)
+        cache.flush()
+        self.assertEqual(cache._conn.total_changes, changes + 1)
+
+        # close 时写回还没有保存的命中, 重新打开后句子二是最久未使用的条目
+        cache.get("句子二")
+        cache.get("句子一")
+        cache.close()
+        reopened = SegmentationCache(self.db_path, "deepseek-chat", 1, max_entries=2)
+        reopened.put("句子三", ["句子三"])
+        self.assertIsNone(reopened.get("句子二"))
+        self.assertEqual(reopened.get("句子一"), ["句子一"])
+        reopened.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
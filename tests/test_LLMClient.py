@@ -0,0 +1,128 @@
+import asyncio
+import time
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from LLMClient import LLMClient, LLMRequestError, LLMUnavailableError, parse_retry_after
+
+
+def make_app(statuses, retry_after=None, delay=0.0):
+    """
+    构造一个按顺序返回给定状态码的模拟接口，状态码用完后一直返回200
+    """
+    state = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "times": []}
+
+    async def chat(request):
+        index = state["requests"]
+        state["times"].append(time.monotonic())
+        state["requests"] += 1
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            state["in_flight"] -= 1
+        status = statuses[index] if index < len(statuses) else 200
+        if status != 200:
+            headers = {"Retry-After": retry_after} if retry_after else {}
+            return web.Response(status=status, headers=headers)
+        return web.json_response({"choices": [{"message": {"content": "ok"}}]})
+
+    app = web.Application()
+    app.router.add_post("/chat/completions", chat)
+    return app, state
+
+
+class TestLLMClient(unittest.IsolatedAsyncioTestCase):
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertAlmostEqual(parse_retry_after("Thu, 01 Jan 1970 00:00:00 GMT"), 0.0)
+
+    async def test_retry_then_success(self):
+        app, state = make_app([503, 500])
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key", backoff_base=0.01) as client:
+                result = await client.chat({})
+        self.assertEqual(result["choices"][0]["message"]["content"], "ok")
+        self.assertEqual(state["requests"], 3)
+
+    async def test_honors_retry_after(self):
+        app, _ = make_app([429], retry_after="0.3")
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key", rate_limit=100) as client:
+                start = time.monotonic()
+                await client.chat({})
+                self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+    async def test_retry_after_pauses_all_requests(self):
+        app, state = make_app([429], retry_after="0.3")
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key") as client:
+                first = asyncio.ensure_future(client.chat({}))
+                while state["requests"] == 0:
+                    await asyncio.sleep(0.01)
+                await asyncio.sleep(0.05)
+                # 收到 429 之后发出的其他请求也要等到 Retry-After 结束
+                await asyncio.gather(first, client.chat({}))
+        self.assertEqual(state["requests"], 3)
+        self.assertGreaterEqual(min(state["times"][1:]) - state["times"][0], 0.3)
+
+    async def test_backoff_releases_concurrency_slot(self):
+        app, _ = make_app([503])
+        finished = []
+
+        async def chat(client, name):
+            await client.chat({})
+            finished.append(name)
+
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key", max_concurrency=1,
+                                 backoff_base=0.5) as client:
+                # 第一个请求退避等待期间, 第二个请求使用空出的并发名额先完成
+                await asyncio.gather(chat(client, "retry"), chat(client, "other"))
+        self.assertEqual(finished, ["other", "retry"])
+
+    async def test_non_retryable_status(self):
+        app, state = make_app([401])
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key") as client:
+                with self.assertRaises(LLMRequestError):
+                    await client.chat({})
+        self.assertEqual(state["requests"], 1)
+
+    async def test_timeout(self):
+        app, _ = make_app([], delay=1.0)
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key", timeout=0.1,
+                                 max_retries=0) as client:
+                with self.assertRaises(LLMRequestError):
+                    await client.chat({})
+
+    async def test_concurrency_limit(self):
+        app, state = make_app([], delay=0.02)
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key", max_concurrency=2) as client:
+                await asyncio.gather(*(client.chat({}) for _ in range(6)))
+        self.assertEqual(state["max_in_flight"], 2)
+
+    async def test_circuit_breaker(self):
+        app, state = make_app([500] * 100)
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key", max_retries=1,
+                                 backoff_base=0.01, failure_threshold=2) as client:
+                for _ in range(2):
+                    with self.assertRaises(LLMRequestError):
+                        await client.chat({})
+                requests_before = state["requests"]
+                with self.assertRaises(LLMUnavailableError):
+                    await client.chat({})
+        self.assertEqual(state["requests"], requests_before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import threading
+import unittest
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from LLMClient import LLMClient
+from Metrics import LLM_CALLS, LLM_TOKENS, REGISTRY, MetricsRegistry, start_metrics_server
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_render_prometheus_text(self):
+        registry = MetricsRegistry()
+        pages = registry.counter("pages_total", "页数", ("status",))
+        latency = registry.histogram("latency_seconds", "耗时", buckets=(0.1, 1.0))
+        pages.inc(status="ok")
+        pages.inc(2, status="ok")
+        pages.inc(status='say "hi"')
+        latency.observe(0.05)
+        latency.observe(0.5)
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE newwordspider_pages_total counter", lines)
+        self.assertIn('newwordspider_pages_total{status="ok"} 3.0', lines)
+        self.assertIn('newwordspider_pages_total{status="say \\"hi\\""} 1.0', lines)
+        self.assertIn('newwordspider_latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('newwordspider_latency_seconds_bucket{le="1.0"} 2', lines)
+        self.assertIn('newwordspider_latency_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn("newwordspider_latency_seconds_count 2", lines)
+
+        with self.assertRaises(ValueError):
+            pages.inc(kind="ok")
+
+    def test_summary_since_snapshot(self):
+        registry = MetricsRegistry()
+        words = registry.counter("words_total", "词数")
+        latency = registry.histogram("write_seconds", "耗时", buckets=(0.01, 0.1, 1.0))
+        words.inc(5)
+        latency.observe(2.0)
+        snapshot = registry.snapshot()
+        words.inc(3)
+        for value in (0.005, 0.05, 0.05, 0.5):
+            latency.observe(value)
+
+        summary = registry.summary(since=snapshot)
+        self.assertEqual(summary["counters"], {"newwordspider_words_total": 3})
+        write = summary["histograms"]["newwordspider_write_seconds"]
+        self.assertEqual(write["count"], 4)
+        self.assertAlmostEqual(write["sum"], 0.605)
+        self.assertEqual(write["p50"], 0.1)
+        self.assertEqual(write["p99"], 1.0)
+        self.assertEqual(registry.summary()["histograms"]["newwordspider_write_seconds"]["count"], 5)
+
+    def test_render_while_other_threads_write(self):
+        registry = MetricsRegistry()
+        pages = registry.counter("pages_total", "页数", ("source",))
+        latency = registry.histogram("latency_seconds", "耗时", ("source",), buckets=(0.1, 1.0))
+        stop = threading.Event()
+
+        def write(worker):
+            i = 0
+            while not stop.is_set() and i < 2000:
+                # 不断出现新的标签值, 遍历时字典的大小会变化
+                pages.inc(source=f"{worker}-{i}")
+                latency.observe(0.5, source=f"{worker}-{i % 50}")
+                i += 1
+
+        writers = [threading.Thread(target=write, args=(worker,)) for worker in range(2)]
+        for writer in writers:
+            writer.start()
+        try:
+            for _ in range(100):
+                registry.render()
+                for series in registry.snapshot()["histograms"].values():
+                    self.assertEqual(series["count"], sum(series["buckets"]))
+        finally:
+            stop.set()
+            for writer in writers:
+                writer.join()
+
+
+class TestMetricsEndpoint(unittest.IsolatedAsyncioTestCase):
+
+    async def test_llm_client_is_instrumented_and_exposed(self):
+        async def chat(request):
+            return web.json_response({"choices": [{"message": {"content": "ok"}}],
+                                      "usage": {"prompt_tokens": 7, "completion_tokens": 3, "total_tokens": 10}})
+
+        app = web.Application()
+        app.router.add_post("/chat/completions", chat)
+        calls = LLM_CALLS.value(status="200")
+        prompt_tokens = LLM_TOKENS.value(kind="prompt")
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key") as client:
+                await client.chat({})
+        self.assertEqual(LLM_CALLS.value(status="200"), calls + 1)
+        self.assertEqual(LLM_TOKENS.value(kind="prompt"), prompt_tokens + 7)
+
+        runner = await start_metrics_server("127.0.0.1", 0)
+        try:
+            port = runner.addresses[0][1]
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    self.assertEqual(response.status, 200)
+                    self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+                    text = await response.text()
+        finally:
+            await runner.cleanup()
+        self.assertIn(f'newwordspider_llm_requests_total{{status="200"}} {float(calls + 1)}', text)
+        self.assertIn("newwordspider_llm_request_duration_seconds_count", text)
+        self.assertEqual(REGISTRY.render().count("# TYPE newwordspider_llm_tokens_total counter"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,14 @@
+import json
+import tempfile
 import unittest
-from PinyinTools import quanpin_to_xiaohe, word_get_pinyin
+from pathlib import Path
+
+from unittest import mock
+
+import PinyinTools
+from PinyinTools import (PINYIN_SYLLABLES, SCHEMES, XIAOHE_TABLE, PinyinAnnotator, annotate_words, convert_many,
+                         get_scheme, iter_ranked_readings, load_scheme, quanpin_to_xiaohe, word_get_pinyin,
+                         word_get_readings)
 
 class TestPinyinTools(unittest.TestCase):
 
@@ -40,6 +49,52 @@ class TestPinyinTools(unittest.TestCase):
         self.assertEqual(quanpin_to_xiaohe("abcdef"), "Error: Invalid input: input should be a valid quanpin")
         self.assertEqual(quanpin_to_xiaohe("123"), "Error: Invalid input: input should only contain alphabetic characters and spaces")
 
+    def test_xiaohe_table(self):
+        # 每个合法音节都能转换为两个字母的双拼编码
+        self.assertEqual(set(XIAOHE_TABLE), set(PINYIN_SYLLABLES))
+        self.assertTrue(all(len(code) == 2 and code.isalpha() for code in XIAOHE_TABLE.values()))
+
+        # 零声母音节, 其中 eng -> eg 是有意的改变: 原实现不支持 eng, 返回错误信息
+        self.assertEqual(quanpin_to_xiaohe("e"), "ee")
+        self.assertEqual(quanpin_to_xiaohe("er"), "er")
+        self.assertEqual(quanpin_to_xiaohe("eng"), "eg")
+        self.assertEqual(quanpin_to_xiaohe("yuan"), "yr")
+        self.assertEqual(quanpin_to_xiaohe("wang"), "wh")
+
+    def test_convert_many(self):
+        self.assertEqual(convert_many(["zhong", "guo", "ang"]), ["vs", "go", "ah"])
+        # 不在转换表中的罕见音节按原规则转换, 无法转换时为 None
+        self.assertEqual(convert_many(["n", "hng", "123"]), ["nn", None, None])
+        self.assertEqual(convert_many([]), [])
+
+    def test_builtin_schemes(self):
+        # 通用的方案编译规则与小鹤转换表一致
+        self.assertEqual(get_scheme("xiaohe").table, XIAOHE_TABLE)
+
+        syllables = ["zhuang", "ai", "ang", "lv", "lve", "ying"]
+        self.assertEqual(get_scheme("ziranma").convert_many(syllables), ["vd", "ai", "ah", "lv", "lt", "yy"])
+        self.assertEqual(get_scheme("microsoft").convert_many(syllables), ["vd", "ol", "oh", "ly", "lv", "y;"])
+        self.assertEqual(get_scheme("sogou").convert_many(syllables), ["vd", "ol", "oh", "ly", "lt", "y;"])
+        self.assertEqual(convert_many(["zhong", "guo"], scheme="ziranma"), ["vs", "go"])
+
+        self.assertEqual(get_scheme("xiaohe").encode(["zhong", "guo"]), "vsgo")
+        self.assertIsNone(get_scheme("xiaohe").encode(["zhong", "hng"]))
+        self.assertIsNone(get_scheme("xiaohe").encode([]))
+        with self.assertRaises(ValueError):
+            get_scheme("unknown")
+
+    def test_load_custom_scheme(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "custom.json"
+            path.write_text(json.dumps({"name": "custom", "base": "xiaohe", "finals": {"ong": "y"}}),
+                            encoding="utf-8")
+            try:
+                scheme = load_scheme(path)
+                self.assertIs(get_scheme("custom"), scheme)
+                self.assertEqual(scheme.convert_many(["zhong", "xiong", "guo"]), ["vy", "xs", "go"])
+            finally:
+                SCHEMES.pop("custom", None)
+
     def test_word_get_pinyin(self):
         # 测试单个汉字
         self.assertEqual(word_get_pinyin("我"), ["wo"])
@@ -60,5 +115,69 @@ class TestPinyinTools(unittest.TestCase):
         self.assertEqual(word_get_pinyin("123"), [])
         self.assertEqual(word_get_pinyin(""), [])
 
+class TestHeteronyms(unittest.TestCase):
+
+    def test_iter_ranked_readings(self):
+        candidates = [["a", "b"], ["c"], ["d", "e", "f"]]
+        self.assertEqual(list(iter_ranked_readings(candidates, 10)),
+                         [("a", "c", "d"), ("a", "c", "e"), ("b", "c", "d"), ("a", "c", "f"), ("b", "c", "e"),
+                          ("b", "c", "f")])
+        self.assertEqual(list(iter_ranked_readings(candidates, 0)), [])
+        self.assertEqual(list(iter_ranked_readings([["a"], []], 3)), [])
+
+    def test_iter_ranked_readings_is_lazy(self):
+        # 2^40 种组合, 只应展开需要的部分
+        readings = list(iter_ranked_readings([["a", "b"]] * 40, 3))
+        self.assertEqual(len(readings), 3)
+        self.assertEqual(readings[0], ("a",) * 40)
+
+    def test_word_get_readings(self):
+        readings = word_get_readings("行长", max_readings=4)
+        self.assertEqual(readings[0], tuple(word_get_pinyin("行长")))
+        self.assertIn(("hang", "zhang"), readings)
+        self.assertEqual(len(readings), 4)
+
+        # 词组数据中只有一种读法的词不展开单字的多音字读音
+        self.assertEqual(word_get_readings("重庆", max_readings=4), [("chong", "qing")])
+        self.assertEqual(word_get_readings("行长", max_readings=1), [tuple(word_get_pinyin("行长"))])
+        self.assertEqual(word_get_readings("123"), [])
+
+
+class TestPinyinAnnotator(unittest.TestCase):
+
+    def test_annotate_deduplicates_and_caches(self):
+        annotator = PinyinAnnotator()
+        with mock.patch.object(PinyinTools, "word_get_pinyin", wraps=word_get_pinyin) as get_pinyin:
+            result = annotator.annotate(["中国", "你好", "中国", "123"])
+            self.assertEqual(result, {"中国": ("zhong", "guo"), "你好": ("ni", "hao"), "123": ()})
+            annotator.annotate(["中国", "你好"])
+        self.assertEqual(get_pinyin.call_count, 3)
+        self.assertEqual(annotator.stats(), {"hits": 2, "misses": 3, "entries": 3})
+
+    def test_lru_eviction(self):
+        annotator = PinyinAnnotator(max_entries=2)
+        annotator.annotate(["中国", "你好"])
+        annotator.annotate(["中国"])
+        annotator.annotate(["世界"])
+        self.assertEqual(list(annotator._cache), ["中国", "世界"])
+
+    def test_disk_spill(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = Path(tmp_dir) / "pinyin_cache.db"
+            annotator = PinyinAnnotator(db_path=db_path)
+            annotator.annotate(["中国", "123"])
+            annotator.close()
+
+            reopened = PinyinAnnotator(db_path=db_path)
+            with mock.patch.object(PinyinTools, "word_get_pinyin") as get_pinyin:
+                self.assertEqual(reopened.annotate(["中国", "123"]), {"中国": ("zhong", "guo"), "123": ()})
+            get_pinyin.assert_not_called()
+            reopened.close()
+
+    def test_annotate_words_with_scheme(self):
+        self.assertEqual(annotate_words(["中国", "123"], scheme="xiaohe"), {"中国": "vsgo", "123": None})
+        self.assertEqual(annotate_words(["中国"]), {"中国": ("zhong", "guo")})
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from Pipeline import run_pipeline
+
+
+async def make_batches(count, delay=0.0):
+    for i in range(count):
+        await asyncio.sleep(delay)
+        yield f"source{i % 2}", [f"句子{i}"]
+
+
+class TestRunPipeline(unittest.IsolatedAsyncioTestCase):
+
+    async def test_words_are_persisted_in_batches(self):
+        persisted = []
+
+        async def segment(sentences):
+            return {f"词{sentences[0][-1]}", "公共词"}
+
+        stats = await run_pipeline(make_batches(10), segment, lambda words, sentences: persisted.append(
+            (words, sentences)), segment_workers=2, word_batch_size=4)
+
+        words = [word for batch, _ in persisted for word in batch]
+        self.assertEqual(len(words), 11)
+        self.assertEqual(set(words), {f"词{i}" for i in range(10)} | {"公共词"})
+        self.assertEqual(sorted(sentence for _, sentences in persisted for sentence in sentences),
+                         sorted(f"句子{i}" for i in range(10)))
+        self.assertTrue(all(len(batch) <= 5 for batch, _ in persisted))
+        self.assertEqual(stats.sentences, 10)
+        self.assertEqual(stats.words, 11)
+        self.assertEqual(stats.flushes, len(persisted))
+
+    async def test_stages_overlap(self):
+        # 三个阶段各需要 0.02 秒, 串行执行至少 0.6 秒
+        async def segment(sentences):
+            await asyncio.sleep(0.02)
+            return {sentences[0]}
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        persisted = []
+        await run_pipeline(make_batches(10, delay=0.02), segment,
+                           lambda words, sentences: persisted.extend(words), word_batch_size=1)
+        self.assertEqual(len(persisted), 10)
+        self.assertLess(loop.time() - start, 0.4)
+
+    async def test_backpressure_bounds_queues(self):
+        produced = 0
+
+        async def batches():
+            nonlocal produced
+            for i in range(50):
+                produced += 1
+                yield "source", [f"句子{i}"]
+
+        async def segment(sentences):
+            await asyncio.sleep(0.005)
+            return {sentences[0]}
+
+        stats = await run_pipeline(batches(), segment, lambda words, sentences: None, segment_workers=1,
+                                   queue_size=2, word_batch_size=1)
+        self.assertEqual(produced, 50)
+        self.assertLessEqual(stats.max_sentence_queue, 2)
+        self.assertLessEqual(stats.max_word_queue, 2)
+
+    async def test_flush_interval_and_segment_errors(self):
+        flush_times = []
+        loop = asyncio.get_running_loop()
+
+        async def segment(sentences):
+            if sentences == ["句子1"]:
+                raise RuntimeError("boom")
+            return {sentences[0]}
+
+        def persist(words, sentences):
+            flush_times.append((loop.time(), sorted(sentences)))
+
+        stats = await run_pipeline(make_batches(3, delay=0.05), segment, persist, segment_workers=1,
+                                   word_batch_size=100, flush_interval=0.01)
+        self.assertEqual(stats.segment_errors, 1)
+        # 分词失败的句子不会交给 persist, 累积的词按 flush_interval 分批保存
+        self.assertEqual([sentences for _, sentences in flush_times], [["句子0"], ["句子2"]])
+
+    async def test_persist_runs_in_worker_thread(self):
+        threads = set()
+        ticks = 0
+
+        async def segment(sentences):
+            return {sentences[0]}
+
+        def persist(words, sentences):
+            threads.add(threading.get_ident())
+            time.sleep(0.05)
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticker_task = asyncio.ensure_future(ticker())
+        try:
+            stats = await run_pipeline(make_batches(4), segment, persist, word_batch_size=1)
+        finally:
+            ticker_task.cancel()
+        self.assertEqual(stats.flushes, 4)
+        # 各次 persist 都在同一个保存线程中执行, 保存期间事件循环没有被阻塞
+        self.assertEqual(len(threads), 1)
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertGreater(ticks, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
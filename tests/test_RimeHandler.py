@@ -1,6 +1,10 @@
+import sqlite3
+import tempfile
 import unittest
 from pathlib import Path
-from RimeHandler import RimeFileHandler, RimeSQLiteHandler, RimeEntry
+from unittest import mock
+
+from RimeHandler import SCHEMA_VERSION, RimeFileHandler, RimeSQLiteHandler, RimeEntry
 
 class TestRimeFileHandler(unittest.TestCase):
 
@@ -25,6 +29,22 @@ class TestRimeFileHandler(unittest.TestCase):
         }
         self.assertEqual(user_dict, expected_dict)
 
+    def test_iter_entries_and_words(self):
+        with self.test_file_path.open("w", encoding="utf-8") as f:
+            f.write("# Added on 2024-09-23\n词条1\tcode1\t100\n\n词条2\tcode2\n词条1\tcode3\n")
+
+        self.assertEqual(list(self.file_handler.iter_entries()), [
+            ("词条1", RimeEntry("code1", "100")),
+            ("词条2", RimeEntry("code2", None)),
+            ("词条1", RimeEntry("code3", None)),
+        ])
+        self.assertEqual(list(self.file_handler.iter_words()), ["词条1", "词条2", "词条1"])
+        self.assertEqual(self.file_handler.load_word_set(), {"词条1", "词条2"})
+
+    def test_iter_missing_file(self):
+        self.assertEqual(list(self.file_handler.iter_entries()), [])
+        self.assertEqual(self.file_handler.load_word_set(), set())
+
     def test_write_dict(self):
         user_dict = {
             "词条1": RimeEntry("code1", "100"),
@@ -58,6 +78,26 @@ class TestRimeFileHandler(unittest.TestCase):
         self.assertIn("新词条2\txin1ci2tiao3", content)
         self.assertIn("# Added on", content)
 
+    def test_append_entries_with_multiple_codes(self):
+        new_entries = [
+            ("行长", RimeEntry("xkvh", 2)),
+            ("行长", RimeEntry("hhvh", 1)),
+            ("行长", RimeEntry("xkih", 0)),
+        ]
+        success = self.file_handler.append_entries(new_entries)
+        self.assertTrue(success)
+
+        with self.test_file_path.open("r", encoding="utf-8") as f:
+            content = f.read()
+        self.assertEqual(content, "行长\txkvh\t2\n行长\thhvh\t1\n行长\txkih\t0\n")
+
+    def test_append_empty_entries(self):
+        # 没有新词条时不写入空的日期注释
+        self.test_file_path.write_text("词条1\tcode1\t100\n", encoding="utf-8")
+        self.assertTrue(self.file_handler.append_entries([], add_date_comment=True))
+        self.assertTrue(self.file_handler.append_entries(iter([]), add_date_comment=True))
+        self.assertEqual(self.test_file_path.read_text(encoding="utf-8"), "词条1\tcode1\t100\n")
+
 
 class TestRimeSQLiteHandler(unittest.TestCase):
 
@@ -66,6 +106,7 @@ class TestRimeSQLiteHandler(unittest.TestCase):
         self.sqlite_handler = RimeSQLiteHandler(self.test_db_path)
 
     def tearDown(self):
+        self.sqlite_handler.close()
         if self.test_db_path.exists():
             self.test_db_path.unlink()
 
@@ -92,5 +133,111 @@ class TestRimeSQLiteHandler(unittest.TestCase):
         loaded_dict = self.sqlite_handler.load_sqlite()
         self.assertEqual(loaded_dict, user_dict)
 
+    def test_save_entries_streaming(self):
+        entries = ((f"词条{i}", RimeEntry(f"code{i}", str(i))) for i in range(1000))
+        self.assertTrue(self.sqlite_handler.save_entries(entries))
+        self.assertEqual(self.sqlite_handler.count(), 1000)
+
+        # 相同的词条和编码更新权重, 不同的编码另外保存一行
+        self.sqlite_handler.save_sqlite({"词条1": RimeEntry("code1", "5")})
+        self.sqlite_handler.save_sqlite({"词条1": RimeEntry("new", None)})
+        self.assertEqual(self.sqlite_handler.count(), 1001)
+        self.assertEqual(self.sqlite_handler.load_sqlite()["词条1"], RimeEntry("code1", "5"))
+
+    def test_iter_entries_and_contains_words(self):
+        user_dict = {f"词条{i}": RimeEntry(f"code{i}", str(i)) for i in range(1200)}
+        self.sqlite_handler.save_sqlite(user_dict)
+
+        self.assertEqual(dict(self.sqlite_handler.iter_entries(batch_size=100)), user_dict)
+        words = ["词条0", "词条1199", "新词", "词条0"]
+        self.assertEqual(self.sqlite_handler.contains_words(words), {"词条0", "词条1199"})
+        self.assertEqual(self.sqlite_handler.contains_words(f"词条{i}" for i in range(1500)), set(user_dict))
+
+    def test_wal_mode(self):
+        self.assertEqual(self.sqlite_handler.count(), 0)
+        journal_mode = self.sqlite_handler._connect().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(journal_mode, "wal")
+
+class TestRimeSQLiteSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / "rime_user_dict.db"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_migrate_from_v1(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE rime_user_dict (word TEXT PRIMARY KEY, code TEXT, weight TEXT)")
+            conn.executemany("INSERT INTO rime_user_dict VALUES (?, ?, ?)",
+                             [("词条1", "code1", "100"), ("词条2", "code2", None), ("词条3", "code3", "abc")])
+        conn.close()
+
+        with RimeSQLiteHandler(self.db_path) as handler:
+            self.assertEqual(handler.load_sqlite(), {
+                "词条1": RimeEntry("code1", "100"),
+                "词条2": RimeEntry("code2", None),
+                "词条3": RimeEntry("code3", None),
+            })
+            conn = handler._connect()
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+            self.assertEqual(conn.execute("SELECT typeof(weight) FROM rime_user_dict WHERE word = '词条1'").fetchone(),
+                             ("integer",))
+
+    def test_metadata_and_indexed_queries(self):
+        with RimeSQLiteHandler(self.db_path) as handler:
+            with mock.patch("RimeHandler.time.time", return_value=1000):
+                handler.save_sqlite({"旧词": RimeEntry("jxci", "1")})
+            with mock.patch("RimeHandler.time.time", return_value=2000):
+                handler.save_entries([("新词", RimeEntry("xbci", 1)), ("新词", RimeEntry("xbci", 2)),
+                                      ("心慈", RimeEntry("xbci", 1))],
+                                     sources={"新词": "rebang_top_today"}, segmenter="jieba")
+
+            self.assertCountEqual(handler.words_since(1500), [("新词", RimeEntry("xbci", "2")),
+                                                              ("心慈", RimeEntry("xbci", "1"))])
+            self.assertEqual(sorted(word for word, _ in handler.words_with_code("xbci")), ["心慈", "新词"])
+            row = handler._connect().execute(
+                "SELECT hit_count, source, segmenter FROM rime_user_dict WHERE word = '新词'").fetchone()
+            self.assertEqual(row, (2, "rebang_top_today", "jieba"))
+
+            plan = handler._connect().execute(
+                "EXPLAIN QUERY PLAN SELECT word FROM rime_user_dict WHERE code = ?", ("xbci",)).fetchall()
+            self.assertIn("idx_rime_user_dict_code", str(plan))
+
+    def test_bulk_load_rebuilds_indexes(self):
+        def index_names(handler):
+            return {name for (name,) in handler._connect().execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'rime_user_dict'")
+                if not name.startswith("sqlite_")}
+
+        with RimeSQLiteHandler(self.db_path) as handler:
+            expected = index_names(handler)
+            self.assertEqual(len(expected), 3)
+            # 初次导入失败时事务回滚, 删除的索引同时恢复
+            self.assertFalse(handler.save_entries([("词条1", RimeEntry("code1", "1")), ("词条2", RimeEntry(None, "1"))]))
+            self.assertEqual(handler.count(), 0)
+            self.assertEqual(index_names(handler), expected)
+
+            self.assertTrue(handler.save_entries((f"词条{i}", RimeEntry(f"code{i}", str(i))) for i in range(100)))
+            self.assertEqual(handler.count(), 100)
+            self.assertEqual(index_names(handler), expected)
+
+    def test_record_hits(self):
+        with RimeSQLiteHandler(self.db_path) as handler:
+            with mock.patch("RimeHandler.time.time", return_value=1000):
+                handler.save_entries([("行长", RimeEntry("xkvh", 1)), ("行长", RimeEntry("hhvh", 1)),
+                                      ("中国", RimeEntry("vsgo", 1))])
+            with mock.patch("RimeHandler.time.time", return_value=2000):
+                self.assertTrue(handler.record_hits(["行长", "行长", "没有"]))
+
+            rows = handler._connect().execute("SELECT word, code, hit_count, first_seen, last_seen "
+                                              "FROM rime_user_dict ORDER BY word, code").fetchall()
+            self.assertEqual(rows, [("中国", "vsgo", 1, 1000, 1000),
+                                    ("行长", "hhvh", 2, 1000, 2000), ("行长", "xkvh", 2, 1000, 2000)])
+            self.assertEqual(handler.count(), 3)
+            self.assertEqual([word for word, _ in handler.words_since(1500)], [])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,78 @@
+import asyncio
+import random
+import unittest
+
+from Crawler import CrawlSource, RebangParser
+from Scheduler import Scheduler
+
+
+def make_source(name, interval=None):
+    return CrawlSource(name, "http://example.com/items", {}, RebangParser(), interval)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_per_source_intervals(self):
+        clock = FakeClock()
+        cycles = []
+
+        async def run_cycle(due):
+            cycles.append(sorted(source.name for source in due))
+
+        scheduler = Scheduler(run_cycle, [make_source("fast", 10), make_source("slow")], interval=30, jitter=0,
+                              clock=clock)
+        for now in (0, 5, 10, 20, 30):
+            clock.now = now
+            await scheduler.run_once()
+        self.assertEqual(cycles, [["fast", "slow"], ["fast"], ["fast"], ["fast", "slow"]])
+        self.assertEqual(scheduler.seconds_until_due(30), 10)
+
+    async def test_jitter_stays_in_range(self):
+        scheduler = Scheduler(None, [make_source("a")], interval=100, jitter=0.2, rng=random.Random(0))
+        intervals = [scheduler.source_interval(scheduler.sources[0]) for _ in range(100)]
+        self.assertTrue(all(80 <= interval <= 120 for interval in intervals))
+        self.assertGreater(len(set(intervals)), 1)
+
+    async def test_cycles_never_overlap_and_failures_are_contained(self):
+        running = 0
+        max_running = 0
+        calls = 0
+
+        async def run_cycle(due):
+            nonlocal running, max_running, calls
+            calls += 1
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if calls == 1:
+                raise RuntimeError("boom")
+
+        scheduler = Scheduler(run_cycle, [make_source("a", 0.001), make_source("b", 0.002)], interval=1, jitter=0)
+        await scheduler.run(max_cycles=4)
+        self.assertEqual(scheduler.cycles, 4)
+        self.assertEqual(max_running, 1)
+
+    async def test_stop_interrupts_sleep(self):
+        async def run_cycle(due):
+            pass
+
+        scheduler = Scheduler(run_cycle, [make_source("a")], interval=3600)
+        task = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        scheduler.stop()
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(scheduler.cycles, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from SentenceIndex import SeenSentenceIndex, normalize_sentence
+
+
+class TestSeenSentenceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / "seen.db"
+        self.index = SeenSentenceIndex(self.db_path, ttl_days=1)
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+    def test_normalize_sentence(self):
+        self.assertEqual(normalize_sentence(" ＡＢＣ 测试 "), "abc测试")
+
+    def test_filter_new(self):
+        sentences = ["标题一", "标题二", "标题一"]
+        self.assertEqual(self.index.filter_new(sentences), ["标题一", "标题二"])
+
+        self.index.mark_seen(["标题一"])
+        self.assertEqual(self.index.filter_new(["标题 一", "标题二", "标题三"]), ["标题二", "标题三"])
+
+    def test_persistent_across_instances(self):
+        self.index.mark_seen(["标题一"])
+        self.index.close()
+        self.index = SeenSentenceIndex(self.db_path, ttl_days=1)
+        self.assertEqual(self.index.filter_new(["标题一", "标题二"]), ["标题二"])
+
+    def test_mark_seen_from_another_thread(self):
+        # 流水线在保存线程中记录句子, 同时事件循环线程继续过滤
+        writer = threading.Thread(target=self.index.mark_seen, args=([f"标题{i}" for i in range(1000)],))
+        writer.start()
+        for _ in range(20):
+            self.index.filter_new(["标题0", "新标题"])
+        writer.join()
+        self.assertEqual(self.index.filter_new(["标题0", "标题999", "新标题"]), ["新标题"])
+
+    def test_ttl(self):
+        self.index.mark_seen(["标题一"])
+        with patch("SentenceIndex.time.time", return_value=time.time() + 2 * 86400):
+            self.assertEqual(self.index.filter_new(["标题一"]), ["标题一"])
+            self.assertEqual(self.index.purge_expired(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
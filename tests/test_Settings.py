@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from Settings import Settings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestSettings(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "config.json"
+        self.path.write_text(json.dumps({"LLM_API_URL": "http://config", "LLM_API_KEY": "config-key"}),
+                             encoding="utf-8")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_file_is_parsed_on_first_access(self):
+        settings = Settings(str(self.path))
+        self.path.write_text(json.dumps({"LLM_MODEL": "test-model"}), encoding="utf-8")
+        self.assertEqual(settings.get("LLM_MODEL"), "test-model")
+        self.assertEqual(settings.get("MISSING", 3), 3)
+
+        self.path.write_text(json.dumps({"LLM_MODEL": "changed"}), encoding="utf-8")
+        self.assertEqual(settings["LLM_MODEL"], "test-model")
+
+    def test_github_actions_reads_environment(self):
+        settings = Settings(str(self.path))
+        with patch.dict(os.environ, {"LLM_API_URL": "http://env", "LLM_API_KEY": "env-key"}, clear=False):
+            os.environ.pop("GITHUB_ACTIONS", None)
+            self.assertEqual((settings.llm_api_url, settings.llm_api_key), ("http://config", "config-key"))
+            os.environ["GITHUB_ACTIONS"] = "true"
+            self.assertEqual((settings.llm_api_url, settings.llm_api_key), ("http://env", "env-key"))
+
+    def test_import_without_api_key_does_not_exit(self):
+        env = {key: value for key, value in os.environ.items()
+               if key not in ("GITHUB_ACTIONS", "LLM_API_KEY", "LLM_API_URL")}
+        result = subprocess.run([sys.executable, "-c", "import Tokenizer, sys; print('jieba' in sys.modules)"],
+                                cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,16 @@
+import asyncio
+import json
+import tempfile
 import unittest
+from pathlib import Path
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from LLMCache import SegmentationCache
+from LLMClient import LLMClient
 from Tokenizer import filter_chinese_words, jieba_tokenizer
 from unittest.mock import patch, MagicMock
 from Tokenizer import tokenize_and_filter, jieba_tokenizer, deepseek_tokenizer
+from Tokenizer import LLM_Split_words, make_batches, estimate_tokens, BATCH_SYSTEM_PROMPT, JiebaSegmenter
 import jieba
 
 class TestFilterChineseWords(unittest.TestCase):
@@ -118,10 +127,30 @@ class TestJiebaTokenizer(unittest.TestCase):
     def test_jieba_tokenizer(self):
         sentence = "这是一个测试句子"
         expected_result = ["这是", "一个", "测试", "句子"]
-        result =  jieba_tokenizer(sentence)
+        result = asyncio.run(jieba_tokenizer(sentence))
         self.assertEqual(result, expected_result)
 
 
+class TestJiebaSegmenter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.segmenter = JiebaSegmenter(workers=2, chunk_size=2)
+
+    def tearDown(self):
+        self.segmenter.close()
+
+    def test_iter_segment(self):
+        sentences = ["测试句子", "另一个句子", "中文分词", "进程池"]
+        expected = [set(jieba.lcut(sentences[0]) + jieba.lcut(sentences[1])),
+                    set(jieba.lcut(sentences[2]) + jieba.lcut(sentences[3]))]
+        self.assertEqual(list(self.segmenter.iter_segment(iter(sentences))), expected)
+
+    async def test_segment(self):
+        sentences = ["测试句子", "另一个句子", "中文分词"]
+        expected = set().union(*(jieba.lcut(sentence) for sentence in sentences))
+        self.assertEqual(await self.segmenter.segment(sentences), expected)
+
+
 class TestTokenizeAndFilter(unittest.TestCase):
 
     @patch('Tokenizer.jieba_tokenizer')
@@ -133,6 +162,97 @@ class TestTokenizeAndFilter(unittest.TestCase):
         self.assertEqual(result, expected_result)
 
 
+class TestTokenizeAndFilterCache(unittest.TestCase):
+
+    def test_cache_skips_tokenizer(self):
+        calls = []
+
+        async def fake_tokenizer(sentence):
+            calls.append(sentence)
+            return ["测试", "句子"]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = SegmentationCache(Path(tmp_dir) / "llm_cache.db", "deepseek-chat", 1)
+            for _ in range(2):
+                result = asyncio.run(tokenize_and_filter("测试句子", fake_tokenizer, cache=cache))
+                self.assertEqual(result, {"测试", "句子"})
+            cache.close()
+        self.assertEqual(calls, ["测试句子"])
+
+
+def make_chat_app(batch_ok: bool = True):
+    """
+    构造一个模拟 chat completions 接口的 aiohttp 应用，按空格切分句子
+    """
+    state = {"requests": 0}
+
+    async def chat(request):
+        state["requests"] += 1
+        data = await request.json()
+        if "response_format" in data:
+            if not batch_ok:
+                content = "不是JSON"
+            else:
+                items = json.loads(data["messages"][-1]["content"])
+                content = json.dumps({"results": [{"id": item["id"], "words": item["text"].split()} for item in items]})
+        else:
+            sentence = data["messages"][-1]["content"].rsplit("  ", 1)[-1]
+            content = str(sentence.split())
+        return web.json_response({"choices": [{"message": {"content": content}}]})
+
+    app = web.Application()
+    app.router.add_post("/chat/completions", chat)
+    return app, state
+
+
+class TestBatchSplitWords(unittest.IsolatedAsyncioTestCase):
+
+    def test_make_batches(self):
+        sentences = [f"句子{i}" for i in range(5)]
+        self.assertEqual(make_batches(sentences, batch_size=2), [sentences[:2], sentences[2:4], sentences[4:]])
+
+        # token 上限较小时，每批的句子数随句子长度减少
+        long_sentences = ["长" * 100] * 4
+        batches = make_batches(long_sentences, batch_size=10,
+                               max_prompt_tokens=estimate_tokens(BATCH_SYSTEM_PROMPT) + 250)
+        self.assertEqual([len(batch) for batch in batches], [2, 2])
+
+    def test_prompt_example_matches_schema(self):
+        # 提示词中的样例输出必须与要求的 {"results": [{"id", "words"}]} 格式一致
+        example = json.loads(BATCH_SYSTEM_PROMPT.rsplit("样例输出 ", 1)[1])
+        self.assertEqual(example["results"][0]["id"], 0)
+        self.assertIn("星鸣特攻", example["results"][0]["words"])
+
+    async def split(self, app, sentences, batch_size):
+        async with TestServer(app) as server:
+            async with LLMClient(str(server.make_url("/chat/completions")), "key",
+                                 max_retries=1, backoff_base=0.01) as client:
+                return await LLM_Split_words(sentences, batch_size=batch_size, client=client)
+
+    async def test_batch_request(self):
+        app, state = make_chat_app()
+        sentences = ["测试 句子", "另一个 句子", "第三个 例子"]
+        result = await self.split(app, sentences, batch_size=10)
+        self.assertEqual(result, {"测试", "句子", "另一个", "第三个", "例子"})
+        self.assertEqual(state["requests"], 1)
+
+    async def test_batch_fallback(self):
+        app, state = make_chat_app(batch_ok=False)
+        sentences = ["测试 句子", "另一个 句子"]
+        result = await self.split(app, sentences, batch_size=10)
+        self.assertEqual(result, {"测试", "句子", "另一个"})
+        self.assertEqual(state["requests"], 3)
+
+    async def test_jieba_fallback(self):
+        async def unavailable(request):
+            return web.Response(status=503)
+
+        app = web.Application()
+        app.router.add_post("/chat/completions", unavailable)
+        result = await self.split(app, ["这是一个测试句子"], batch_size=10)
+        self.assertEqual(result, {"测试", "句子"})
+
+
 class TestLLMSplitWords(unittest.TestCase):
 
     @patch('aiohttp.ClientSession')
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from WordFilter import DEFAULT_RULES, ReloadableFilterRules, WordFilter, get_word_filter, load_filter_rules
+
+
+class TestWordFilter(unittest.TestCase):
+
+    def test_default_rules(self):
+        word_filter = WordFilter()
+        words = ["中文", "测试·词", "你好 世界", "一二三", "我的", "你好123", "鸿蒙Next", "黑神话：悟空", "中", "　你好"]
+        self.assertEqual(word_filter.filter(words), {"中文", "测试词", "你好世界", "　你好"})
+
+    def test_accept(self):
+        word_filter = WordFilter()
+        self.assertEqual(word_filter.accept("测试·词"), "测试词")
+        self.assertIsNone(word_filter.accept("English"))
+
+    def test_multi_char_exclude_words(self):
+        word_filter = WordFilter(exclude_words=["的", "震惊"], exclude_prefixes=())
+        self.assertEqual(word_filter.filter(["令人震惊", "一个", "好的", "新词"]), {"一个", "新词"})
+
+    def test_length_bounds(self):
+        self.assertEqual(WordFilter(min_length=0).filter(["", "中"]), {"中"})
+        self.assertEqual(WordFilter(min_length=3, max_length=2).filter(["中文", "中文字"]), set())
+        self.assertEqual(WordFilter(min_length=3, max_length=4).filter(["中文", "中文字", "中文字体", "中文字体库"]),
+                         {"中文字", "中文字体"})
+
+    def test_suffixes_and_patterns(self):
+        word_filter = WordFilter(exclude_suffixes=["事件"], exclude_patterns=["^第.+期$", "哈{2,}"])
+        words = ["热点事件", "事件回顾", "第三期", "第三季", "哈哈哈", "哈一哈"]
+        self.assertEqual(word_filter.filter(words), {"事件回顾", "第三季", "哈一哈"})
+
+    def test_get_word_filter_is_cached(self):
+        self.assertIs(get_word_filter(DEFAULT_RULES), get_word_filter(DEFAULT_RULES._replace()))
+
+
+class TestFilterRules(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.rules_path = Path(self.tmp_dir.name) / "filter_rules.json"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_rules(self, data, mtime_ns):
+        with open(self.rules_path, 'w', encoding='utf-8') as f:
+            f.write(data if isinstance(data, str) else json.dumps(data, ensure_ascii=False))
+        # 显式设置修改时间, 避免文件系统时间精度导致两次写入的时间相同
+        os.utime(self.rules_path, ns=(mtime_ns, mtime_ns))
+
+    def test_load_with_defaults(self):
+        self.write_rules({"max_length": 4, "exclude_words": ["震惊"]}, 1_000_000_000)
+        rules = load_filter_rules(self.rules_path)
+        self.assertEqual(rules.max_length, 4)
+        self.assertEqual(rules.exclude_words, frozenset(["震惊"]))
+        self.assertEqual(rules.exclude_prefixes, DEFAULT_RULES.exclude_prefixes)
+
+    def test_missing_file_uses_defaults(self):
+        self.assertEqual(ReloadableFilterRules(self.rules_path).get(), DEFAULT_RULES)
+        self.assertEqual(ReloadableFilterRules(None).get(), DEFAULT_RULES)
+
+    def test_reload_on_change(self):
+        self.write_rules({"min_length": 3}, 1_000_000_000)
+        reloadable = ReloadableFilterRules(self.rules_path, check_interval=0)
+        self.assertEqual(reloadable.get().min_length, 3)
+
+        self.write_rules({"min_length": 4}, 2_000_000_000)
+        self.assertEqual(reloadable.get().min_length, 4)
+
+    def test_check_interval(self):
+        self.write_rules({"min_length": 3}, 1_000_000_000)
+        reloadable = ReloadableFilterRules(self.rules_path, check_interval=3600)
+        self.write_rules({"min_length": 4}, 2_000_000_000)
+        self.assertEqual(reloadable.get().min_length, 3)
+        self.assertEqual(reloadable.reload().min_length, 4)
+
+    def test_invalid_rules_keep_previous(self):
+        self.write_rules({"min_length": 3}, 1_000_000_000)
+        reloadable = ReloadableFilterRules(self.rules_path, check_interval=0)
+
+        self.write_rules("{not json", 2_000_000_000)
+        self.assertEqual(reloadable.get().min_length, 3)
+        self.write_rules({"exclude_patterns": ["("]}, 3_000_000_000)
+        self.assertEqual(reloadable.get().min_length, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from RimeHandler import RimeEntry, RimeFileHandler, RimeSQLiteHandler
+from WordIndex import BloomFilter, WordIndex
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        words = [f"词条{i}" for i in range(1000)]
+        bloom.update(words)
+        self.assertTrue(all(word in bloom for word in words))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        bloom.update(f"词条{i}" for i in range(1000))
+        false_positives = sum(f"新词{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestWordIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dict_path = Path(self.tmp_dir.name) / "flypy_user.txt"
+        self.index_path = Path(self.tmp_dir.name) / "flypy_user.idx"
+        self.dict_path.write_text("# comment\n中国\tvsgo\t1\n你好\tnihc\n", encoding="utf-8")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_find_existing_builds_and_persists_index(self):
+        handler = RimeFileHandler(self.dict_path, index=WordIndex(self.index_path))
+        self.assertEqual(handler.find_existing(["中国", "世界", "你好"]), {"中国", "你好"})
+        self.assertTrue(self.index_path.exists())
+
+        reopened = WordIndex(self.index_path)
+        self.assertTrue(reopened.is_fresh(self.dict_path))
+        self.assertTrue(reopened.might_contain("中国"))
+
+    def test_append_updates_index_incrementally(self):
+        handler = RimeFileHandler(self.dict_path, index=WordIndex(self.index_path))
+        handler.find_existing(["中国"])
+        handler.append_dict({"世界": RimeEntry("uijp", 1)}, add_date_comment=True)
+
+        reopened = WordIndex(self.index_path)
+        self.assertTrue(reopened.is_fresh(self.dict_path))
+        self.assertEqual(RimeFileHandler(self.dict_path, index=reopened).find_existing(["世界", "新词"]), {"世界"})
+
+    def test_external_change_triggers_rebuild(self):
+        handler = RimeFileHandler(self.dict_path, index=WordIndex(self.index_path))
+        handler.find_existing(["中国"])
+        with self.dict_path.open("a", encoding="utf-8") as f:
+            f.write("手动\tuuds\n")
+
+        index = WordIndex(self.index_path)
+        self.assertFalse(index.is_fresh(self.dict_path))
+        self.assertEqual(RimeFileHandler(self.dict_path, index=index).find_existing(["手动"]), {"手动"})
+
+    def test_verify_and_resize(self):
+        index = WordIndex(self.index_path, capacity=2)
+        handler = RimeFileHandler(self.dict_path, index=index)
+        # 可能存在的词交给 verify 精确确认
+        self.assertEqual(handler.find_existing(["中国", "你好"], verify=lambda words: {"中国"}), {"中国"})
+
+        handler.append_dict({f"新词{i}": RimeEntry("xbci", 1) for i in range(10)})
+        self.assertGreaterEqual(index.bloom.capacity, 12)
+        self.assertEqual(handler.find_existing(["新词9", "中国"]), {"新词9", "中国"})
+
+    def test_database_synced_after_external_change(self):
+        handler = RimeFileHandler(self.dict_path, index=WordIndex(self.index_path))
+        with RimeSQLiteHandler(Path(self.tmp_dir.name) / "flypy_user.db") as sqlite_handler:
+            sqlite_handler.save_entries(handler.iter_entries())
+
+            def sync():
+                sqlite_handler.insert_missing(handler.iter_entries())
+
+            self.assertEqual(handler.find_existing(["中国", "手动"], verify=sqlite_handler.contains_words,
+                                                   on_rebuild=sync), {"中国"})
+            # 词库文件在程序之外增加了数据库中没有的词
+            with self.dict_path.open("a", encoding="utf-8") as f:
+                f.write("手动\tuuds\n")
+            self.assertEqual(sqlite_handler.contains_words(["手动"]), set())
+
+            # 索引重建时把新词同步到数据库，数据库确认后不会被当作新词再次追加
+            self.assertEqual(handler.find_existing(["中国", "手动", "新词"], verify=sqlite_handler.contains_words,
+                                                   on_rebuild=sync), {"中国", "手动"})
+            self.assertEqual(sqlite_handler.count(), 3)
+            # 已有的词条保持不变，出现次数不增加
+            hit_count = sqlite_handler._connect().execute(
+                "SELECT hit_count FROM rime_user_dict WHERE word = '中国'").fetchone()[0]
+            self.assertEqual(hit_count, 1)
+
+    def test_invalid_index_file_is_ignored(self):
+        self.index_path.write_bytes(b"garbage")
+        index = WordIndex(self.index_path)
+        self.assertFalse(index.is_fresh(self.dict_path))
+        self.assertEqual(RimeFileHandler(self.dict_path, index=index).find_existing(["中国"]), {"中国"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import main
+from CrawlCache import ResponseCache
+from Crawler import load_sources
+from PinyinTools import PinyinAnnotator, get_scheme
+from RimeHandler import RimeFileHandler, RimeSQLiteHandler
+
+
+class TestMakeEntries(unittest.TestCase):
+
+    def setUp(self):
+        self.scheme = get_scheme('xiaohe')
+        self.readings = [("chong", "xin"), ("zhong", "xin"), ("chong", "xing")]
+
+    def test_default_weight(self):
+        # 默认权重为 1 时，其他读音的权重不能减半为 0
+        with patch.object(main, 'NEW_WORD_WEIGHT', 1):
+            entries = main.make_entries("重新", self.readings, self.scheme)
+        self.assertEqual([entry.code for _, entry in entries], ["isxb", "vsxb", "isxk"])
+        self.assertEqual([entry.weight for _, entry in entries], [1, 1, 1])
+
+    def test_weight_halves(self):
+        with patch.object(main, 'NEW_WORD_WEIGHT', "4"):
+            entries = main.make_entries("重新", self.readings + [("chong", "xin")], self.scheme)
+        self.assertEqual([entry.weight for _, entry in entries], [4, 2, 1])
+
+
+class TestProcessNewWords(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dict_path = Path(self.tmp_dir.name) / "flypy_user.txt"
+        self.file_handler = RimeFileHandler(self.dict_path)
+        self.sqlite_handler = RimeSQLiteHandler(Path(self.tmp_dir.name) / "flypy_user.db")
+        self.patches = [
+            patch.object(main, 'USER_DICT_MEMBERSHIP', 'sqlite'),
+            patch.object(main, 'get_file_handler', return_value=self.file_handler),
+            patch.object(main, 'get_sqlite_handler', return_value=self.sqlite_handler),
+            patch.object(main, 'get_schemes', return_value=(get_scheme('xiaohe'), [])),
+            patch.object(main, 'get_pinyin_annotator', return_value=PinyinAnnotator()),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.sqlite_handler.close()
+        self.tmp_dir.cleanup()
+
+    def test_saves_new_words(self):
+        self.assertTrue(main.process_new_words({"中国"}))
+        content = self.dict_path.read_text(encoding="utf-8")
+        self.assertIn("中国\tvsgo", content)
+        self.assertEqual(self.sqlite_handler.contains_words(["中国"]), {"中国"})
+
+        # 没有新词时返回成功，不再追加日期注释
+        self.assertTrue(main.process_new_words({"中国"}))
+        self.assertEqual(self.dict_path.read_text(encoding="utf-8"), content)
+        # 已有的词再次出现时更新出现次数
+        hit_count = self.sqlite_handler._connect().execute(
+            "SELECT hit_count FROM rime_user_dict WHERE word = '中国'").fetchone()[0]
+        self.assertEqual(hit_count, 2)
+
+    def test_database_failure(self):
+        # 数据库保存失败时不追加到词库文件，并返回失败，调用方不会把句子记为已处理
+        with patch.object(self.sqlite_handler, 'save_entries', return_value=False):
+            self.assertFalse(main.process_new_words({"中国"}))
+        self.assertFalse(self.dict_path.exists())
+
+
+class TestMainResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(Path(self.tmp_dir.name) / "crawl_cache.db")
+        self.requests = 0
+
+        async def items(request):
+            self.requests += 1
+            if request.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304)
+            body = json.dumps({"data": {"total_page": 1, "list": json.dumps([{"title": "热榜标题"}])}})
+            return web.Response(text=body, content_type="application/json", headers={"ETag": '"v1"'})
+
+        app = web.Application()
+        app.router.add_get("/v1/items", items)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        async def split_words(sentences, segmenter):
+            return set(sentences)
+
+        self.patches = [
+            patch.object(main, 'SPLIT_WORDS_MODE', 'jieba'),
+            patch.object(main, 'get_response_cache', return_value=self.cache),
+            patch.object(main, 'get_seen_index', return_value=None),
+            patch.object(main, 'get_llm_cache', return_value=None),
+            patch.object(main, 'import_user_dict'),
+            patch.object(main, 'jieba_split_words', side_effect=split_words),
+        ]
+        for p in self.patches:
+            p.start()
+
+    async def asyncTearDown(self):
+        for p in self.patches:
+            p.stop()
+        await self.server.close()
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    async def test_failed_page_is_refetched(self):
+        sources = load_sources([{"name": "top", "api_url": str(self.server.make_url("/v1/items"))}])
+        with patch.object(main, 'process_new_words', side_effect=[False, True]) as process_new_words:
+            # 保存失败时不记录页面状态，下次运行重新处理这一页
+            await main.main(sources)
+            await main.main(sources)
+            self.assertEqual(process_new_words.call_count, 2)
+            # 第二次保存成功后页面状态被记录，第三次运行时页面未变化(304)，不再处理
+            await main.main(sources)
+            self.assertEqual(process_new_words.call_count, 2)
+        self.assertEqual(self.requests, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()